@@ -0,0 +1,78 @@
+"""Per-call overhead of hooking HTTPAdapter.send.
+
+Compares an unpatched send, mock.patch with autospec (as Monitor used to),
+the patching engine with a pass-through hook, and a full Monitor. The
+transport is stubbed out so only the patching overhead is measured.
+
+Run with:
+python benchmarks/bench_patching.py [--calls 100000]
+"""
+import argparse
+import time
+import mock
+import requests
+from requests.adapters import HTTPAdapter
+from monitor_requests import Monitor
+from monitor_requests.patching import patch
+
+
+def stub_send(self, request, *args, **kwargs):
+    """Stand-in for the network: a canned response."""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'<html>example</html>'
+    response.url = request.url
+    return response
+
+
+def measure(calls):
+    """Nanoseconds per HTTPAdapter.send call."""
+    adapter = HTTPAdapter()
+    request = requests.Request('GET', 'http://example.com/').prepare()
+    start = time.perf_counter()
+    for _ in range(calls):
+        adapter.send(request)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def passthrough(send, *args, **kwargs):
+    """Hook doing nothing."""
+    return send(*args, **kwargs)
+
+
+def run():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Patching benchmark.')
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+    original = HTTPAdapter.send
+    HTTPAdapter.send = stub_send
+    try:
+        baseline = measure(args.calls)
+        results = [('unpatched', baseline)]
+
+        patcher = mock.patch.object(
+            HTTPAdapter, 'send', side_effect=stub_send, autospec=True
+        )
+        patcher.start()
+        results.append(('mock.patch autospec', measure(args.calls)))
+        patcher.stop()
+
+        send_patch = patch(HTTPAdapter, 'send')
+        send_patch.install(passthrough)
+        results.append(('patching engine', measure(args.calls)))
+        send_patch.uninstall(passthrough)
+
+        monitor = Monitor(response_mode='status')
+        results.append(('Monitor', measure(args.calls)))
+        monitor.stop()
+    finally:
+        HTTPAdapter.send = original
+    for name, ns in results:
+        print('{:<20} {:>9.0f} ns/call {:>+9.0f} ns overhead'.format(
+            name, ns, ns - baseline
+        ))
+
+
+if __name__ == '__main__':
+    run()
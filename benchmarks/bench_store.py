@@ -0,0 +1,63 @@
+"""Server store ingest benchmark: in memory vs file backed (WAL).
+
+Run with:
+python benchmarks/bench_store.py [--records 200000] [--batch 100]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from monitor_requests.server import init_db
+
+
+def make_records(count):
+    """Build records with a realistic mix of repeated keys."""
+    return [{
+        'url': 'http://example.com/api/{}'.format(i % 50),
+        'method': ('GET', 'POST')[i % 2],
+        'domain': 'example.com',
+        'response_content': '<html>{}</html>'.format(i % 7),
+        'response_status_code': 200,
+        'duration': 0.01,
+        'traceback_list': [
+            '  File "tests/test_{}.py", line {}, in test\n'.format(i % 20, n)
+            for n in range(15)
+        ]
+    } for i in range(count)]
+
+
+def ingest(store, records, batch):
+    """Ingest records in batches, return records per second."""
+    start = time.perf_counter()
+    for i in range(0, len(records), batch):
+        store.add(records[i:i + batch])
+        if store.group_commit and i % (batch * 20) == 0:
+            store.commit()
+    store.commit()
+    return len(records) / (time.perf_counter() - start)
+
+
+def run():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Store ingest benchmark.')
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+    records = make_records(args.records)
+    memory = ingest(init_db(), records, args.batch)
+    print('memory: {:>10.0f} records/s'.format(memory))
+    directory = tempfile.mkdtemp()
+    try:
+        store = init_db(os.path.join(directory, 'monitor.db'))
+        disk = ingest(store, records, args.batch)
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+    print('wal:    {:>10.0f} records/s ({:.0%} of memory)'.format(
+        disk, disk / memory
+    ))
+
+
+if __name__ == '__main__':
+    run()
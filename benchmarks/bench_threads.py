@@ -0,0 +1,76 @@
+"""Throughput of a Monitor with many threads sending at once.
+
+HTTPAdapter.send is stubbed out so only the monitoring overhead is
+measured; totals are checked against the number of requests sent.
+
+Run with:
+python benchmarks/bench_threads.py [--threads 1 4 16 64] [--calls 2000]
+"""
+import argparse
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from monitor_requests import Monitor
+
+
+def stub_send(self, request, *args, **kwargs):
+    """Stand-in for the network: a canned response."""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'<html>example</html>'
+    response.url = request.url
+    return response
+
+
+def hammer(threads, calls):
+    """Send calls requests from each of threads threads.
+
+    :return: Tuple. (seconds, requests counted by the Monitor).
+    """
+    monitor = Monitor(response_mode='status')
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        session = requests.Session()
+        # Skip proxy and netrc lookups, which dwarf the monitoring cost.
+        session.trust_env = False
+        barrier.wait()
+        for call in range(calls):
+            session.get('http://example.com/{}'.format(call % 16))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+    return elapsed, monitor.data.retrieve()[1]['total_requests']
+
+
+def run():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Threaded benchmark.')
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=[1, 4, 16, 64])
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+    original = HTTPAdapter.send
+    HTTPAdapter.send = stub_send
+    try:
+        for threads in args.threads:
+            elapsed, counted = hammer(threads, args.calls)
+            sent = threads * args.calls
+            print('{:>3} threads {:>9.0f} req/s counted {}/{}{}'.format(
+                threads, sent / elapsed, counted, sent,
+                '' if counted == sent else ' LOST'
+            ))
+    finally:
+        HTTPAdapter.send = original
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,89 @@
+"""Batch wire format benchmark: JSON lists vs encoded batches.
+
+Measures payload bytes per record and server side decode plus ingest time.
+
+Run with:
+python benchmarks/bench_wire.py [--records 100000] [--batch 100]
+"""
+import argparse
+import json
+import time
+from monitor_requests.server import init_db
+from monitor_requests.wire import JSON, MSGPACK, Encoder, decode, msgpack
+
+
+def make_records(count):
+    """Build serialized records: deep stacks, a few distinct responses."""
+    return [{
+        'url': 'http://example.com/api/{}'.format(i % 50),
+        'method': ('GET', 'POST')[i % 2],
+        'domain': 'example.com',
+        'response_content': '{"items": [' + '{}, '.format(i % 7) * 200 + ']}',
+        'response_status_code': 200,
+        'duration': 0.01,
+        'duration_ns': 10000000,
+        'traceback_list': [
+            '  File "/srv/app/tests/test_{}.py", line {}, in test_{}\n'
+            '    response = client.get(url)\n'.format(i % 20, n, n)
+            for n in range(30)
+        ],
+        'call_site': '/srv/app/tests/test_{}.py:29 in test_29'.format(i % 20),
+        'timestamp': 1700000000.0 + i,
+        'request_header_bytes': 150,
+        'request_body_bytes': 0,
+        'response_header_bytes': 200,
+        'response_body_bytes': 1000
+    } for i in range(count)]
+
+
+def run_format(name, records, batch, encode):
+    """Encode every batch, then decode and ingest them on a fresh store."""
+    start = time.perf_counter()
+    bodies = [
+        encode(records[i:i + batch]) for i in range(0, len(records), batch)
+    ]
+    encoded = time.perf_counter() - start
+    store = init_db()
+    start = time.perf_counter()
+    for body, headers in bodies:
+        store.add(*decode(
+            body, headers['Content-Type'], headers.get('Content-Encoding')
+        ))
+    ingested = time.perf_counter() - start
+    size = sum(len(body) for body, _ in bodies)
+    print('{:<8} {:>8.0f} bytes/record  client {:>6.2f}us  server {:>6.2f}us'
+          ' per record'.format(
+              name, float(size) / len(records),
+              encoded / len(records) * 1e6, ingested / len(records) * 1e6
+          ))
+    return size, ingested
+
+
+def run():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Wire format benchmark.')
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+    records = make_records(args.records)
+    size, ingested = run_format(
+        'json', records, args.batch,
+        lambda batch: (json.dumps(batch).encode('utf-8'), {
+            'Content-Type': JSON
+        })
+    )
+    for content_type in (JSON, MSGPACK):
+        if content_type == MSGPACK and msgpack is None:
+            continue
+        encoder = Encoder(content_type)
+        wire_size, wire_ingested = run_format(
+            content_type.split('/')[-1].replace('x-', ''), records,
+            args.batch, encoder.encode
+        )
+        print('{:<8} {:.0f}x smaller, server {:.1f}x faster'.format(
+            '', float(size) / wire_size, ingested / wire_ingested
+        ))
+
+
+if __name__ == '__main__':
+    run()
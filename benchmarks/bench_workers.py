@@ -0,0 +1,136 @@
+"""Server ingest benchmark: one worker vs --workers N.
+
+Starts monitor_requests_server, then client processes POST encoded batches
+(see wire.Encoder) as fast as it answers. Throughput scales with workers
+while there are cores for them and for the clients.
+
+Run with:
+python benchmarks/bench_workers.py [--workers 1 4] [--clients 8]
+    [--records 200000] [--batch 100]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib3
+from monitor_requests.wire import Encoder
+
+PORT = 9151
+
+
+def make_records(client, count):
+    """Build serialized records: 50 urls, a few stacks per client."""
+    return [{
+        'url': 'http://example.com/api/{}'.format(i % 50),
+        'method': ('GET', 'POST')[i % 2],
+        'domain': 'example.com',
+        'response_content': '{"id": 1}',
+        'response_status_code': 200,
+        'duration': 0.01,
+        'duration_ns': 10000000,
+        'traceback_list': [
+            '  File "/srv/app/client_{}.py", line {}, in call\n'.format(
+                client, i % 5
+            )
+        ],
+        'call_site': '/srv/app/client_{}.py:{} in call'.format(client, i % 5),
+        'timestamp': 1700000000.0 + i,
+        'request_header_bytes': 150,
+        'request_body_bytes': 0,
+        'response_header_bytes': 200,
+        'response_body_bytes': 1000
+    } for i in range(count)]
+
+
+def client(args):
+    """POST every batch, return the number of records sent."""
+    index, count, batch, start = args
+    records = make_records(index, count)
+    encoder = Encoder()
+    pool = urllib3.HTTPConnectionPool('localhost', PORT, maxsize=1)
+    while time.time() < start:
+        time.sleep(0.001)
+    for i in range(0, count, batch):
+        body, headers = encoder.encode(records[i:i + batch])
+        resp = pool.request('POST', '/batch', headers=headers, body=body)
+        if resp.status == 409:
+            # Another worker got the texts: send them again.
+            encoder.refused(json.loads(resp.data)['missing'])
+            body, headers = encoder.encode(records[i:i + batch])
+            resp = pool.request('POST', '/batch', headers=headers, body=body)
+        if resp.status != 200:
+            raise Exception('Server error: {}.'.format(resp.status))
+    return count
+
+
+def wait_for_port():
+    """Wait until the server accepts connections."""
+    for _ in range(100):
+        try:
+            socket.create_connection(('localhost', PORT)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise Exception('Server did not start.')
+
+
+def run_workers(workers, clients, records, batch):
+    """Measure ingest throughput with a number of workers."""
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'monitor_requests.server', '-p', str(PORT),
+         '--workers', str(workers)],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port()
+        time.sleep(0.5)
+        per_client = records // clients
+        start = time.time() + 0.5
+        pool = multiprocessing.Pool(clients)
+        sent = sum(pool.map(client, [
+            (index, per_client, batch, start) for index in range(clients)
+        ]))
+        elapsed = time.time() - start
+        pool.close()
+        data = json.loads(urllib3.PoolManager().request(
+            'GET', 'http://localhost:{}/'.format(PORT)
+        ).data)
+        stored = data['analysis']['total_requests']
+        if stored != sent:
+            raise Exception('Stored {} of {} records.'.format(stored, sent))
+        rate = sent / elapsed
+        print('{:>3} workers {:>10.0f} records/s'.format(workers, rate))
+        return rate
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Server workers benchmark.')
+    parser.add_argument(
+        '--workers', type=int, nargs='+',
+        default=[1, min(os.cpu_count() or 1, 4)]
+    )
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+    print('{} cores, {} clients'.format(os.cpu_count(), args.clients))
+    rates = [
+        run_workers(workers, args.clients, args.records, args.batch)
+        for workers in args.workers
+    ]
+    for workers, rate in zip(args.workers[1:], rates[1:]):
+        print('{} workers: {:.2f}x one worker'.format(
+            workers, rate / rates[0]
+        ))
+
+
+if __name__ == '__main__':
+    run()
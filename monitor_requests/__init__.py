@@ -1,12 +1,26 @@
 """Monitor Requests."""
-import datetime
-import re
 import sys
-import traceback
-import mock
-from requests.utils import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool
+from .budgets import check_budgets, read_baseline, write_baseline
+from .capture import ResponseCapture
+from .cassette import Cassette
+from .clients import ClientHook, client_hooks  # noqa: F401 (public)
+from .connections import ConnectionTracker
 from .data import DataHandler
+from .filters import DomainFilter, netloc
+from .flamegraph import COUNT, collapse, write_collapsed
+from .histogram import clock_ns
+from .normalize import URLNormalizer
 from .output import OutputHandler
+from .patching import patch
+from .sampling import Sampler
+from .stacks import StackCapture
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7: tasks share the latest test.
+    contextvars = None
 
 __version__ = '2.1.1'
 
@@ -18,7 +32,29 @@ class Monitor(object):
     # unittest.mock / mock and responses will not show up in tracebacks.
     MOCKING_LIBRARIES = ('requests_mock',)
 
-    def __init__(self, domains=[], server_port=None, mocking=True):
+    def __init__(
+        self,
+        domains=[],
+        server_port=None,
+        mocking=True,
+        server_socket=None,
+        batch_size=100,
+        flush_interval=0.5,
+        response_mode='full',
+        response_budget=None,
+        response_prefix=64,
+        spool_dir=None,
+        url_normalizer=None,
+        exclude_domains=[],
+        hosts=[],
+        exclude_hosts=[],
+        sample_rate=1.0,
+        adaptive=False,
+        cassette=None,
+        cassette_mode='once',
+        session=None,
+        clients=None
+    ):
         """Initialize Monitor, hot patch requests.
 
         :param domains: List. Regex patterns to match against.
@@ -26,67 +62,157 @@ class Monitor(object):
         running on the specified port.
         :param mocking: Boolean. Mock requests. Default True, set to False
         when running in server mode from the test suite/session level.
+        :param server_socket: String. Server mode over a Unix domain socket:
+        with monitor_requests_server --unix-socket running on this path.
+        :param batch_size: Int. Server mode: requests sent per batch.
+        :param flush_interval: Float. Server mode: max seconds between batches.
+        :param response_mode: String. 'status' (status codes only), 'digest'
+        (sha1, size and a prefix of each body) or 'full' (bodies).
+        :param response_budget: Int. Full mode: max bytes kept per body.
+        :param response_prefix: Int. Digest mode: bytes kept per body.
+        :param spool_dir: String. Spool mode: each process appends to its own
+        file in this directory, merged on refresh (or monitor_requests_merge).
+        :param url_normalizer: Log urls by template, e.g. /users/{id}. True
+        for the built in URLNormalizer, or a URLNormalizer (or any callable
+        mapping a url to its template).
+        :param exclude_domains: List. Regex patterns never monitored.
+        :param hosts: List. Host names to monitor, exact ('example.com') or
+        including subdomains ('.example.com'). Combined with domains.
+        :param exclude_hosts: List. Host names never monitored.
+        :param sample_rate: Float. Fraction of requests whose traceback and
+        response are captured. Counts and durations are always exact.
+        :param adaptive: Boolean. Always capture the first request per url
+        (template), then back off exponentially: 2nd, 4th, 8th...
+        :param cassette: String. Cassette file: responses are replayed from
+        it instead of the network, and recorded into it (needs mocking).
+        :param cassette_mode: String. 'once' (replay, record misses),
+        'record' (re-record everything) or 'replay' (misses raise
+        ConnectionError).
+        :param session: String. Server mode: log into this named session
+        (letters, digits, '_', '.' and '-'), isolated from other runs.
+        :param clients: List. Other HTTP clients to monitor: 'httpx',
+        'aiohttp' or ClientHook subclasses. Default: those installed.
         """
-        self.domain_patterns = [
-            re.compile(domain_pattern) for domain_pattern in domains
-        ]
-        self.data = DataHandler(server_port=server_port)
+        self.domain_filter = DomainFilter(
+            domains, exclude_domains, hosts, exclude_hosts
+        )
+        if url_normalizer is True:
+            url_normalizer = URLNormalizer()
+        self.url_normalizer = url_normalizer
+        self.sampler = None
+        if sample_rate < 1 or adaptive:
+            self.sampler = Sampler(sample_rate, adaptive)
+        self.cassette = None
+        if cassette:
+            self.cassette = Cassette(cassette, cassette_mode)
+        self.stacks = StackCapture(self.MOCKING_LIBRARIES)
+        self._test_var = None
+        if contextvars is not None:
+            self._test_var = contextvars.ContextVar('monitor_requests_test')
+        self.test = None
+        self.data = DataHandler(
+            stacks=self.stacks,
+            server_port=server_port,
+            server_socket=server_socket,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            response_capture=ResponseCapture(
+                response_mode, response_budget, response_prefix
+            ),
+            spool_dir=spool_dir,
+            session=session
+        )
         # Mocking
         self.mocking = mocking
+        self.connections = ConnectionTracker()
+        self.send_patch = patch(HTTPAdapter, 'send')
+        self.pool_patch = patch(HTTPConnectionPool, '_get_conn')
+        self.client_hooks = [hook(self) for hook in client_hooks(clients)]
         if mocking:
-            from requests.adapters import HTTPAdapter
-            self.stock_send = HTTPAdapter.send
-            self.send_patcher = mock.patch.object(
-                HTTPAdapter,
-                'send',
-                side_effect=self._generate_mocked_send(),
-                autospec=True
-            )
-            self.send_patcher.start()
-
-    def _generate_mocked_send(self):
-        """Generate mock function for http request.
-
-        :return: Mocked send method for HTTPAdapter.
+            self.send_patch.install(self._send)
+            self.pool_patch.install(self.connections.get_conn)
+            for hook in self.client_hooks:
+                hook.install()
+
+    @property
+    def test(self):
+        """Node ID of the running test, set by the pytest plugin.
+
+        Tasks (and contexts copied from the setter's) keep the test they
+        started in, other threads see the latest.
         """
-        def mock_send(instance, request, *args, **kwargs):
-            start = datetime.datetime.now()
-            response = self.stock_send(instance, request, *args, **kwargs)
-            duration = (datetime.datetime.now() - start).total_seconds()
-            self._log_request(request.url, request.method, response, duration)
-            return response
-        return mock_send
-
-    def _check_domain(self, domain):
-        if not self.domain_patterns:
-            return True
-        matched = False
-        for pattern in self.domain_patterns:
-            if pattern.search(domain):
-                matched = True
-        return matched
-
-    def _check_mocked(self, tb_list):
-        traceback = str(tb_list)
-        for library in self.MOCKING_LIBRARIES:
-            if '/{}/'.format(library) in traceback:
-                return True
-        return False
-
-    def _log_request(self, url, method, response, duration):
-        """Log request, store traceback/response data and update counts."""
-        domain = urlparse(url).netloc
-        if not self._check_domain(domain):
-            return
-        m_init = 'monitor_requests/__init__.py'
-        tb_list = [f for f in traceback.format_stack() if m_init not in f]
-        if self._check_mocked(tb_list):
+        if self._test_var is None:
+            return self._test
+        return self._test_var.get(self._test)
+
+    @test.setter
+    def test(self, nodeid):
+        self._test = nodeid
+        if self._test_var is not None:
+            self._test_var.set(nodeid)
+
+    def _send(self, send, instance, request, *args, **kwargs):
+        """Hook around HTTPAdapter.send: time and log the request.
+
+        :param send: Callable. Next hook, or the original send.
+        """
+        start = clock_ns()
+        response = None
+        if self.cassette is not None:
+            response = self.cassette.play(instance, request)
+        if response is None:
+            response = send(instance, request, *args, **kwargs)
+            duration_ns = clock_ns() - start
+            connection = self.connections.observe(instance, response)
+            if self.cassette is not None:
+                self.cassette.record(request, response)
+        else:
+            # Replayed: no connection was used.
+            duration_ns = clock_ns() - start
+            connection = None
+        self._log_request(
+            request.url, request.method, response, duration_ns, connection
+        )
+        return response
+
+    def _log_request(
+        self, url, method, response, duration_ns, connection=None,
+        block=True
+    ):
+        """Log request, store traceback/response data and update counts.
+
+        :param block: Boolean. False from an event loop (see DataHandler.log).
+        """
+        domain = netloc(url)
+        if not self.domain_filter.allowed(domain):
             return
-        self.data.log(url, domain, method, response, tb_list, duration)
+        raw_url = None
+        if self.url_normalizer:
+            raw_url, url = url, self.url_normalizer(url)
+        site = None
+        if self.sampler is None or self.sampler(url):
+            stack = self.stacks.capture()
+            if stack is None:
+                return
+        else:
+            stack = None
+            site = self.stacks.call_site()
+            if site is None:
+                return
+        self.data.log(
+            url, domain, method, response, stack, duration_ns, raw_url, site,
+            connection, self.test, block
+        )
 
     def refresh(self):
         """Refresh data from store (server or instance)."""
+        self.data.flush()
         self.logged_requests, self.analysis = self.data.retrieve()
+        if self.cassette is not None:
+            self.analysis['cassette'] = {
+                'hits': self.cassette.hits,
+                'misses': list(self.cassette.misses)
+            }
 
     def report(
         self,
@@ -121,13 +247,51 @@ class Monitor(object):
         if tear_down:
             self.stop(delete=True)
 
+    def flamegraph(self, output=sys.stdout, weight=COUNT):
+        """Write captured stacks in collapsed format, for flamegraphs.
+
+        :param output: Stream. Output destination.
+        :param weight: String. 'count' (requests) or 'latency' (total
+        microseconds spent in the requests).
+        """
+        self.refresh()
+        write_collapsed(output, collapse(self.logged_requests, weight))
+
+    def write_baseline(self, path):
+        """Write a budget baseline file from the data so far.
+
+        :param path: String. Baseline file, checked by check_budgets.
+        """
+        self.refresh()
+        write_baseline(path, self.logged_requests, self.analysis)
+
+    def check_budgets(self, path, **tolerances):
+        """Compare the data so far with a baseline file.
+
+        :param path: String. Baseline file, from write_baseline.
+        :param tolerances: calls, latency, latency_slack and percentile
+        (see budgets.check_budgets).
+        :return: List. Regressions, empty if none (see budgets.describe).
+        """
+        self.refresh()
+        return check_budgets(
+            read_baseline(path), self.logged_requests, self.analysis,
+            **tolerances
+        )
+
     def stop(self, delete=False):
         """Undo the hotpatching.
 
         :param delete: Boolean. Delete data (only with server mode).
         """
+        self.data.flush()
+        if self.cassette is not None:
+            self.cassette.close()
         if delete:
             self.data.delete()
         if not self.mocking:
             return
-        self.send_patcher.stop()
+        self.send_patch.uninstall(self._send)
+        self.pool_patch.uninstall(self.connections.get_conn)
+        for hook in self.client_hooks:
+            hook.uninstall()
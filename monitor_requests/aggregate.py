@@ -0,0 +1,264 @@
+"""Aggregation of logged requests into logged_requests and analysis."""
+from . import connections, repeats
+from .histogram import Histogram
+from .sizes import add_bytes
+
+# Raw urls kept per url template.
+MAX_EXAMPLES = 5
+
+
+def histogram_for(histograms, key):
+    """Get or create the histogram for a key."""
+    if key not in histograms:
+        histograms[key] = Histogram()
+    return histograms[key]
+
+
+class Aggregator(object):
+    """Aggregate logged requests, keeping only unique values per url.
+
+    Tracebacks and responses come from sampled requests only.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self.logged_requests = {}
+        self.analysis = {
+            'total_requests': 0,
+            'sampled_requests': 0,
+            'domains': set(),
+            'duration': 0
+        }
+        self.latency = {'domains': {}, 'methods': {}}
+        self.repeats = {}
+        self.connections = {}
+        self.bytes = {'total': {}, 'domains': {}, 'methods': {}}
+        # Test node ID -> [count, duration_ns] (see pytest_plugin.py).
+        self.tests = {}
+
+    def _logged(self, url):
+        """Aggregated data for a url, created on first use."""
+        logged = self.logged_requests.get(url)
+        if logged is None:
+            logged = self.logged_requests[url] = {
+                'count': 0,
+                'sampled': 0,
+                'methods': set(),
+                'tracebacks': set(),
+                'responses': set(),
+                'latency': Histogram(),
+                'examples': set(),
+                'bytes': {},
+                'stacks': {}
+            }
+        return logged
+
+    def add(self, record):
+        """Add a logged request.
+
+        :param record: Dict. Logged request, as posted to the server.
+        """
+        url = record['url']
+        duration_ns = record.get('duration_ns')
+        if duration_ns is None:
+            duration_ns = int(record['duration'] * 1e9)
+        logged = self._logged(url)
+        logged['count'] += 1
+        logged['methods'].add(record['method'])
+        if record.get('sampled', True):
+            logged['sampled'] += 1
+            traceback_list = tuple(record['traceback_list'])
+            logged['tracebacks'].add(traceback_list)
+            stack = logged['stacks'].get((record['method'], traceback_list))
+            if stack is None:
+                stack = logged['stacks'][
+                    (record['method'], traceback_list)
+                ] = [0, 0]
+            stack[0] += 1
+            stack[1] += duration_ns
+            logged['responses'].add((
+                record['response_status_code'],
+                record['response_content']
+            ))
+            self.analysis['sampled_requests'] += 1
+        logged['latency'].record(duration_ns)
+        examples = logged['examples']
+        raw_url = record.get('raw_url')
+        if raw_url and raw_url != url and len(examples) < MAX_EXAMPLES:
+            examples.add(raw_url)
+        histogram_for(self.latency['domains'], record['domain']).record(
+            duration_ns
+        )
+        histogram_for(self.latency['methods'], record['method']).record(
+            duration_ns
+        )
+        add_bytes(logged['bytes'], record)
+        add_bytes(self.bytes['total'], record)
+        add_bytes(
+            self.bytes['domains'].setdefault(record['domain'], {}), record
+        )
+        add_bytes(
+            self.bytes['methods'].setdefault(record['method'], {}), record
+        )
+        repeats.tally(self.repeats, record, duration_ns)
+        connections.tally(self.connections, record)
+        test = record.get('test')
+        if test is not None:
+            tallied = self.tests.setdefault(test, [0, 0])
+            tallied[0] += 1
+            tallied[1] += duration_ns
+        self.analysis['duration'] += record['duration']
+        self.analysis['total_requests'] += 1
+        self.analysis['domains'].add(record['domain'])
+
+    def results(self, render=None):
+        """Snapshot of the aggregated data.
+
+        :param render: Callable. Applied to each stored traceback.
+        :return: Tuple. (logged_requests, analysis), histograms as dicts.
+        """
+        logged_requests = {}
+        for url, logged in self.logged_requests.items():
+            tracebacks = logged['tracebacks']
+            if render is not None:
+                tracebacks = set(render(tb) for tb in tracebacks)
+            logged_requests[url] = dict(
+                logged,
+                methods=set(logged['methods']),
+                tracebacks=tracebacks,
+                responses=set(logged['responses']),
+                latency=logged['latency'].to_dict(),
+                examples=set(logged['examples']),
+                bytes=dict(logged['bytes']),
+                stacks=[
+                    {
+                        'method': method,
+                        'traceback': render(tb) if render else tb,
+                        'count': count,
+                        'duration_ns': duration_ns
+                    }
+                    for (method, tb), (count, duration_ns)
+                    in logged['stacks'].items()
+                ]
+            )
+        analysis = dict(self.analysis, domains=set(self.analysis['domains']))
+        analysis['latency'] = dict(
+            (kind, dict(
+                (key, histogram.to_dict())
+                for key, histogram in histograms.items()
+            ))
+            for kind, histograms in self.latency.items()
+        )
+        analysis['bytes'] = {
+            'total': dict(self.bytes['total']),
+            'domains': dict(
+                (key, dict(sums))
+                for key, sums in self.bytes['domains'].items()
+            ),
+            'methods': dict(
+                (key, dict(sums))
+                for key, sums in self.bytes['methods'].items()
+            )
+        }
+        analysis['repeats'] = [
+            {
+                'url': url,
+                'method': method,
+                'call_site': call_site,
+                'test': test,
+                'count': count,
+                'duration_ns': duration_ns,
+                'first': first,
+                'last': last,
+                'repeated': repeated,
+                'repeated_ns': repeated_ns,
+                'repeated_gap': repeated_gap
+            }
+            for (url, method, call_site, test), (
+                count, duration_ns, first, last,
+                repeated, repeated_ns, repeated_gap
+            ) in self.repeats.items() if count > 1
+        ]
+        analysis['connections'] = [
+            dict(
+                zip(connections.COLUMNS, counts),
+                domain=domain,
+                call_site=call_site
+            )
+            for (domain, call_site), counts in self.connections.items()
+        ]
+        if self.tests:
+            analysis['tests'] = [
+                {'test': test, 'count': count, 'duration_ns': duration_ns}
+                for test, (count, duration_ns) in self.tests.items()
+            ]
+        return logged_requests, analysis
+
+    def merge(self, logged_requests, analysis):
+        """Add the results of another aggregator, from another process.
+
+        Results may have been through JSON: lists for sets and tuples.
+        Repeats are listed from 2 calls on, single calls are not merged.
+        :param logged_requests: Dict. As returned by results.
+        :param analysis: Dict. As returned by results.
+        """
+        for url, other in logged_requests.items():
+            logged = self._logged(url)
+            logged['count'] += other['count']
+            logged['sampled'] += other.get('sampled', other['count'])
+            logged['methods'].update(other['methods'])
+            logged['tracebacks'].update(
+                tuple(tb) for tb in other['tracebacks']
+            )
+            logged['responses'].update(
+                tuple(rs) for rs in other['responses']
+            )
+            if 'latency' in other:
+                logged['latency'].merge(Histogram.from_dict(other['latency']))
+            logged['examples'].update(other.get('examples', ()))
+            add_bytes(logged['bytes'], other.get('bytes', {}))
+            for stack in other.get('stacks', []):
+                tallied = logged['stacks'].setdefault(
+                    (stack['method'], tuple(stack['traceback'])), [0, 0]
+                )
+                tallied[0] += stack['count']
+                tallied[1] += stack['duration_ns']
+        for key in ('total_requests', 'sampled_requests', 'duration'):
+            self.analysis[key] += analysis.get(key, 0)
+        self.analysis['domains'].update(analysis['domains'])
+        for kind, histograms in analysis.get('latency', {}).items():
+            for key, data in histograms.items():
+                histogram_for(self.latency[kind], key).merge(
+                    Histogram.from_dict(data)
+                )
+        sums = analysis.get('bytes', {})
+        add_bytes(self.bytes['total'], sums.get('total', {}))
+        for kind in ('domains', 'methods'):
+            for key, other in sums.get(kind, {}).items():
+                add_bytes(self.bytes[kind].setdefault(key, {}), other)
+        for repeat in analysis.get('repeats', []):
+            key = (
+                repeat['url'], repeat['method'], repeat['call_site'],
+                repeat['test']
+            )
+            tallied = self.repeats.setdefault(
+                key, repeats.seed(repeat['first'])
+            )
+            tallied[0] += repeat['count']
+            tallied[1] += repeat['duration_ns']
+            tallied[2] = min(tallied[2], repeat['first'])
+            tallied[3] = max(tallied[3], repeat['last'])
+            tallied[4] += repeat['repeated']
+            tallied[5] += repeat['repeated_ns']
+            tallied[6] += repeat['repeated_gap']
+        for row in analysis.get('connections', []):
+            tallied = self.connections.setdefault(
+                (row['domain'], row['call_site']),
+                [0] * len(connections.COLUMNS)
+            )
+            for index, column in enumerate(connections.COLUMNS):
+                tallied[index] += row.get(column, 0)
+        for row in analysis.get('tests', []):
+            tallied = self.tests.setdefault(row['test'], [0, 0])
+            tallied[0] += row['count']
+            tallied[1] += row['duration_ns']
@@ -0,0 +1,223 @@
+"""External call and latency budgets, checked against a baseline.
+
+A baseline is written from a run's (logged_requests, analysis): calls and
+latency percentiles per url (template), calls and time per test (see
+pytest_plugin.py), and totals. Later runs are checked against it, from the
+same aggregates, and fail on more calls or slower calls than allowed.
+
+Run with:
+monitor_requests_budget BASELINE
+Optional arguments:
+-p 9001 (server on this port)
+--unix-socket=/tmp/monitor_requests.sock (server on this socket)
+--session=build-123 (a session's data on the server)
+--spool=SPOOL_DIR_OR_FILE (instead of a server, repeatable)
+--write (write BASELINE from this run instead of checking it)
+--calls=0.1 (extra calls allowed, as a fraction of the baseline's)
+--latency=0.25 (extra latency allowed, as a fraction of the baseline's)
+--latency-slack=5 (extra latency allowed, in milliseconds)
+--percentile=90 (latency percentile compared per url: 50, 90 or 99)
+Exits with status 1 on regressions.
+"""
+import argparse
+import json
+import sys
+from .histogram import Histogram
+from .merge import merge_spools
+from .transport import fetch
+
+# Bumped on format changes, baselines from other versions are refused.
+BASELINE_VERSION = 1
+
+PERCENTILES = (50, 90, 99)
+
+
+def _ms(value_ns):
+    return round(value_ns / 1e6, 3)
+
+
+def baseline(logged_requests, analysis):
+    """Build a baseline from a run's aggregates.
+
+    :param logged_requests: Dict. As passed to OutputHandler.
+    :param analysis: Dict. As passed to OutputHandler.
+    :return: Dict. JSON serializable.
+    """
+    urls = {}
+    for url, logged in logged_requests.items():
+        histogram = Histogram.from_dict(logged['latency'])
+        urls[url] = dict(
+            ('p{}'.format(percent), _ms(histogram.percentile(percent)))
+            for percent in PERCENTILES
+        )
+        urls[url]['count'] = logged['count']
+    return {
+        'version': BASELINE_VERSION,
+        'total': {
+            'count': analysis['total_requests'],
+            'duration_ms': round(analysis['duration'] * 1e3, 3)
+        },
+        'urls': urls,
+        'tests': dict(
+            (test['test'], {
+                'count': test['count'],
+                'duration_ms': _ms(test['duration_ns'])
+            })
+            for test in analysis.get('tests', [])
+        )
+    }
+
+
+def write_baseline(path, logged_requests, analysis):
+    """Write a baseline file (see baseline)."""
+    with open(path, 'w') as f:
+        json.dump(
+            baseline(logged_requests, analysis), f, indent=2, sort_keys=True
+        )
+        f.write('\n')
+
+
+def read_baseline(path):
+    """Read a baseline file."""
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != BASELINE_VERSION:
+        raise Exception(
+            'Monitor Requests baseline version {} (expected {}), '
+            'write it again.'.format(data.get('version'), BASELINE_VERSION)
+        )
+    return data
+
+
+def check_budgets(
+    base,
+    logged_requests,
+    analysis,
+    calls=0.0,
+    latency=0.25,
+    latency_slack=5.0,
+    percentile=90
+):
+    """Compare a run with a baseline.
+
+    Urls and tests missing from the baseline are regressions: they add
+    external calls. Fewer or faster calls never are.
+    :param base: Dict. As returned by baseline (or read_baseline).
+    :param logged_requests: Dict. As passed to OutputHandler.
+    :param analysis: Dict. As passed to OutputHandler.
+    :param calls: Float. Extra calls allowed, as a fraction of the
+    baseline's, per url, per test and in total.
+    :param latency: Float. Extra latency allowed, as a fraction.
+    :param latency_slack: Float. Extra latency allowed, in milliseconds, so
+    fast calls do not fail on noise.
+    :param percentile: Int. Latency percentile compared per url.
+    :return: List. Regressions: dicts with kind ('total', 'url' or
+    'test'), key, metric, baseline, current and limit (baseline and limit
+    are None for new urls and tests).
+    """
+    if percentile not in PERCENTILES:
+        raise ValueError('Unknown budget percentile: {}.'.format(percentile))
+    metric = 'p{}'.format(percentile)
+    current = baseline(logged_requests, analysis)
+    regressions = []
+
+    def compare(kind, key, name, value, base_value, slack=0.0):
+        tolerance = latency if name != 'count' else calls
+        limit = base_value * (1 + tolerance) + slack
+        if value > limit:
+            regressions.append({
+                'kind': kind,
+                'key': key,
+                'metric': name,
+                'baseline': base_value,
+                'current': value,
+                'limit': limit
+            })
+
+    for name in ('count', 'duration_ms'):
+        compare(
+            'total', None, name, current['total'][name], base['total'][name],
+            latency_slack if name != 'count' else 0.0
+        )
+    for kind, name in (('urls', metric), ('tests', 'duration_ms')):
+        for key, values in sorted(current[kind].items()):
+            base_values = base[kind].get(key)
+            if base_values is None:
+                regressions.append({
+                    'kind': kind[:-1],
+                    'key': key,
+                    'metric': 'count',
+                    'baseline': None,
+                    'current': values['count'],
+                    'limit': None
+                })
+                continue
+            compare(
+                kind[:-1], key, 'count', values['count'], base_values['count']
+            )
+            compare(
+                kind[:-1], key, name, values[name], base_values[name],
+                latency_slack
+            )
+    return regressions
+
+
+def describe(regression):
+    """One line description of a regression."""
+    key = regression['key']
+    where = 'Total' if key is None else '{} {}'.format(
+        regression['kind'].capitalize(), key
+    )
+    if regression['baseline'] is None:
+        return '{}: new, {} calls'.format(where, regression['current'])
+    unit = '' if regression['metric'] == 'count' else 'ms'
+    return '{}: {} {}{} (baseline {}{}, limit {:.3f}{})'.format(
+        where, regression['metric'], regression['current'], unit,
+        regression['baseline'], unit, regression['limit'], unit
+    )
+
+
+def run_budget():
+    """Check a run against a baseline (or write it), with arguments."""
+    parser = argparse.ArgumentParser(description='Check call budgets.')
+    parser.add_argument('baseline', help='Baseline file')
+    parser.add_argument('-p', '--port', type=int, required=False)
+    parser.add_argument('--unix-socket', required=False)
+    parser.add_argument('--session', required=False)
+    parser.add_argument('--spool', action='append', default=[])
+    parser.add_argument('--write', action='store_true')
+    parser.add_argument('--calls', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.25)
+    parser.add_argument('--latency-slack', type=float, default=5.0)
+    parser.add_argument(
+        '--percentile', type=int, choices=PERCENTILES, default=90
+    )
+    args = parser.parse_args()
+    if args.spool:
+        logged_requests, analysis = merge_spools(args.spool)
+    else:
+        logged_requests, analysis = fetch(
+            args.port or 9001, args.unix_socket, args.session
+        )
+    if args.write:
+        write_baseline(args.baseline, logged_requests, analysis)
+        print('Wrote {}'.format(args.baseline))
+        return
+    regressions = check_budgets(
+        read_baseline(args.baseline),
+        logged_requests,
+        analysis,
+        calls=args.calls,
+        latency=args.latency,
+        latency_slack=args.latency_slack,
+        percentile=args.percentile
+    )
+    for regression in regressions:
+        print(describe(regression))
+    if regressions:
+        sys.exit(1)
+    print('No regressions against {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    run_budget()
@@ -0,0 +1,179 @@
+"""Streaming-safe response capture."""
+import hashlib
+
+# Capture modes.
+STATUS = 'status'
+DIGEST = 'digest'
+FULL = 'full'
+MODES = (STATUS, DIGEST, FULL)
+
+
+class CapturedBody(object):
+    """Body of a single response, captured as the caller consumes it."""
+
+    def __init__(self, status_code, mode, budget, prefix_size, count=False):
+        """Initialize.
+
+        :param status_code: Int. Response status code.
+        :param mode: String. One of MODES.
+        :param budget: Int. Full mode: max bytes kept (None for no limit).
+        :param prefix_size: Int. Digest mode: bytes kept from the start.
+        :param count: Boolean. Status mode: count the body's bytes anyway.
+        """
+        self.status_code = status_code
+        self.mode = mode
+        self.limit = budget if mode == FULL else prefix_size
+        self.size = 0
+        self.wire_size = None
+        self.chunks = []
+        self.kept = 0
+        self.hash = hashlib.sha1() if mode == DIGEST else None
+        self.complete = mode == STATUS and not count
+        self.on_complete = None
+
+    def feed(self, data):
+        """Record a chunk of body bytes."""
+        if self.complete or not data:
+            return
+        self.size += len(data)
+        if self.mode == STATUS:
+            return
+        if self.hash is not None:
+            self.hash.update(data)
+        if self.limit is None:
+            self.chunks.append(data)
+        elif self.kept < self.limit:
+            data = data[:self.limit - self.kept]
+            self.chunks.append(data)
+            self.kept += len(data)
+
+    def finish(self, raw=None):
+        """Mark the body as fully consumed (or abandoned).
+
+        :param raw: Raw stream the body was read from, its position (bytes
+        read off the wire, before decoding) is kept as wire_size. urllib3
+        does not count chunked reads: 0 is taken as unknown.
+        """
+        if self.complete:
+            return
+        tell = getattr(raw, 'tell', None)
+        if tell is not None:
+            try:
+                self.wire_size = tell() or None
+            except (IOError, OSError, ValueError):
+                pass
+        self.complete = True
+        if self.on_complete is not None:
+            self.on_complete()
+
+    @property
+    def content(self):
+        """Captured content: bytes (full), a summary (digest), or None."""
+        if self.mode == STATUS:
+            return None
+        content = b''.join(self.chunks)
+        if self.mode == FULL:
+            return content
+        return 'sha1={} size={} prefix={!r}'.format(
+            self.hash.hexdigest(), self.size, content
+        )
+
+    def summary(self):
+        """Return (status_code, content)."""
+        return self.status_code, self.content
+
+
+class CapturingRaw(object):
+    """Wrap a response's raw stream, feeding a CapturedBody as it is read."""
+
+    def __init__(self, raw, body):
+        """Initialize.
+
+        :param raw: urllib3 HTTPResponse (or file-like object).
+        :param body: CapturedBody.
+        """
+        self._raw = raw
+        self._body = body
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def read(self, amt=None, *args, **kwargs):
+        """Read from the wrapped stream."""
+        data = self._raw.read(amt, *args, **kwargs)
+        self._body.feed(data)
+        if amt is None or not data:
+            self._body.finish(self._raw)
+        return data
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        """Stream from the wrapped stream."""
+        if hasattr(self._raw, 'stream'):
+            chunks = self._raw.stream(amt, decode_content=decode_content)
+        else:
+            chunks = iter(lambda: self._raw.read(amt), b'')
+        for chunk in chunks:
+            self._body.feed(chunk)
+            yield chunk
+        self._body.finish(self._raw)
+
+    def close(self):
+        """Close the wrapped stream."""
+        self._body.finish(self._raw)
+        return self._raw.close()
+
+
+class Exchange(object):
+    """A response from a client other than requests (see clients.py)."""
+
+    # Int. Response status code.
+    status_code = None
+    # Tuple. Sizes as in sizes.BYTE_COLUMNS, the body's None when unknown.
+    sizes = (0, 0, 0, None)
+
+    def wrap(self, body):
+        """Feed the body to a CapturedBody as it is read, then finish it."""
+        raise NotImplementedError
+
+
+class ResponseCapture(object):
+    """Configure and attach response capture."""
+
+    def __init__(self, mode=FULL, budget=None, prefix_size=64):
+        """Initialize.
+
+        :param mode: String. 'status': status code only. 'digest': sha1,
+        size and a bounded prefix. 'full': content up to budget bytes.
+        :param budget: Int. Full mode: max bytes kept per response.
+        :param prefix_size: Int. Digest mode: bytes kept per response.
+        """
+        if mode not in MODES:
+            raise ValueError('Unknown response capture mode: {}.'.format(mode))
+        self.mode = mode
+        self.budget = budget
+        self.prefix_size = prefix_size
+
+    def attach(self, response, count=False):
+        """Capture a response's body lazily, as the caller reads it.
+
+        :param response: requests.Response, its raw stream is wrapped. Or
+        an Exchange, wrapping its own.
+        :param count: Boolean. Status mode: count the body's bytes anyway.
+        :return: CapturedBody.
+        """
+        body = CapturedBody(
+            response.status_code, self.mode, self.budget, self.prefix_size,
+            count
+        )
+        if body.complete:
+            return body
+        if isinstance(response, Exchange):
+            response.wrap(body)
+            return body
+        if response.raw is None or response._content is not False:
+            # Nothing left to stream: use whatever is already loaded.
+            body.feed(response._content or b'')
+            body.finish(response.raw)
+            return body
+        response.raw = CapturingRaw(response.raw, body)
+        return body
@@ -0,0 +1,215 @@
+"""Record and replay responses, indexed by request.
+
+A cassette is a JSON lines file of recorded responses, with a sidecar index
+(path + '.idx') mapping request keys to byte ranges. Only the index is read
+on open, the cassette itself is memory mapped and responses are decoded on
+demand. A missing or stale index is rebuilt by scanning the cassette.
+"""
+import base64
+import hashlib
+import io
+import json
+import mmap
+import os
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from requests.exceptions import ConnectionError
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+# Cassette modes.
+ONCE = 'once'
+RECORD = 'record'
+REPLAY = 'replay'
+MODES = (ONCE, RECORD, REPLAY)
+
+# Not replayed: bodies are stored decoded and whole.
+DROPPED_HEADERS = frozenset((
+    'content-encoding', 'content-length', 'transfer-encoding'
+))
+
+
+def canonical_url(url):
+    """Url with a lower case scheme and host, and sorted query parameters."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, True)))
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path or '/',
+        query, ''
+    ))
+
+
+def request_key(method, url, body):
+    """Index key of a request: method, canonical url and body digest.
+
+    :param body: Bytes, String or None. Request body.
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(body).hexdigest() if body else ''
+    return hashlib.sha1('{} {} {}'.format(
+        method.upper(), canonical_url(url), digest
+    ).encode('utf-8')).hexdigest()
+
+
+class Cassette(object):
+    """Recorded responses, looked up by request key."""
+
+    def __init__(self, path, mode=ONCE):
+        """Initialize, loading the index only.
+
+        :param path: String. Cassette file, created when recording.
+        :param mode: String. 'once' (replay hits, record misses), 'record'
+        (always use the network, record everything) or 'replay' (replay
+        hits, misses raise ConnectionError).
+        """
+        if mode not in MODES:
+            raise ValueError('Cassette mode must be one of {}.'.format(
+                ', '.join(MODES)
+            ))
+        self.path = path
+        self.index_path = path + '.idx'
+        self.mode = mode
+        self.hits = 0
+        self.misses = []
+        self._index = {}
+        self._recorded = {}
+        self._map = None
+        self._file = None
+        self._offset = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        if mode != RECORD and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        size = os.path.getsize(self.path)
+        if size == 0:
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            index = None
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if index is not None and index.get('size') == size:
+            self._index = index['keys']
+            self._size = size
+        else:
+            self._index = self._scan()
+
+    def _scan(self):
+        """Index the cassette: key -> [offset, length] of its last line."""
+        index = {}
+        offset = 0
+        for line in iter(self._map.readline, b''):
+            if not line.endswith(b'\n'):
+                # Partially written line from an interrupted recording.
+                break
+            index[json.loads(line)['key']] = [offset, len(line)]
+            offset += len(line)
+        self._map.seek(0)
+        self._size = offset
+        return index
+
+    def _entry(self, key):
+        entry = self._recorded.get(key)
+        if entry is not None:
+            return entry
+        location = self._index.get(key)
+        if location is None:
+            return None
+        offset, length = location
+        return json.loads(self._map[offset:offset + length])
+
+    def play(self, adapter, request):
+        """Replayed response for a request, or None on a miss.
+
+        :param adapter: HTTPAdapter. Builds the response.
+        :param request: PreparedRequest.
+        :raises: ConnectionError. On a miss in replay mode.
+        """
+        if self.mode == RECORD or not self._replayable(request):
+            return None
+        key = request_key(request.method, request.url, request.body)
+        entry = self._entry(key)
+        if entry is None:
+            with self._lock:
+                self.misses.append((request.method, request.url))
+            if self.mode == REPLAY:
+                raise ConnectionError(
+                    'Monitor Requests cassette miss: {} {}'.format(
+                        request.method, request.url
+                    ),
+                    request=request
+                )
+            return None
+        with self._lock:
+            self.hits += 1
+        raw = HTTPResponse(
+            body=io.BytesIO(base64.b64decode(entry['body'])),
+            headers=HTTPHeaderDict(entry['headers']),
+            status=entry['status_code'],
+            reason=entry['reason'],
+            preload_content=False,
+            decode_content=False
+        )
+        return adapter.build_response(request, raw)
+
+    def record(self, request, response):
+        """Record a response (reading its body) unless replaying only.
+
+        :param request: PreparedRequest.
+        :param response: requests.Response.
+        """
+        if self.mode == REPLAY or not self._replayable(request):
+            return
+        key = request_key(request.method, request.url, request.body)
+        entry = {
+            'key': key,
+            'method': request.method,
+            'url': request.url,
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': [
+                (name, value) for name, value in response.headers.items()
+                if name.lower() not in DROPPED_HEADERS
+            ],
+            'body': base64.b64encode(response.content).decode('ascii')
+        }
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._file = open(
+                    self.path, 'wb' if self.mode == RECORD else 'ab'
+                )
+                # Drop a partial line left by an interrupted recording.
+                self._file.truncate(self._size)
+                self._offset = self._size
+            self._file.write(line)
+            self._recorded[key] = entry
+            self._index[key] = [self._offset, len(line)]
+            self._offset += len(line)
+
+    def _replayable(self, request):
+        # Streamed bodies (files, generators) cannot be keyed unread.
+        return request.body is None or isinstance(request.body, (bytes, str))
+
+    def close(self):
+        """Write recorded responses and the index."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            with open(self.index_path, 'w') as f:
+                json.dump({
+                    'size': os.path.getsize(self.path),
+                    'keys': self._index
+                }, f)
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._recorded = {}
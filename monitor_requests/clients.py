@@ -0,0 +1,307 @@
+"""Hooks for other HTTP clients: httpx (sync and async) and aiohttp.
+
+Each hook patches its client's send path (see patching.py), times requests
+and logs them through the Monitor like requests' own calls. Bodies are
+captured as the caller reads them. Logging from an event loop never waits on
+the server: records are queued without blocking (see Shipper.put).
+Cassettes and connection hygiene only cover requests.
+
+The client libraries are optional, and only imported by the hooks a
+Monitor installs.
+"""
+import importlib.util
+from .capture import Exchange
+from .histogram import clock_ns
+from .patching import patch
+from .sizes import NO_BODY_STATUS, content_length, header_size
+
+
+def _response_bytes(first_line, headers, method, status_code):
+    """Header and body sizes of a response, body None if not announced."""
+    header_bytes = header_size(first_line, headers)
+    if status_code in NO_BODY_STATUS or method == 'HEAD':
+        return header_bytes, 0
+    return header_bytes, content_length(headers)
+
+
+class ClientHook(object):
+    """Patches a client's send path, logging requests through a Monitor.
+
+    Subclasses name the library they need and the methods they patch, with
+    a hook for each: hook(send, *args, **kwargs) as in patching.py.
+    """
+
+    # Name of the client library's module.
+    module = None
+
+    def __init__(self, monitor):
+        """Initialize.
+
+        :param monitor: Monitor. Logs the requests.
+        """
+        self.monitor = monitor
+        self.patches = [
+            (patch(owner, name), hook) for owner, name, hook in self.hooks()
+        ]
+
+    @classmethod
+    def installed(cls):
+        """Whether the client library is installed, without importing it."""
+        return importlib.util.find_spec(cls.module) is not None
+
+    def hooks(self):
+        """Return (owner, method name, hook) for every method patched.
+
+        The client library is imported here.
+        """
+        raise NotImplementedError
+
+    def install(self):
+        """Install the hooks."""
+        for method, hook in self.patches:
+            method.install(hook)
+
+    def uninstall(self):
+        """Uninstall the hooks."""
+        for method, hook in self.patches:
+            method.uninstall(hook)
+
+
+class HttpxExchange(Exchange):
+    """An httpx request and response, its body not read yet."""
+
+    def __init__(self, request, response):
+        """Initialize.
+
+        :param request: httpx.Request.
+        :param response: httpx.Response, from Client._send_single_request.
+        """
+        self.response = response
+        self.status_code = response.status_code
+        # httpx sets the Host header itself.
+        request_bytes = header_size(
+            '{} {} HTTP/1.1'.format(
+                request.method, request.url.raw_path.decode('ascii')
+            ),
+            request.headers
+        )
+        self.sizes = (
+            request_bytes, content_length(request.headers) or 0
+        ) + _response_bytes(
+            'HTTP/1.1 {} {}'.format(
+                response.status_code, response.reason_phrase
+            ),
+            response.headers, request.method, response.status_code
+        )
+
+    def wrap(self, body):
+        """Capture the body as it is read, before decompression."""
+        import httpx
+        from .httpx_streams import CapturingAsyncStream, CapturingSyncStream
+        try:
+            content = self.response.content
+        except httpx.ResponseNotRead:
+            pass
+        else:
+            # Nothing left to stream (mock transports): use the content.
+            body.feed(content)
+            body.finish()
+            return
+        if isinstance(self.response.stream, httpx.AsyncByteStream):
+            self.response.stream = CapturingAsyncStream(
+                self.response.stream, body
+            )
+        else:
+            self.response.stream = CapturingSyncStream(
+                self.response.stream, body
+            )
+
+
+class HttpxHook(ClientHook):
+    """Monitor httpx Client and AsyncClient requests, redirects included."""
+
+    module = 'httpx'
+
+    def hooks(self):
+        """Patch the sync and async clients' single request sends."""
+        import httpx
+        return [
+            (httpx.Client, '_send_single_request', self._send),
+            (httpx.AsyncClient, '_send_single_request', self._send_async)
+        ]
+
+    def _send(self, send, client, request, *args, **kwargs):
+        start = clock_ns()
+        response = send(client, request, *args, **kwargs)
+        duration_ns = clock_ns() - start
+        self.monitor._log_request(
+            str(request.url), request.method,
+            HttpxExchange(request, response), duration_ns
+        )
+        return response
+
+    async def _send_async(self, send, client, request, *args, **kwargs):
+        start = clock_ns()
+        response = await send(client, request, *args, **kwargs)
+        duration_ns = clock_ns() - start
+        self.monitor._log_request(
+            str(request.url), request.method,
+            HttpxExchange(request, response), duration_ns, block=False
+        )
+        return response
+
+
+class AiohttpExchange(Exchange):
+    """An aiohttp response, its body not read yet."""
+
+    def __init__(self, response):
+        """Initialize.
+
+        :param response: aiohttp.ClientResponse.
+        """
+        self.response = response
+        self.status_code = response.status
+        info = response.request_info
+        # aiohttp sets the Host header itself.
+        request_bytes = header_size(
+            '{} {} HTTP/1.1'.format(info.method, info.url.raw_path_qs),
+            info.headers
+        )
+        self.sizes = (
+            request_bytes, content_length(info.headers) or 0
+        ) + _response_bytes(
+            'HTTP/1.1 {} {}'.format(response.status, response.reason or ''),
+            response.headers, info.method, response.status
+        )
+
+    def wrap(self, body):
+        """Capture the body as it is read (read, text, json, content)."""
+        self.response.content = CapturingStreamReader(
+            self.response.content, body
+        )
+
+
+class AiohttpHook(ClientHook):
+    """Monitor aiohttp ClientSession requests.
+
+    Redirects are followed inside the session: a request is logged once,
+    with its final url.
+    """
+
+    module = 'aiohttp'
+
+    def hooks(self):
+        """Patch the session's request coroutine."""
+        import aiohttp
+        return [(aiohttp.ClientSession, '_request', self._request)]
+
+    async def _request(self, request, session, *args, **kwargs):
+        start = clock_ns()
+        response = await request(session, *args, **kwargs)
+        duration_ns = clock_ns() - start
+        self.monitor._log_request(
+            str(response.url), response.method, AiohttpExchange(response),
+            duration_ns, block=False
+        )
+        return response
+
+
+class CapturingStreamReader(object):
+    """Wrap an aiohttp StreamReader, feeding a CapturedBody as it is read."""
+
+    def __init__(self, stream, body):
+        """Initialize.
+
+        :param stream: aiohttp.StreamReader.
+        :param body: CapturedBody.
+        """
+        self._stream = stream
+        self._body = body
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _feed(self, data, end=False):
+        self._body.feed(data)
+        if end or not data:
+            self._body.finish()
+        return data
+
+    async def read(self, n=-1):
+        """Read from the wrapped stream."""
+        return self._feed(await self._stream.read(n), n < 0)
+
+    async def readany(self):
+        """Read from the wrapped stream."""
+        return self._feed(await self._stream.readany())
+
+    async def readline(self):
+        """Read from the wrapped stream."""
+        return self._feed(await self._stream.readline())
+
+    async def readexactly(self, n):
+        """Read from the wrapped stream."""
+        return self._feed(await self._stream.readexactly(n))
+
+    async def readchunk(self):
+        """Read from the wrapped stream."""
+        data, end_of_chunk = await self._stream.readchunk()
+        self._feed(data, not data and not end_of_chunk)
+        return data, end_of_chunk
+
+    async def iter_chunked(self, n):
+        """Iterate over chunks of at most n bytes."""
+        while True:
+            data = await self.read(n)
+            if not data:
+                return
+            yield data
+
+    async def iter_any(self):
+        """Iterate over chunks as they are received."""
+        while True:
+            data = await self.readany()
+            if not data:
+                return
+            yield data
+
+    async def iter_chunks(self):
+        """Iterate over (data, end of http chunk) pairs."""
+        while True:
+            chunk = await self.readchunk()
+            if chunk == (b'', False):
+                return
+            yield chunk
+
+    async def __aiter__(self):
+        while True:
+            line = await self.readline()
+            if not line:
+                return
+            yield line
+
+
+# Hooks by client name.
+CLIENTS = {'httpx': HttpxHook, 'aiohttp': AiohttpHook}
+
+
+def client_hooks(clients=None):
+    """Return the ClientHook classes to install.
+
+    :param clients: List. Client names (see CLIENTS) or ClientHook
+    subclasses. None for every client installed.
+    :raise ValueError: Unknown client, or not installed.
+    """
+    if clients is None:
+        return [
+            hook for _, hook in sorted(CLIENTS.items()) if hook.installed()
+        ]
+    hooks = []
+    for client in clients:
+        hook = CLIENTS.get(client, client)
+        if not isinstance(hook, type) or not issubclass(hook, ClientHook):
+            raise ValueError('Unknown HTTP client: {}.'.format(client))
+        if client in CLIENTS and not hook.installed():
+            raise ValueError('HTTP client not installed: {}.'.format(client))
+        hooks.append(hook)
+    return hooks
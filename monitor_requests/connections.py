@@ -0,0 +1,136 @@
+"""Connection reuse and pool instrumentation.
+
+Each request is tagged with whether its adapter, urllib3 pool and connection
+were new (first seen) or reused, and how long it waited on an exhausted pool.
+Tallies per (domain, call site) are plain sums, mergeable across processes.
+"""
+import threading
+import weakref
+from .histogram import clock_ns
+
+# Tally columns, in order.
+COLUMNS = (
+    'requests',
+    'new_connections',
+    'reused_connections',
+    'new_adapters',
+    'new_pools',
+    'pool_exhausted',
+    'pool_wait_ns'
+)
+
+
+class ConnectionTracker(object):
+    """Tell new adapters, pools and connections from reused ones."""
+
+    def __init__(self):
+        """Initialize."""
+        self._adapters = weakref.WeakSet()
+        self._pools = weakref.WeakSet()
+        self._connections = weakref.WeakSet()
+        self._local = threading.local()
+
+    def get_conn(self, get_conn, pool, *args, **kwargs):
+        """Hook around HTTPConnectionPool._get_conn: note exhausted pools.
+
+        :param get_conn: Callable. Next hook, or the original _get_conn.
+        """
+        queue = pool.pool
+        if queue is None or not queue.empty():
+            return get_conn(pool, *args, **kwargs)
+        # Every connection is checked out: wait for one (block=True) or
+        # open one which will be discarded on release (block=False).
+        start = clock_ns()
+        try:
+            return get_conn(pool, *args, **kwargs)
+        finally:
+            local = self._local
+            local.exhausted = getattr(local, 'exhausted', 0) + 1
+            local.wait_ns = getattr(local, 'wait_ns', 0) + clock_ns() - start
+
+    def observe(self, adapter, response):
+        """Tally a sent request.
+
+        :param adapter: HTTPAdapter. Adapter which sent the request.
+        :param response: requests.Response. Not yet read.
+        :return: Dict. Counters for the request, as in COLUMNS.
+        """
+        local = self._local
+        exhausted = getattr(local, 'exhausted', 0)
+        wait_ns = getattr(local, 'wait_ns', 0)
+        local.exhausted = local.wait_ns = 0
+        counts = {
+            'requests': 1,
+            'new_connections': 0,
+            'reused_connections': 0,
+            'new_adapters': int(self._first(self._adapters, adapter)),
+            'new_pools': 0,
+            'pool_exhausted': exhausted,
+            'pool_wait_ns': wait_ns
+        }
+        pool = getattr(response.raw, '_pool', None)
+        if pool is not None:
+            counts['new_pools'] = int(self._first(self._pools, pool))
+        connection = getattr(response.raw, '_connection', None)
+        if connection is not None:
+            if self._first(self._connections, connection):
+                counts['new_connections'] = 1
+            else:
+                counts['reused_connections'] = 1
+        return counts
+
+    def _first(self, seen, item):
+        if item in seen:
+            return False
+        seen.add(item)
+        return True
+
+
+def tally(connections, record):
+    """Add a logged request's counters to tallies.
+
+    :param connections: Dict. (domain, call_site) -> list of COLUMNS sums,
+    updated in place.
+    :param record: Dict. Logged request, with connection counters.
+    """
+    counts = record.get('connection')
+    if not counts:
+        return
+    key = (record['domain'], record.get('call_site') or '')
+    tallied = connections.get(key)
+    if tallied is None:
+        tallied = connections[key] = [0] * len(COLUMNS)
+    for index, column in enumerate(COLUMNS):
+        tallied[index] += counts.get(column, 0)
+
+
+def hygiene(connections):
+    """Summarize connection reuse per domain and find offending call sites.
+
+    :param connections: List. Dicts with domain, call_site and COLUMNS.
+    :return: Tuple. (domains, sites): per domain sums, and call sites which
+    open a new connection for most requests or hit exhausted pools, with a
+    reason, most new connections first.
+    """
+    domains = {}
+    sites = []
+    for row in connections:
+        summed = domains.setdefault(row['domain'], dict.fromkeys(COLUMNS, 0))
+        for column in COLUMNS:
+            summed[column] += row[column]
+        reasons = []
+        if row['new_adapters'] > 1:
+            reasons.append('new adapter (Session) per call')
+        elif row['new_connections'] > 1 and (
+            row['new_connections'] * 2 > row['requests']
+        ):
+            reasons.append('connections not reused')
+        if row['pool_exhausted']:
+            reasons.append('pool exhausted')
+        if reasons:
+            sites.append(dict(row, reasons=reasons))
+    sites.sort(
+        key=lambda row: (row['new_connections'], row['pool_wait_ns']),
+        reverse=True
+    )
+    return domains, sites
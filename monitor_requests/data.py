@@ -1,98 +1,284 @@
 """Data handling by server or instance."""
+import functools
 import json
-import urllib3
+import threading
+import time
+from .aggregate import Aggregator
+from .capture import STATUS, Exchange, ResponseCapture
+from .merge import merge_spools
+from .replica import Replica
+from .sessions import check_name
+from .shipper import Shipper
+from .sizes import BYTE_COLUMNS, request_sizes, response_sizes
+from .spool import spool_writer
+from .stacks import StackCapture
+from .transport import connection_pool
+from .wire import JSON, Encoder
+
+# Records buffered per thread before merging into the aggregator.
+BUFFER_SIZE = 1024
 
 
 class DataHandler(object):
     """Handle data."""
 
-    def __init__(self, server_port=None):
+    def __init__(
+        self,
+        stacks=None,
+        server_port=None,
+        server_socket=None,
+        batch_size=100,
+        flush_interval=0.5,
+        response_capture=None,
+        spool_dir=None,
+        session=None
+    ):
         """Initialize.
 
+        :param stacks: StackCapture. Renders captured stacks.
         :param server_port: Int. local port.
+        :param server_socket: String. Server Unix domain socket path.
+        :param batch_size: Int. Server mode: records per batch POST.
+        :param flush_interval: Float. Server mode: max seconds between POSTs.
+        :param response_capture: ResponseCapture. How bodies are captured.
+        :param spool_dir: String. Spool mode: append to a file in this dir.
+        :param session: String. Server mode: log into this session's data.
         """
+        self.stacks = stacks or StackCapture()
+        self.response_capture = response_capture or ResponseCapture()
+        self.status_capture = ResponseCapture(STATUS)
+        self._pending = {}
         self.server_port = server_port
-        self.logged_requests = {}
-        self.analysis = {
-            'total_requests': 0, 'domains': set(), 'duration': 0
-        }
+        self.server_socket = server_socket
+        self.server = bool(server_port or server_socket)
+        self.aggregator = Aggregator()
+        # Local mode: each thread appends to its own buffer, merged into
+        # the aggregator under the lock when full, on flush and retrieve.
+        self._local = threading.local()
+        self._buffers = []
+        self._lock = threading.Lock()
+        self.spool = spool_writer(spool_dir) if spool_dir else None
+        if self.server:
+            # Server data, refreshed with the changes since the last fetch.
+            self.replica = Replica()
+            self.encoder = Encoder()
+            self.pool = connection_pool(server_port, server_socket)
+            self.prefix = ''
+            if session is not None:
+                self.prefix = '/sessions/' + check_name(session)
+            self.shipper = Shipper(
+                self._post_batch,
+                batch_size=batch_size,
+                flush_interval=flush_interval
+            )
 
-    def _delete(self):
-        http = urllib3.PoolManager()
-        resp = http.request(
-            'DELETE',
-            'http://localhost:{}/'.format(self.server_port)
-        )
+    def _request(self, method, path='/', **kwargs):
+        resp = self.pool.request(method, self.prefix + path, **kwargs)
+        self._check(resp)
+        return resp
+
+    def _check(self, resp):
         if resp.status != 200:
             raise Exception('Monitor Requests server error: {}.'.format(
                 resp.status
             ))
 
-    def _get(self):
-        http = urllib3.PoolManager()
-        resp = http.request(
-            'GET',
-            'http://localhost:{}/'.format(self.server_port)
+    def _delete(self):
+        self._request('DELETE')
+
+    def _changes(self, since):
+        return json.loads(
+            self._request('GET', '/?since={}'.format(since)).data
         )
-        if resp.status != 200:
-            raise Exception('Monitor Requests server error: {}.'.format(
-                resp.status
-            ))
-        return json.loads(resp.data)
-
-    def _post(self, data):
-        http = urllib3.PoolManager()
-        resp = http.request(
-            'POST',
-            'http://localhost:{}/'.format(self.server_port),
-            headers={'Content-Type': 'application/json'},
-            body=json.dumps(data)
+
+    def _serialize(self, record):
+        """Render a record's stack and response for the server or a spool."""
+        if record['traceback_list'] is not None:
+            record['traceback_list'] = self.stacks.render(
+                record['traceback_list']
+            )
+        content = record['response_content']
+        if content is not None:
+            content = str(content)
+        record['response_content'] = content
+        return record
+
+    def _send_batch(self, records):
+        body, headers = self.encoder.encode(records)
+        return self.pool.request(
+            'POST', self.prefix + '/batch', headers=headers, body=body
         )
-        if resp.status != 200:
-            raise Exception('Monitor Requests server error: {}.'.format(
-                resp.status
-            ))
+
+    def _post_batch(self, records):
+        for record in records:
+            self._serialize(record)
+        resp = self._send_batch(records)
+        if resp.status == 415 and self.encoder.content_type != JSON:
+            # The server can not read msgpack.
+            self.encoder = Encoder(JSON)
+            resp = self._send_batch(records)
+        if resp.status == 409:
+            # The server lost texts sent before (restarted): resend them.
+            self.encoder.refused(json.loads(resp.data)['missing'])
+            resp = self._send_batch(records)
+        self._check(resp)
+
+    def _buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = []
+            with self._lock:
+                self._buffers.append((threading.current_thread(), buffer))
+        return buffer
+
+    def _merge(self, buffer):
+        # Appends racing with the merge land past count and are kept.
+        count = len(buffer)
+        for entry in buffer[:count]:
+            self.aggregator.add(entry)
+        del buffer[:count]
+
+    def _merge_all(self):
+        with self._lock:
+            buffers = []
+            for thread, buffer in self._buffers:
+                self._merge(buffer)
+                if thread.is_alive() or buffer:
+                    buffers.append((thread, buffer))
+            self._buffers = buffers
+
+    def flush(self):
+        """Store requests with unconsumed bodies, wait for server batches."""
+        for body in list(self._pending):
+            body.finish()
+        self._merge_all()
+        if self.spool:
+            self.spool.flush()
+        if not self.server:
+            return
+        self.shipper.flush()
 
     def delete(self):
-        """Delete data from server if applicable."""
-        if not self.server_port:
+        """Delete data from server or spool dir if applicable."""
+        if self.spool:
+            self.spool.delete()
+        if not self.server:
             return
         self._delete()
 
-    def log(self, url, domain, method, response, tb_list, duration):
-        """Log request, store traceback/response data and update counts."""
-        if self.server_port:
-            self._post({
-                'url': url,
-                'domain': domain,
-                'method': method,
-                'response_content': str(response.content),
-                'response_status_code': response.status_code,
-                'duration': duration,
-                'traceback_list': tb_list
-            })
+    def log(
+        self,
+        url,
+        domain,
+        method,
+        response,
+        stack,
+        duration_ns,
+        raw_url=None,
+        site=None,
+        connection=None,
+        test=None,
+        block=True
+    ):
+        """Log request, store traceback/response data and update counts.
+
+        The request is stored once its response body has been consumed (or
+        closed, or on flush), so streamed bodies are never read eagerly.
+        :param response: requests.Response, or an Exchange (other clients).
+        :param stack: Tuple. Stack from StackCapture, rendered lazily. None
+        when the request is not sampled: only its counts are kept.
+        :param duration_ns: Int. Request duration in nanoseconds.
+        :param raw_url: String. Original url, when url is a template.
+        :param site: Tuple. Call site from StackCapture.call_site, for
+        unsampled requests (taken from the stack otherwise).
+        :param connection: Dict. Counters from ConnectionTracker.observe.
+        :param test: String. Node ID of the test making the request.
+        :param block: Boolean. Server mode: wait for room on a full queue.
+        False from an event loop: the record is held until there is room.
+        """
+        timestamp = time.time()
+        sizes = self._sizes(response)
+        # Count body bytes as they are read when no header gives the size.
+        count = sizes[3] is None
+        if stack is None:
+            body = self.status_capture.attach(response, count)
+        else:
+            body = self.response_capture.attach(response, count)
+            site = self.stacks.site(stack)
+        record = (
+            url, domain, method, body, stack, duration_ns, raw_url, site,
+            timestamp, connection, sizes, test, block
+        )
+        if body.complete:
+            self._store(record)
+            return
+        self._pending[body] = record
+        body.on_complete = functools.partial(self._complete, body)
+
+    def _sizes(self, response):
+        if isinstance(response, Exchange):
+            return response.sizes
+        request_bytes = (0, 0)
+        if response.request is not None:
+            request_bytes = request_sizes(response.request)
+        return request_bytes + response_sizes(response)
+
+    def _complete(self, body):
+        record = self._pending.pop(body, None)
+        if record is not None:
+            self._store(record)
+
+    def _store(self, record):
+        (
+            url, domain, method, body, stack, duration_ns, raw_url, site,
+            timestamp, connection, sizes, test, block
+        ) = record
+        if sizes[3] is None:
+            body_bytes = body.wire_size
+            if body_bytes is None:
+                body_bytes = body.size
+            sizes = sizes[:3] + (body_bytes,)
+        entry = {
+            'url': url,
+            'domain': domain,
+            'method': method,
+            'response_content': body.content,
+            'response_status_code': body.status_code,
+            'duration': duration_ns / 1e9,
+            'duration_ns': duration_ns,
+            'traceback_list': stack,
+            'call_site': self.stacks.render_site(site),
+            'timestamp': timestamp
+        }
+        entry.update(zip(BYTE_COLUMNS, sizes))
+        if stack is None:
+            entry['sampled'] = False
+        if raw_url is not None:
+            entry['raw_url'] = raw_url
+        if connection is not None:
+            entry['connection'] = connection
+        if test is not None:
+            entry['test'] = test
+        if self.spool:
+            self.spool.write(self._serialize(entry))
+        elif self.server:
+            self.shipper.put(entry, block)
         else:
-            if url not in self.logged_requests:
-                self.logged_requests[url] = {
-                    'count': 0,
-                    'methods': set(),
-                    'tracebacks': set(),
-                    'responses': set()
-                }
-            self.logged_requests[url]['count'] += 1
-            self.logged_requests[url]['methods'].add(method)
-            self.logged_requests[url]['tracebacks'].add(tuple(tb_list))
-            self.logged_requests[url]['responses'].add((
-                response.status_code,
-                response.content,
-            ))
-            self.analysis['duration'] += duration
-            self.analysis['total_requests'] += 1
-            self.analysis['domains'].add(domain)
+            buffer = self._buffer()
+            buffer.append(entry)
+            if len(buffer) >= BUFFER_SIZE:
+                with self._lock:
+                    self._merge(buffer)
 
     def retrieve(self):
-        """Retrieve data from server or instance."""
-        if not self.server_port:
-            return self.logged_requests, self.analysis
-        data = self._get()
-        return data.get('logged_requests'), data.get('analysis')
+        """Retrieve data from server, spool dir or instance."""
+        if self.spool:
+            self.flush()
+            return merge_spools([self.spool.directory])
+        if not self.server:
+            self.flush()
+            with self._lock:
+                return self.aggregator.results(render=self.stacks.render)
+        if not self.replica.apply(self._changes(self.replica.cursor)):
+            self.replica.apply(self._changes(0))
+        return self.replica.results()
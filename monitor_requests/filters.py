@@ -0,0 +1,128 @@
+"""Domain filtering."""
+import functools
+import re
+
+# Trie node markers.
+EXACT = 0
+SUFFIX = 1
+
+# Patterns which change meaning in an alternation: global flags (only
+# allowed at the start) and backreferences (numbered across patterns).
+UNJOINABLE = re.compile(r'^\(\?[aiLmsux]+\)|\\[1-9]|\\g<|\(\?P=')
+
+
+def netloc(url):
+    """Network location of an absolute url, without a full parse."""
+    start = url.find('://')
+    start = 0 if start == -1 else start + 3
+    end = len(url)
+    for separator in '/?#':
+        index = url.find(separator, start, end)
+        if index != -1:
+            end = index
+    return url[start:end]
+
+
+def host_of(location):
+    """Host name of a network location: no credentials, port or case."""
+    host = location.rpartition('@')[2]
+    if host.startswith('['):
+        return host.partition(']')[0][1:].lower()
+    return host.partition(':')[0].lower()
+
+
+class HostTrie(object):
+    """Exact and suffix host matching on reversed labels.
+
+    'example.com' matches example.com only, '.example.com' matches
+    example.com and every subdomain of it.
+    """
+
+    def __init__(self, hosts=()):
+        """Initialize.
+
+        :param hosts: List. Host names, prefixed by '.' for suffix matches.
+        """
+        self.root = {}
+        for host in hosts:
+            marker = SUFFIX if host.startswith('.') else EXACT
+            node = self.root
+            for label in reversed(host.strip('.').lower().split('.')):
+                node = node.setdefault(label, {})
+            node[marker] = True
+
+    def __bool__(self):
+        return bool(self.root)
+
+    __nonzero__ = __bool__
+
+    def match(self, host):
+        """Check a host name."""
+        node = self.root
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if SUFFIX in node:
+                return True
+        return EXACT in node
+
+
+class DomainFilter(object):
+    """Decide which network locations are monitored.
+
+    Regex patterns are compiled into one alternation (or searched in turn
+    when they can not be joined), host names into a trie, and decisions
+    are memoized per network location.
+    """
+
+    def __init__(
+        self,
+        domains=(),
+        exclude_domains=(),
+        hosts=(),
+        exclude_hosts=(),
+        cache_size=4096
+    ):
+        """Initialize.
+
+        :param domains: List. Regex patterns, searched in the netloc.
+        :param exclude_domains: List. Regex patterns never monitored.
+        :param hosts: List. Host names ('.example.com' for subdomains too).
+        :param exclude_hosts: List. Host names never monitored.
+        :param cache_size: Int. Decisions memoized.
+        """
+        self.include = self._compile(domains)
+        self.exclude = self._compile(exclude_domains)
+        self.hosts = HostTrie(hosts)
+        self.exclude_hosts = HostTrie(exclude_hosts)
+        self.allowed = functools.lru_cache(maxsize=cache_size)(self._allowed)
+
+    def _compile(self, patterns):
+        """Return a search over every pattern, None if there are none."""
+        if not patterns:
+            return None
+        compiled = tuple(re.compile(pattern) for pattern in patterns)
+        if not any(UNJOINABLE.search(pattern) for pattern in patterns):
+            try:
+                return re.compile('|'.join(
+                    '(?:{})'.format(pattern) for pattern in patterns
+                )).search
+            except re.error:
+                pass
+
+        def search(location):
+            return any(regex.search(location) for regex in compiled)
+        return search
+
+    def _allowed(self, location):
+        host = host_of(location)
+        if self.exclude and self.exclude(location):
+            return False
+        if self.exclude_hosts and self.exclude_hosts.match(host):
+            return False
+        if not self.include and not self.hosts:
+            return True
+        if self.include and self.include(location):
+            return True
+        return bool(self.hosts) and self.hosts.match(host)
@@ -0,0 +1,126 @@
+"""Collapsed stack export of external calls, for flamegraphs.
+
+One line per unique stack: frames from the outermost in, separated by
+';', ending with the request ('GET url'), then a space and a weight.
+Readable by flamegraph.pl, speedscope and inferno.
+
+Run with:
+monitor_requests_flamegraph
+Optional arguments:
+-p 9001 (server on this port)
+--unix-socket=/tmp/monitor_requests.sock (server on this socket)
+--session=build-123 (a session's data on the server)
+--spool=SPOOL_DIR_OR_FILE (instead of a server, repeatable)
+--weight=latency (total microseconds, default count: requests)
+--output=requests.folded
+"""
+import argparse
+import re
+import sys
+from .merge import merge_spools
+from .stacks import LIBRARY_DIRS
+from .transport import fetch
+
+# Weights.
+COUNT = 'count'
+LATENCY = 'latency'
+WEIGHTS = (COUNT, LATENCY)
+
+# Longest first: site-packages lives inside the stdlib dir.
+STRIPPED_DIRS = sorted(LIBRARY_DIRS, key=len, reverse=True)
+
+# A frame rendered by traceback.format_list.
+FRAME = re.compile(r'\s*File "(.*)", line (\d+), in (.*)')
+
+
+def frame_name(frame):
+    """Name a rendered frame 'function (file:line)', without ';'.
+
+    Library files are named relative to their site-packages or stdlib dir.
+    """
+    match = FRAME.match(frame)
+    if match is None:
+        name = frame.strip().split('\n')[0]
+    else:
+        filename, lineno, function = match.groups()
+        for directory in STRIPPED_DIRS:
+            if filename.startswith(directory):
+                filename = filename[len(directory):]
+                break
+        name = '{} ({}:{})'.format(function, filename, lineno)
+    return name.replace(';', ',')
+
+
+def collapse(logged_requests, weight=COUNT):
+    """Sum the weight of each unique stack.
+
+    Stacks come from sampled requests: their weights are scaled up to all
+    of a url's requests.
+    :param logged_requests: Dict. As passed to OutputHandler.
+    :param weight: String. 'count' (requests) or 'latency' (microseconds).
+    :return: Dict. Collapsed stack -> weight (Int).
+    """
+    if weight not in WEIGHTS:
+        raise ValueError('Unknown flamegraph weight: {}.'.format(weight))
+    folded = {}
+    for url, logged in logged_requests.items():
+        stacks = logged.get('stacks') or []
+        sampled = sum(stack['count'] for stack in stacks)
+        if not sampled:
+            continue
+        scale = float(logged['count']) / sampled
+        for stack in stacks:
+            frames = [frame_name(frame) for frame in stack['traceback']]
+            frames.append(
+                '{} {}'.format(stack['method'], url).replace(';', ',')
+            )
+            if weight == COUNT:
+                value = stack['count']
+            else:
+                value = stack['duration_ns'] / 1e3
+            key = ';'.join(frames)
+            folded[key] = folded.get(key, 0) + value * scale
+    return dict(
+        (key, int(round(value))) for key, value in folded.items()
+        if round(value) > 0
+    )
+
+
+def write_collapsed(output, folded):
+    """Write collapsed stacks, heaviest first.
+
+    :param output: Stream. Output destination.
+    :param folded: Dict. As returned by collapse.
+    """
+    for key, value in sorted(
+        folded.items(), key=lambda item: (-item[1], item[0])
+    ):
+        output.write('{} {}\n'.format(key, value))
+
+
+def run_flamegraph():
+    """Write collapsed stacks from a server or spools, with arguments."""
+    parser = argparse.ArgumentParser(description='Export collapsed stacks.')
+    parser.add_argument('-p', '--port', type=int, required=False)
+    parser.add_argument('--unix-socket', required=False)
+    parser.add_argument('--session', required=False)
+    parser.add_argument('--spool', action='append', default=[])
+    parser.add_argument('--weight', choices=WEIGHTS, default=COUNT)
+    parser.add_argument('--output', help='Output file', required=False)
+    args = parser.parse_args()
+    if args.spool:
+        logged_requests = merge_spools(args.spool)[0]
+    else:
+        logged_requests = fetch(
+            args.port or 9001, args.unix_socket, args.session
+        )[0]
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        write_collapsed(output, collapse(logged_requests, args.weight))
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    run_flamegraph()
@@ -0,0 +1,97 @@
+"""Fixed-memory, mergeable latency histograms."""
+import time
+
+# Log-linear buckets: 2 ** SUB_BITS buckets per power of two, so values are
+# kept within ~3% (bucket midpoint) using at most ~1000 buckets for 64 bits.
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+try:
+    clock_ns = time.perf_counter_ns
+except AttributeError:  # Python < 3.7
+    def clock_ns():
+        """Monotonic clock in nanoseconds."""
+        return int(time.perf_counter() * 1e9)
+
+
+def bucket_index(value):
+    """Bucket for a non-negative integer value."""
+    if value < SUB_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + (value >> shift) - SUB_COUNT
+
+
+def bucket_value(index):
+    """Representative (midpoint) value of a bucket."""
+    if index < SUB_COUNT:
+        return index
+    shift = (index >> SUB_BITS) - 1
+    low = (SUB_COUNT + (index & (SUB_COUNT - 1))) << shift
+    return low + ((1 << shift) >> 1)
+
+
+class Histogram(object):
+    """HDR-style histogram of durations in nanoseconds."""
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        """Initialize."""
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value, count=1):
+        """Record a value (nanoseconds), count times."""
+        index = bucket_index(max(int(value), 0))
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add another histogram's values to this one."""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, percent):
+        """Approximate value at a percentile (0-100)."""
+        if not self.count:
+            return 0
+        rank = max(percent / 100.0 * self.count, 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def to_dict(self):
+        """JSON serializable form."""
+        return {
+            'buckets': dict(
+                (str(index), count) for index, count in self.buckets.items()
+            ),
+            'count': self.count,
+            'total': self.total,
+            'max': self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load from to_dict output."""
+        histogram = cls()
+        histogram.buckets = dict(
+            (int(index), count) for index, count in data['buckets'].items()
+        )
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.max = data['max']
+        return histogram
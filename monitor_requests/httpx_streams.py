@@ -0,0 +1,53 @@
+"""httpx response stream wrappers, feeding a CapturedBody (see clients.py).
+
+Imported by the httpx hook only: httpx is optional.
+"""
+import httpx
+
+
+class CapturingSyncStream(httpx.SyncByteStream):
+    """Wrap an httpx response stream, feeding a CapturedBody."""
+
+    def __init__(self, stream, body):
+        """Initialize.
+
+        :param stream: httpx.SyncByteStream.
+        :param body: CapturedBody.
+        """
+        self._stream = stream
+        self._body = body
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._body.feed(chunk)
+            yield chunk
+        self._body.finish()
+
+    def close(self):
+        """Close the wrapped stream."""
+        self._body.finish()
+        self._stream.close()
+
+
+class CapturingAsyncStream(httpx.AsyncByteStream):
+    """Wrap an httpx async response stream, feeding a CapturedBody."""
+
+    def __init__(self, stream, body):
+        """Initialize.
+
+        :param stream: httpx.AsyncByteStream.
+        :param body: CapturedBody.
+        """
+        self._stream = stream
+        self._body = body
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._body.feed(chunk)
+            yield chunk
+        self._body.finish()
+
+    async def aclose(self):
+        """Close the wrapped stream."""
+        self._body.finish()
+        await self._stream.aclose()
@@ -0,0 +1,63 @@
+"""Merge spool files into a report.
+
+Run with:
+monitor_requests_merge SPOOL_DIR_OR_FILE [...]
+Optional arguments:
+--urls --tracebacks --responses --debug
+--inspect-limit=5
+--output=report.txt
+"""
+import argparse
+import os
+import sys
+from .aggregate import Aggregator
+from .output import OutputHandler
+from .spool import read_spool, spool_paths
+
+
+def merge_spools(paths):
+    """Stream-merge spool files.
+
+    :param paths: List. Spool files, or directories of spool files.
+    :return: Tuple. (logged_requests, analysis).
+    """
+    aggregator = Aggregator()
+    for path in paths:
+        files = spool_paths(path) if os.path.isdir(path) else [path]
+        for spool in files:
+            for record in read_spool(spool):
+                aggregator.add(record)
+    return aggregator.results()
+
+
+def run_merge():
+    """Merge spools and write a report, with command line arguments."""
+    parser = argparse.ArgumentParser(description='Merge spool files.')
+    parser.add_argument('paths', nargs='+', help='Spool files or dirs')
+    parser.add_argument('--urls', action='store_true')
+    parser.add_argument('--tracebacks', action='store_true')
+    parser.add_argument('--responses', action='store_true')
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--inspect-limit', type=int, default=None)
+    parser.add_argument('--output', help='Output file', required=False)
+    args = parser.parse_args()
+    logged_requests, analysis = merge_spools(args.paths)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        OutputHandler(
+            output,
+            args.urls,
+            args.tracebacks or args.debug,
+            args.responses or args.debug,
+            args.debug,
+            args.inspect_limit,
+            logged_requests,
+            analysis
+        ).write()
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    run_merge()
@@ -0,0 +1,88 @@
+"""URL templating, to bound the number of unique urls logged."""
+import functools
+import re
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Path segments replaced by a placeholder, first match wins.
+SEGMENT_RULES = (
+    (re.compile(
+        r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+        r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+    ), '{uuid}'),
+    (re.compile(r'^[0-9a-fA-F]{32}$|^[0-9a-fA-F]{40}$|^[0-9a-fA-F]{64}$'),
+     '{hash}'),
+    (re.compile(r'^\d+$'), '{id}'),
+)
+
+# Query parameters whose values change on every call.
+VOLATILE_PARAMS = (
+    '_', 'access_token', 'api_key', 'cachebuster', 'callback', 'cb', 'key',
+    'nonce', 'rand', 'random', 'sig', 'signature', 't', 'timestamp', 'token',
+    'ts',
+)
+
+
+class URLNormalizer(object):
+    """Map raw urls to templates, e.g. /users/123?ts=9 -> /users/{id}?ts={ts}.
+
+    Templates are cached per raw url.
+    """
+
+    def __init__(
+        self,
+        rules=(),
+        builtin=True,
+        volatile_params=VOLATILE_PARAMS,
+        cache_size=10000
+    ):
+        """Initialize.
+
+        :param rules: List. (regex, replacement) pairs applied to the whole
+        url with re.sub, after the built in rules.
+        :param builtin: Boolean. Template numeric ids, uuids and hex hashes
+        in the path, and the same in query values.
+        :param volatile_params: Tuple. Query parameters whose values are
+        replaced by {name}.
+        :param cache_size: Int. Raw urls cached.
+        """
+        self.rules = [
+            (re.compile(pattern), replacement)
+            for pattern, replacement in rules
+        ]
+        self.builtin = builtin
+        self.volatile_params = frozenset(volatile_params)
+        self._cached = functools.lru_cache(maxsize=cache_size)(self.normalize)
+
+    def __call__(self, url):
+        """Template for a url (cached)."""
+        return self._cached(url)
+
+    def _segment(self, segment):
+        for pattern, placeholder in SEGMENT_RULES:
+            if pattern.match(segment):
+                return placeholder
+        return segment
+
+    def normalize(self, url):
+        """Template for a url (uncached)."""
+        if self.builtin or self.volatile_params:
+            parsed = urlparse(url)
+            path = parsed.path
+            if self.builtin:
+                path = '/'.join(
+                    self._segment(segment) for segment in path.split('/')
+                )
+            query = []
+            for name, value in parse_qsl(parsed.query, True):
+                if name in self.volatile_params:
+                    value = '{%s}' % name
+                elif self.builtin:
+                    value = self._segment(value)
+                query.append((name, value))
+            url = urlunparse((
+                parsed.scheme, parsed.netloc, path, parsed.params,
+                urlencode(query, safe='{}'), parsed.fragment
+            ))
+        for pattern, replacement in self.rules:
+            url = pattern.sub(replacement, url)
+        return url
@@ -1,5 +1,16 @@
 """Separate output handling."""
 import sys
+from .connections import hygiene
+from .histogram import Histogram
+from .repeats import find_repeats
+
+LATENCY_ROW = '{:<8} {:<32} {:>8} {:>10} {:>10} {:>10} {:>10}\n'
+REPEAT_ROW = '{:>12} {:>8} {:>10}  {}\n'
+BANDWIDTH_ROW = '{:<8} {:<48} {:>14} {:>14}\n'
+HYGIENE_ROW = '{:<32} {:>8} {:>8} {:>8} {:>8} {:>9} {:>10}\n'
+TEST_ROW = '{:>8} {:>12}  {}\n'
+# Rows listed per ranked report section.
+TOP_LIMIT = 10
 
 
 class OutputHandler(object):
@@ -41,15 +52,212 @@ class OutputHandler(object):
         self.output.write('Total Requests:    {}\n'.format(
             self.analysis['total_requests']))
         self.output.write('Unique Tracebacks: {}\n'.format(tb))
+        sampled = self.analysis.get('sampled_requests')
+        if sampled is not None and sampled < self.analysis['total_requests']:
+            self.output.write(
+                'Sampled Requests:  {} (tracebacks and responses)\n'.format(
+                    sampled
+                )
+            )
         self.output.write('Time (Seconds):    {}\n'.format(
             self.analysis['duration'])
         )
+        total = self.analysis.get('bytes', {}).get('total')
+        if total:
+            self.output.write(
+                'Bytes Sent:        {:,} (headers {:,})\n'.format(
+                    total['request_header_bytes'] +
+                    total['request_body_bytes'],
+                    total['request_header_bytes']
+                )
+            )
+            self.output.write(
+                'Bytes Received:    {:,} (headers {:,})\n'.format(
+                    total['response_header_bytes'] +
+                    total['response_body_bytes'],
+                    total['response_header_bytes']
+                )
+            )
         self.output.write('URL Count:         {}\n'.format(
             len(self.logged_requests.keys())))
         self.output.write('Domain Count:      {}\n'.format(
             len(self.analysis['domains'])))
         self.output.write('Domains:           {}\n'.format(
             ', '.join(sorted(list(self.analysis['domains'])))))
+        self._output_cassette()
+        self._output_latency()
+        self._output_bandwidth()
+        self._output_repeats()
+        self._output_connections()
+        self._output_tests()
+
+    def _output_cassette(self):
+        """Output cassette hits and the requests missing from it."""
+        cassette = self.analysis.get('cassette')
+        if not cassette:
+            return
+        misses = sorted(set(
+            '{} {}'.format(method, url) for method, url in cassette['misses']
+        ))
+        self.output.write('Cassette:          {} hits, {} misses\n'.format(
+            cassette['hits'], len(cassette['misses'])
+        ))
+        if misses:
+            self.output.write('\n___________Cassette Misses__________\n\n')
+            for miss in misses:
+                self.output.write('{}\n'.format(miss))
+
+    def _output_latency(self):
+        """Output latency percentiles per domain and method."""
+        latency = self.analysis.get('latency', {})
+        if not latency:
+            return
+        self.output.write('\n___________Latency (ms)__________\n\n')
+        self.output.write(LATENCY_ROW.format(
+            '', '', 'Count', 'p50', 'p90', 'p99', 'Max'
+        ))
+        for label, kind in (('Domain', 'domains'), ('Method', 'methods')):
+            for key in sorted(latency.get(kind, {})):
+                histogram = Histogram.from_dict(latency[kind][key])
+                self.output.write(LATENCY_ROW.format(
+                    label, key, histogram.count,
+                    *self._percentiles(histogram)
+                ))
+
+    def _sent_received(self, sums):
+        """Bytes sent and received, headers included."""
+        return (
+            sums.get('request_header_bytes', 0) +
+            sums.get('request_body_bytes', 0),
+            sums.get('response_header_bytes', 0) +
+            sums.get('response_body_bytes', 0)
+        )
+
+    def _output_bandwidth(self):
+        """Output bytes per domain and method, and the top urls."""
+        bandwidth = self.analysis.get('bytes')
+        if not bandwidth or not bandwidth.get('total'):
+            return
+        self.output.write('\n___________Bandwidth (bytes)__________\n\n')
+        self.output.write(BANDWIDTH_ROW.format('', '', 'Sent', 'Received'))
+        for label, kind in (('Domain', 'domains'), ('Method', 'methods')):
+            for key in sorted(bandwidth.get(kind, {})):
+                self.output.write(BANDWIDTH_ROW.format(
+                    label, key, *[
+                        '{:,}'.format(value)
+                        for value in self._sent_received(bandwidth[kind][key])
+                    ]
+                ))
+        urls = sorted(
+            (
+                (self._sent_received(logged['bytes']), url)
+                for url, logged in self.logged_requests.items()
+                if logged.get('bytes')
+            ),
+            key=lambda item: sum(item[0]),
+            reverse=True
+        )
+        for (sent, received), url in urls[:TOP_LIMIT]:
+            self.output.write(BANDWIDTH_ROW.format(
+                'URL', url, '{:,}'.format(sent), '{:,}'.format(received)
+            ))
+
+    def _output_repeats(self):
+        """Output repeated calls from one site: cache or batch candidates."""
+        repeats = find_repeats(self.analysis.get('repeats', []))
+        if not repeats:
+            return
+        self.output.write(
+            '\n___________Repeated Calls (cache or batch candidates)'
+            '__________\n\n'
+        )
+        self.output.write(REPEAT_ROW.format(
+            'Wasted (ms)', 'Calls', 'Every (ms)', 'Request / Call Site / Test'
+        ))
+        for repeat in repeats[:TOP_LIMIT]:
+            self.output.write(REPEAT_ROW.format(
+                '{:.2f}'.format(repeat['wasted_ns'] / 1e6),
+                repeat['count'],
+                '{:.2f}'.format(repeat['mean_gap'] * 1e3),
+                '{} {}'.format(repeat['method'], repeat['url'])
+            ))
+            if repeat['call_site']:
+                self.output.write(REPEAT_ROW.format(
+                    '', '', '', '  at {}'.format(repeat['call_site'])
+                ))
+            if repeat['test']:
+                self.output.write(REPEAT_ROW.format(
+                    '', '', '', '  in {}'.format(repeat['test'])
+                ))
+
+    def _output_connections(self):
+        """Output connection reuse per domain and call sites defeating it."""
+        domains, sites = hygiene(self.analysis.get('connections', []))
+        if not domains:
+            return
+        self.output.write('\n___________Connection Hygiene__________\n\n')
+        self.output.write(HYGIENE_ROW.format(
+            'Domain', 'Requests', 'New', 'Reused', 'Adapters', 'Exhausted',
+            'Wait (ms)'
+        ))
+        for domain in sorted(domains):
+            summed = domains[domain]
+            self.output.write(HYGIENE_ROW.format(
+                domain,
+                summed['requests'],
+                summed['new_connections'],
+                summed['reused_connections'],
+                summed['new_adapters'],
+                summed['pool_exhausted'],
+                '{:.2f}'.format(summed['pool_wait_ns'] / 1e6)
+            ))
+        if not sites:
+            return
+        self.output.write('\nCall sites defeating connection pooling:\n')
+        for site in sites[:TOP_LIMIT]:
+            self.output.write(
+                '{} ({}): {} new connections, {} adapters in {} requests'
+                ' - {}\n'.format(
+                    site['call_site'] or '<unknown>',
+                    site['domain'],
+                    site['new_connections'],
+                    site['new_adapters'],
+                    site['requests'],
+                    ', '.join(site['reasons'])
+                )
+            )
+
+    def _output_tests(self):
+        """Output the tests making the most requests, and waiting longest."""
+        tests = self.analysis.get('tests')
+        if not tests:
+            return
+        for title, key in (
+            ('Most Requests', 'count'),
+            ('Most Request Time', 'duration_ns')
+        ):
+            self.output.write('\n___________Tests: {}__________\n\n'.format(
+                title
+            ))
+            self.output.write(TEST_ROW.format('Requests', 'Time (ms)', 'Test'))
+            ranked = sorted(tests, key=lambda test: (-test[key], test['test']))
+            for test in ranked[:TOP_LIMIT]:
+                self.output.write(TEST_ROW.format(
+                    test['count'],
+                    '{:.2f}'.format(test['duration_ns'] / 1e6),
+                    test['test']
+                ))
+
+    def _percentiles(self, histogram):
+        """p50, p90, p99 and max, formatted in milliseconds."""
+        return [
+            '{:.2f}'.format(value / 1e6) for value in (
+                histogram.percentile(50),
+                histogram.percentile(90),
+                histogram.percentile(99),
+                histogram.max
+            )
+        ]
 
     def _output_responses(self, url):
         self.output.write('_______Responses______\n')
@@ -80,8 +288,37 @@ class OutputHandler(object):
             self.output.write('Methods:  {}\n'.format(
                 ', '.join(sorted(list(self.logged_requests[url]['methods'])))
             ))
-            self.output.write('Requests: {}\n'.format(
-                self.logged_requests[url]['count']))
+            count = self.logged_requests[url]['count']
+            sampled = self.logged_requests[url].get('sampled', count)
+            if sampled < count:
+                self.output.write('Requests: {} ({} sampled)\n'.format(
+                    count, sampled
+                ))
+            else:
+                self.output.write('Requests: {}\n'.format(count))
+            if self.logged_requests[url].get('examples'):
+                self.output.write('Examples: {}\n'.format(
+                    ', '.join(sorted(self.logged_requests[url]['examples']))
+                ))
+            if self.logged_requests[url].get('bytes'):
+                sent, received = self._sent_received(
+                    self.logged_requests[url]['bytes']
+                )
+                self.output.write(
+                    'Bytes:    sent {:,}, received {:,}, {:,} per response'
+                    '\n'.format(
+                        sent, received, received // max(count, 1)
+                    )
+                )
+            if 'latency' in self.logged_requests[url]:
+                self.output.write(
+                    'Latency:  p50 {}ms, p90 {}ms, p99 {}ms, '
+                    'max {}ms\n'.format(
+                        *self._percentiles(Histogram.from_dict(
+                            self.logged_requests[url]['latency']
+                        ))
+                    )
+                )
             if self.tracebacks:
                 self._output_tracebacks(url)
             if self.responses:
@@ -0,0 +1,115 @@
+"""Low-overhead patching: chain hooks around a method.
+
+A hook is called as hook(send, *args, **kwargs), where send calls the next
+hook in the chain (or the original method) with the same arguments. Hooks
+installed later wrap hooks installed earlier.
+"""
+import functools
+import threading
+
+_patches = {}
+_lock = threading.RLock()
+
+
+class Chain(object):
+    """Hooks around one original method, called through one wrapper."""
+
+    def __init__(self, original):
+        """Initialize.
+
+        :param original: Callable. Method wrapped.
+        """
+        self.original = original
+        self.hooks = []
+        self.call = original
+        chain = self
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            return chain.call(*args, **kwargs)
+        self.wrapper = wrapper
+
+    def build(self):
+        """Rebuild the calls through the hooks."""
+        send = self.original
+        for hook in self.hooks:
+            send = functools.partial(hook, send)
+        self.call = send
+
+
+class Patch(object):
+    """Hook chains around one method, shared by everyone patching it.
+
+    Hooks go on the chain whose wrapper is in place. If someone patched
+    over it, a new chain wraps whatever is there now: the old one keeps its
+    hooks, and still runs for whoever calls its wrapper.
+    """
+
+    def __init__(self, owner, name):
+        """Initialize.
+
+        :param owner: Class (or module) owning the method.
+        :param name: String. Method name.
+        """
+        self.owner = owner
+        self.name = name
+        self.chains = []
+
+    def _chain(self, hook):
+        for chain in self.chains:
+            if hook in chain.hooks:
+                return chain
+        return None
+
+    def install(self, hook):
+        """Add a hook, patching the method if needed. Idempotent.
+
+        :param hook: Callable. hook(send, *args, **kwargs).
+        """
+        with _lock:
+            if self._chain(hook) is not None:
+                return
+            current = getattr(self.owner, self.name)
+            if not self.chains or current is not self.chains[-1].wrapper:
+                self.chains.append(Chain(current))
+                setattr(self.owner, self.name, self.chains[-1].wrapper)
+            chain = self.chains[-1]
+            chain.hooks.append(hook)
+            chain.build()
+
+    def uninstall(self, hook):
+        """Remove a hook, restoring the method once none remain. Idempotent.
+
+        :param hook: Callable. As passed to install.
+        """
+        with _lock:
+            chain = self._chain(hook)
+            if chain is None:
+                return
+            chain.hooks.remove(hook)
+            chain.build()
+            if chain.hooks:
+                return
+            self.chains.remove(chain)
+            # If someone patched over us, leave them be: with no hooks left
+            # our wrapper just calls the original.
+            if getattr(self.owner, self.name) is chain.wrapper:
+                setattr(self.owner, self.name, chain.original)
+
+    @property
+    def installed(self):
+        """Whether any hook is installed."""
+        return any(chain.hooks for chain in self.chains)
+
+
+def patch(owner, name):
+    """Return the shared Patch for a method.
+
+    :param owner: Class (or module) owning the method.
+    :param name: String. Method name.
+    """
+    with _lock:
+        key = (owner, name)
+        if key not in _patches:
+            _patches[key] = Patch(owner, name)
+        return _patches[key]
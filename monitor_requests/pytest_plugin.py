@@ -0,0 +1,153 @@
+"""pytest plugin: report the requests made by a test suite.
+
+Run with:
+pytest --monitor-requests
+Optional arguments:
+--monitor-requests-output=requests.txt (also write the report, with urls,
+to a file)
+--monitor-requests-baseline=budget.json (fail on more or slower calls than
+in this baseline, see budgets.py)
+--monitor-requests-write-baseline (write the baseline instead)
+
+Each request is attributed to the test running it (its node ID): the report
+ranks the tests making the most requests, and waiting longest on them.
+Under pytest-xdist each worker monitors its own tests and sends its results
+to the controller, which merges them: no server is needed.
+"""
+import json
+import pytest
+
+# Key of a worker's results in its workeroutput.
+WORKER_OUTPUT = 'monitor_requests'
+
+
+def pytest_addoption(parser):
+    """Add the command line options."""
+    group = parser.getgroup('monitor_requests')
+    group.addoption(
+        '--monitor-requests', action='store_true', default=False,
+        help='Report the external requests made by the tests.'
+    )
+    group.addoption(
+        '--monitor-requests-output', default=None,
+        help='Also write the report, with urls, to this file.'
+    )
+    group.addoption(
+        '--monitor-requests-baseline', default=None,
+        help='Fail on more or slower external calls than in this baseline.'
+    )
+    group.addoption(
+        '--monitor-requests-write-baseline', action='store_true',
+        default=False, help='Write the baseline from this run instead.'
+    )
+
+
+def pytest_configure(config):
+    """Monitor the session when enabled.
+
+    Nothing else is imported until then: the plugin is loaded by every
+    pytest run.
+    """
+    if (
+        config.getoption('monitor_requests_write_baseline') and
+        not config.getoption('monitor_requests_baseline')
+    ):
+        raise pytest.UsageError(
+            '--monitor-requests-write-baseline needs '
+            '--monitor-requests-baseline=PATH.'
+        )
+    if config.getoption('monitor_requests'):
+        config.pluginmanager.register(
+            MonitorRequestsPlugin(config), 'monitor_requests_plugin'
+        )
+
+
+class MonitorRequestsPlugin(object):
+    """One Monitor per process, tagging requests with the running test."""
+
+    def __init__(self, config):
+        """Initialize, hot patch requests.
+
+        :param config: Config. pytest configuration.
+        """
+        from . import Monitor
+        from .aggregate import Aggregator
+        self.config = config
+        # Bodies are not reported: keep status codes only.
+        self.monitor = Monitor(response_mode='status')
+        # Merged results of the xdist workers.
+        self.aggregator = Aggregator()
+        self.results = None
+        self.regressions = []
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        """Attribute requests made during a test, fixtures included."""
+        self.monitor.test = item.nodeid
+        yield
+        self.monitor.test = None
+
+    def pytest_sessionfinish(self, session):
+        """Stop monitoring, send the results to the controller if a worker.
+
+        Otherwise check the budgets: regressions fail the session.
+        """
+        self.monitor.refresh()
+        self.monitor.stop()
+        workeroutput = getattr(self.config, 'workeroutput', None)
+        if workeroutput is not None:
+            workeroutput[WORKER_OUTPUT] = json.dumps(
+                [self.monitor.logged_requests, self.monitor.analysis],
+                default=list
+            )
+            return
+        self.aggregator.merge(
+            self.monitor.logged_requests, self.monitor.analysis
+        )
+        self.results = self.aggregator.results()
+        path = self.config.getoption('monitor_requests_baseline')
+        if not path:
+            return
+        from .budgets import check_budgets, read_baseline, write_baseline
+        if self.config.getoption('monitor_requests_write_baseline'):
+            write_baseline(path, *self.results)
+            return
+        self.regressions = check_budgets(read_baseline(path), *self.results)
+        if self.regressions and session.exitstatus == 0:
+            session.exitstatus = 1
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        """Merge the results of an xdist worker."""
+        output = getattr(node, 'workeroutput', {}).get(WORKER_OUTPUT)
+        if output is not None:
+            self.aggregator.merge(*json.loads(output))
+
+    def pytest_terminal_summary(self, terminalreporter):
+        """Write the report (the controller's, under xdist)."""
+        if self.results is None:
+            return
+        from .budgets import describe
+        from .output import OutputHandler
+        logged_requests, analysis = self.results
+        terminalreporter.write_sep('=', 'monitor requests')
+        OutputHandler(
+            terminalreporter,
+            logged_requests=logged_requests,
+            analysis=analysis
+        ).write()
+        if self.regressions:
+            terminalreporter.write_sep(
+                '=', 'monitor requests: budget regressions', red=True
+            )
+            for regression in self.regressions:
+                terminalreporter.write_line(describe(regression))
+        path = self.config.getoption('monitor_requests_output')
+        if path:
+            with open(path, 'w') as output:
+                OutputHandler(
+                    output,
+                    urls=True,
+                    logged_requests=logged_requests,
+                    analysis=analysis
+                ).write()
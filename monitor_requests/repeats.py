@@ -0,0 +1,96 @@
+"""Repeated call detection: the same request made over and over from one place.
+
+Requests are tallied per (url, method, call site, test) with their count,
+total duration and first/last timestamps, and the calls made within
+REPEAT_WINDOW seconds of the previous response: their count, duration and
+gaps. The test is the pytest node ID requests are logged under, or ''. A key
+with at least MIN_REPEATS calls in such bursts is a cache or batch
+candidate, ranked by the time spent on the calls that repeated an earlier
+one. Bursts are found call by call, not averaged over the run, so a long
+suite calling a key in quick bursts far apart is still caught. Tallies are
+mergeable across processes; a burst split between processes is only
+counted in each part.
+"""
+
+# Minimum calls in bursts from one site for a repeat.
+MIN_REPEATS = 3
+# Maximum idle seconds between a response and the next call in a burst.
+REPEAT_WINDOW = 1.0
+
+
+def repeat_key(record):
+    """Return the key a record is tallied under (see tally)."""
+    return (
+        record['url'],
+        record['method'],
+        record.get('call_site') or '',
+        record.get('test') or ''
+    )
+
+
+def seed(last):
+    """Return an empty tally following a call made at last (see tally).
+
+    :param last: Float. Timestamp of the last call already tallied
+    elsewhere (e.g. stored), so a burst is followed across batches.
+    """
+    return [0, 0, last, last, 0, 0, 0.0]
+
+
+def tally(repeats, record, duration_ns, window=REPEAT_WINDOW):
+    """Add a logged request to repeat tallies.
+
+    :param repeats: Dict. (url, method, call_site, test) -> [count,
+    duration_ns, first, last, repeated, repeated_ns, repeated_gap], updated
+    in place. The repeated columns count the calls made within window of
+    the previous response, their duration and the idle seconds before them.
+    :param record: Dict. Logged request, with call_site, timestamp (as its
+    response ended) and its test if any.
+    :param duration_ns: Int. Request duration in nanoseconds.
+    :param window: Float. Maximum idle seconds before a call in a burst.
+    """
+    timestamp = record.get('timestamp')
+    if timestamp is None:
+        return
+    key = repeat_key(record)
+    tallied = repeats.get(key)
+    if tallied is None:
+        repeats[key] = [1, duration_ns, timestamp, timestamp, 0, 0, 0.0]
+        return
+    tallied[0] += 1
+    tallied[1] += duration_ns
+    # Timestamps are taken as responses end: the gap is the idle time from
+    # the previous response to this request, whatever its duration. Calls
+    # from several threads may overlap.
+    gap = max(timestamp - duration_ns / 1e9 - tallied[3], 0.0)
+    if gap <= window:
+        tallied[4] += 1
+        tallied[5] += duration_ns
+        tallied[6] += gap
+    tallied[2] = min(tallied[2], timestamp)
+    tallied[3] = max(tallied[3], timestamp)
+
+
+def find_repeats(repeats, min_repeats=MIN_REPEATS):
+    """Rank repeated calls by time wasted.
+
+    :param repeats: List. Dicts with url, method, call_site, test, count,
+    duration_ns, first, last, repeated, repeated_ns and repeated_gap (as in
+    analysis['repeats']).
+    :param min_repeats: Int. Minimum calls in bursts from one site.
+    :return: List. The repeats found, with mean_gap (between calls in
+    bursts) and wasted_ns added, most wasteful first.
+    """
+    found = []
+    for repeat in repeats:
+        repeated = repeat['repeated']
+        # A burst of n calls repeats the first one n - 1 times.
+        if not repeated or repeated + 1 < min_repeats:
+            continue
+        found.append(dict(
+            repeat,
+            mean_gap=repeat['repeated_gap'] / repeated,
+            wasted_ns=repeat['repeated_ns']
+        ))
+    found.sort(key=lambda repeat: repeat['wasted_ns'], reverse=True)
+    return found
@@ -0,0 +1,158 @@
+"""Client side copy of the server's store, kept current incrementally."""
+from . import connections, repeats
+from .aggregate import Aggregator, histogram_for
+from .sizes import BYTE_COLUMNS, add_bytes
+from .store import CHANGE_COLUMNS
+
+
+class Replica(Aggregator):
+    """Apply the server's changes (see Store.changes) to an Aggregator.
+
+    Changed rows are sent whole: the difference with the held row is added
+    to the aggregates, so each refresh costs only the rows changed since.
+    A server with several workers sends changes per shard store, rows are
+    held per shard.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        super(Replica, self).__init__()
+        self.epochs = None
+        self.cursor = 0
+        self._shards = []
+
+    def apply(self, changes):
+        """Apply changes.
+
+        :param changes: Dict. As returned by Store.changes(self.cursor), or
+        by a sharded server: with the changes of each shard in 'shards'.
+        :return: Boolean. False if the changes are from another epoch (the
+        server data was deleted or replaced): fetch them again from 0.
+        """
+        shards = changes.get('shards', [changes])
+        epochs = [shard['epoch'] for shard in shards]
+        if epochs != self.epochs:
+            if any(shard['since'] for shard in shards):
+                return False
+            self.__init__()
+            self.epochs = epochs
+            self._shards = [
+                dict((table, {}) for table, _ in CHANGE_COLUMNS)
+                for _ in shards
+            ]
+        for rows, shard in zip(self._shards, shards):
+            for table, _ in CHANGE_COLUMNS:
+                apply_row = getattr(self, '_apply_{}'.format(table))
+                for row in shard[table]:
+                    apply_row(rows, row)
+        self.cursor = changes['cursor']
+        return True
+
+    def _apply_tracebacks(self, rows, row):
+        rows['tracebacks'][row[0]] = tuple(row[1])
+
+    def _apply_responses(self, rows, row):
+        rows['responses'][row[0]] = (row[1], row[2])
+
+    def _apply_requests(self, rows, row):
+        key = tuple(row[:4])
+        url, method, traceback_hash, response_hash = key
+        domain = row[4]
+        old = rows['requests'].get(key)
+        rows['requests'][key] = row
+        count, duration, max_ns = row[5:8]
+        sizes = dict(zip(BYTE_COLUMNS, row[8:]))
+        if old is not None:
+            count -= old[5]
+            duration -= old[6]
+            for column, value in zip(BYTE_COLUMNS, old[8:]):
+                sizes[column] -= value
+        duration_ns = int(round(duration * 1e9))
+        logged = self._logged(url)
+        logged['count'] += count
+        logged['methods'].add(method)
+        if traceback_hash:
+            traceback_list = rows['tracebacks'][traceback_hash]
+            logged['sampled'] += count
+            logged['tracebacks'].add(traceback_list)
+            logged['responses'].add(rows['responses'][response_hash])
+            stack = logged['stacks'].setdefault(
+                (method, traceback_list), [0, 0]
+            )
+            stack[0] += count
+            stack[1] += duration_ns
+            self.analysis['sampled_requests'] += count
+        for histogram in (
+            logged['latency'],
+            histogram_for(self.latency['domains'], domain),
+            histogram_for(self.latency['methods'], method)
+        ):
+            histogram.count += count
+            histogram.total += duration_ns
+            histogram.max = max(histogram.max, max_ns)
+        add_bytes(logged['bytes'], sizes)
+        add_bytes(self.bytes['total'], sizes)
+        add_bytes(self.bytes['domains'].setdefault(domain, {}), sizes)
+        add_bytes(self.bytes['methods'].setdefault(method, {}), sizes)
+        self.analysis['duration'] += duration
+        self.analysis['total_requests'] += count
+        self.analysis['domains'].add(domain)
+
+    def _apply_latency(self, rows, row):
+        url, method, domain, bucket, count = row
+        key = (url, method, bucket)
+        count -= rows['latency'].get(key, 0)
+        rows['latency'][key] = row[4]
+        for histogram in (
+            self._logged(url)['latency'],
+            histogram_for(self.latency['domains'], domain),
+            histogram_for(self.latency['methods'], method)
+        ):
+            buckets = histogram.buckets
+            buckets[bucket] = buckets.get(bucket, 0) + count
+
+    def _apply_examples(self, rows, row):
+        self._logged(row[0])['examples'].add(row[1])
+
+    def _apply_repeats(self, rows, row):
+        key = tuple(row[:4])
+        count, duration_ns, first, last = row[4:8]
+        repeated, repeated_ns, repeated_gap = row[8:]
+        old = rows['repeats'].get(key)
+        rows['repeats'][key] = row
+        if old is not None:
+            count -= old[4]
+            duration_ns -= old[5]
+            repeated -= old[8]
+            repeated_ns -= old[9]
+            repeated_gap -= old[10]
+        tallied = self.repeats.setdefault(key, repeats.seed(first))
+        tallied[0] += count
+        tallied[1] += duration_ns
+        tallied[2] = min(tallied[2], first)
+        tallied[3] = max(tallied[3], last)
+        tallied[4] += repeated
+        tallied[5] += repeated_ns
+        tallied[6] += repeated_gap
+
+    def _apply_connections(self, rows, row):
+        key = tuple(row[:2])
+        counts = list(row[2:])
+        old = rows['connections'].get(key)
+        rows['connections'][key] = row
+        tallied = self.connections.setdefault(
+            key, [0] * len(connections.COLUMNS)
+        )
+        for index, value in enumerate(counts):
+            tallied[index] += value - (old[2 + index] if old else 0)
+
+    def _apply_tests(self, rows, row):
+        test, count, duration_ns = row
+        old = rows['tests'].get(test)
+        rows['tests'][test] = row
+        if old is not None:
+            count -= old[1]
+            duration_ns -= old[2]
+        tallied = self.tests.setdefault(test, [0, 0])
+        tallied[0] += count
+        tallied[1] += duration_ns
@@ -0,0 +1,35 @@
+"""Sampling: which requests get their stack and response captured."""
+import random
+
+
+class Sampler(object):
+    """Pick requests to capture in full, counts are kept for all of them.
+
+    With adaptive sampling the 1st, 2nd, 4th, 8th... request per key is
+    always captured, so new urls are seen at once and hot ones back off
+    exponentially; other requests are captured at the sample rate.
+    """
+
+    def __init__(self, sample_rate=1.0, adaptive=False):
+        """Initialize.
+
+        :param sample_rate: Float. Fraction of requests captured, 0 to 1.
+        :param adaptive: Boolean. Also capture per key on powers of two.
+        """
+        self.sample_rate = sample_rate
+        self.adaptive = adaptive
+        self._seen = {}
+
+    def __call__(self, key):
+        """Whether to capture this request.
+
+        :param key: Hashable. Usually the (templated) url.
+        """
+        if self.adaptive:
+            # Unlocked: a racing thread may skew which request of a key is
+            # captured, never the counts.
+            seen = self._seen.get(key, 0) + 1
+            self._seen[key] = seen
+            if seen & (seen - 1) == 0:
+                return True
+        return random.random() < self.sample_rate
@@ -5,162 +5,406 @@ monitor_requests_server
 Optional arguments:
 -p 9001
 --port=9001
+--unix-socket=/tmp/monitor_requests.sock (instead of TCP unless -p is set)
+--db=monitor.db (file backed, survives restarts)
+--commit-interval=200 (ms between group commits with --db)
+--vacuum (compact the --db file at shutdown)
+--workers=4 (processes sharing the port, each with a shard of the data)
+--max-sessions=100 (named sessions held at most)
+--session-rows=1000000 (rows per session at most, per worker)
+--session-memory=64 (MiB per session at most, per worker)
+--session-idle=3600 (seconds before an unused session is evicted)
+
+GET / returns everything, GET /?since=CURSOR only the rows changed since a
+cursor (see Store.changes), and GET /stream pushes those changes as
+server-sent events. The same paths under /sessions/NAME/ serve a session's
+own data (in memory), GET /sessions lists them with their usage.
 """
 import argparse
+import datetime
 import json
+import os
+import shutil
+import signal
+import tempfile
+import zlib
 import tornado.ioloop
 import tornado.web
-import sqlite3
 from tornado import gen
 from tornado.escape import json_decode
+from tornado.httpserver import HTTPServer
+from tornado.iostream import StreamClosedError
+from tornado.locks import Condition
+from tornado.netutil import bind_sockets, bind_unix_socket
+from .sessions import QuotaExceeded, SessionLimit, Sessions, SWEEP_INTERVAL
+from .shards import ShardedSource, Source, fork_workers
+from .store import Store, UnknownHashes, connect
+from .wire import UnsupportedFormat, decode
 
+# Stream: seconds between keepalive comments while nothing changes.
+KEEPALIVE = 15
 
-def init_db():
-    """Initialize the temp db."""
-    conn = sqlite3.connect(':memory:')
-    conn.text_factory = lambda x: x.encode('utf-8', 'ignore')
-    c = conn.cursor()
-    c.execute('CREATE TABLE logged_requests (url text, duration real)')
-    c.execute('CREATE TABLE methods (url text, method text)')
-    c.execute('CREATE TABLE tracebacks (url text, traceback text)')
-    c.execute(
-        'CREATE TABLE responses (url text, status_code integer, content text)'
-    )
-    c.execute('CREATE TABLE domains (domain text)')
-    conn.commit()
-    c.close()
-    return conn
 
+def init_db(path=None):
+    """Initialize the db.
+
+    :param path: String. SQLite file (WAL mode, group committed), in memory
+    if not set.
+    """
+    if not path:
+        return Store(connect())
+    return Store(connect(path), group_commit=True)
+
+
+class SessionHandler(tornado.web.RequestHandler):
+    """Base handler: the data of a session (or the default data)."""
+
+    def initialize(self, sessions):
+        """Initialize handler with the server's sessions.
+
+        :param sessions: Sessions. Default data source and named sessions.
+        """
+        self.sessions = sessions
 
-class MonitorEncoder(json.JSONEncoder):
-    """Basic encoder - override set but possibly more."""
+    def source(self, session):
+        """Source of a session, None for the default data."""
+        try:
+            return self.sessions.get(session)
+        except SessionLimit as e:
+            raise tornado.web.HTTPError(503, str(e))
 
-    def default(self, o):
-        """Override."""
-        if isinstance(o, set):
-            return list(o)
-        return json.JSONEncoder.default(self, o)
+    def target(self, session):
+        """Source to add to: refused while the session is over quota."""
+        source = self.source(session)
+        try:
+            self.sessions.check(session)
+        except QuotaExceeded as e:
+            raise tornado.web.HTTPError(507, str(e))
+        return source
 
 
-class MainHandler(tornado.web.RequestHandler):
+class MainHandler(SessionHandler):
     """Handler."""
 
-    def initialize(self, conn):
-        """Initialize handler with connection."""
-        self.conn = conn
+    @gen.coroutine
+    def delete(self, session=None):
+        """Reset stored data, or drop a session."""
+        yield self.source(session).delete()
+        if session is not None:
+            self.sessions.drop(session)
 
     @gen.coroutine
-    def delete(self):
-        """Reset stored data."""
-        c = self.conn.cursor()
-        c.execute('DELETE FROM logged_requests')
-        c.execute('DELETE FROM methods')
-        c.execute('DELETE FROM tracebacks')
-        c.execute('DELETE FROM responses')
-        c.execute('DELETE FROM domains')
-        self.conn.commit()
-        c.close()
+    def get(self, session=None):
+        """Retrieve stored data, or only changes with ?since=cursor."""
+        source = self.source(session)
+        since = self.get_argument('since', None)
+        if since is not None:
+            try:
+                changes = yield source.changes(since)
+            except ValueError:
+                raise tornado.web.HTTPError(400)
+            self.write(json.dumps(changes))
+            return
+        logged_requests, analysis = yield source.retrieve()
+        self.write(json.dumps({
+            'logged_requests': logged_requests,
+            'analysis': analysis
+        }, default=list))
 
     @gen.coroutine
-    def get(self):
-        """Retrieve stored data."""
+    def post(self, session=None):
+        """Add a new logged request."""
+        source = self.target(session)
+        source.store.add([json_decode(self.request.body)])
+        source.changed.notify_all()
+
+
+class BatchHandler(SessionHandler):
+    """Batch handler: many logged requests per POST."""
+
+    @gen.coroutine
+    def post(self, session=None):
+        """Add a batch of logged requests in one transaction.
+
+        A JSON list, or a batch from wire.Encoder. Responds 409 with the
+        hashes to send again if it refers to texts the store does not have,
+        507 if the session is over quota.
+        """
+        source = self.target(session)
+        headers = self.request.headers
         try:
-            logged_requests = {}
-            analysis = {
-                'total_requests': 0,
-                'domains': set(),
-                'duration': 0
-            }
-            c = self.conn.cursor()
-            c.execute('SELECT * from logged_requests')
-            for row in c.fetchall():
-                url, duration = row
-                if url not in logged_requests:
-                    logged_requests[url] = {
-                        'count': 0,
-                        'methods': set(),
-                        'tracebacks': set(),
-                        'responses': set()
-                    }
-                logged_requests[url]['count'] += 1
-                analysis['total_requests'] += 1
-                analysis['duration'] += duration
-            c.execute('SELECT * from domains')
-            for row in c.fetchall():
-                analysis['domains'].add(row[0])
-            c.execute('SELECT * from methods')
-            for row in c.fetchall():
-                url, method = row
-                logged_requests[url]['methods'].add(method)
-            for row in c.fetchall():
-                url, traceback = row
-                logged_requests[url]['tracebacks'].add(
-                    tuple(json.loads(traceback))
-                )
-            c.execute('SELECT * from responses')
-            for row in c.fetchall():
-                url, status_code, content = row
-                logged_requests[url]['responses'].add((status_code, content))
-            c.close()
-            self.write(json.dumps({
-                'logged_requests': logged_requests,
-                'analysis': analysis
-            }, cls=MonitorEncoder))
-        except Exception as e:
-            print(e)
-            print(dir(e))
+            records, tracebacks, responses = decode(
+                self.request.body,
+                headers.get('Content-Type', '').split(';')[0].strip(),
+                headers.get('Content-Encoding')
+            )
+        except UnsupportedFormat:
+            raise tornado.web.HTTPError(415)
+        except (ValueError, KeyError, TypeError, zlib.error):
+            raise tornado.web.HTTPError(400)
+        try:
+            source.store.add(records, tracebacks, responses)
+        except UnknownHashes as e:
+            self.set_status(409)
+            self.write({'missing': e.hashes})
+            return
+        source.changed.notify_all()
+
+
+class ShardHandler(SessionHandler):
+    """This worker's shard store, read by the other workers."""
 
     @gen.coroutine
-    def post(self):
-        """Add a new logged request."""
-        request_data = json_decode(self.request.body)
-        url = request_data.get('url')
-        c = self.conn.cursor()
-        c.execute(
-            'INSERT INTO logged_requests (url, duration) VALUES (?,?)',
-            (url, request_data.get('duration'))
-        )
-        c.execute(
-            'INSERT INTO methods (url, method) VALUES (?,?)',
-            (url, request_data.get('method'))
-        )
-        c.execute(
-            'INSERT INTO tracebacks (url, traceback) VALUES (?,?)',
-            (url, json.dumps(request_data.get('traceback_list')))
-        )
-        c.execute(
-            'INSERT INTO responses (url, status_code, content) VALUES (?,?,?)',
-            (
-                url,
-                request_data.get('response_content'),
-                request_data.get('response_status_code')
+    def delete(self, session=None):
+        """Reset this shard, or drop its part of a session."""
+        if session is not None:
+            self.sessions.drop(session)
+            return
+        self.sessions.default.store.delete()
+        self.sessions.default.changed.notify_all()
+
+    @gen.coroutine
+    def get(self, session=None):
+        """Changes of this shard since ?since=cursor."""
+        try:
+            since = int(self.get_argument('since', 0))
+        except ValueError:
+            raise tornado.web.HTTPError(400)
+        self.write(json.dumps(self.source(session).store.changes(since)))
+
+
+class SessionsHandler(SessionHandler):
+    """Sessions held by this worker, with their usage."""
+
+    def get(self):
+        """Rows, bytes and idle seconds by session name."""
+        self.write(self.sessions.usage())
+
+
+class StreamHandler(SessionHandler):
+    """Server-sent events: changes as they are stored, for dashboards.
+
+    Each event is the changes since the previous one (see Store.changes),
+    with the id 'epoch:cursor', so reconnecting clients (Last-Event-ID)
+    resume.
+    """
+
+    def _resume(self):
+        """Epoch and cursor from Last-Event-ID or ?since=cursor."""
+        last = self.request.headers.get('Last-Event-ID', '')
+        epoch, _, cursor = last.rpartition(':')
+        if not epoch:
+            return None, self.get_argument('since', '0')
+        return epoch, cursor
+
+    @gen.coroutine
+    def get(self, session=None):
+        """Stream changes until the client goes away, or the session.
+
+        ?interval=seconds: least time between events (default 0.5).
+        """
+        source = self.source(session)
+        epoch, since = self._resume()
+        interval = float(self.get_argument('interval', 0.5))
+        try:
+            changes = yield source.changes(since)
+        except ValueError:
+            raise tornado.web.HTTPError(400)
+        self.set_header('Content-Type', 'text/event-stream')
+        self.set_header('Cache-Control', 'no-cache')
+        loop = tornado.ioloop.IOLoop.current()
+        send = True
+        written = loop.time()
+        while True:
+            if epoch != changes['epoch']:
+                # Deleted (or another server): send everything again.
+                if epoch is not None:
+                    changes = yield source.changes(0)
+                epoch = changes['epoch']
+                send = True
+            if send or changes['cursor'] != since:
+                send = False
+                since = changes['cursor']
+                self.write('id: {}:{}\nevent: changes\ndata: {}\n\n'.format(
+                    epoch, since, json.dumps(changes)
+                ))
+                written = loop.time()
+            elif loop.time() - written >= KEEPALIVE:
+                self.write(': keepalive\n\n')
+                written = loop.time()
+            try:
+                yield self.flush()
+            except StreamClosedError:
+                return
+            yield gen.sleep(interval)
+            yield source.wait(epoch, since, datetime.timedelta(
+                seconds=max(KEEPALIVE - (loop.time() - written), 0)
+            ))
+            if source.closed:
+                return
+            if session is not None:
+                # Watched sessions are in use.
+                self.sessions.get(session)
+            changes = yield source.changes(since)
+
+
+# Default data at /, a session's at /sessions/NAME/.
+SESSION = r'(?:/sessions/([\w.-]+))?'
+
+
+def make_app(
+    store=None,
+    index=None,
+    paths=None,
+    max_sessions=None,
+    max_rows=None,
+    max_bytes=None,
+    idle=3600
+):
+    """Tornado make app.
+
+    :param index: Int. With --workers: this worker's shard.
+    :param paths: List. With --workers: every worker's Unix socket.
+    :param max_sessions: Int. Sessions held at most.
+    :param max_rows: Int. Rows per session at most.
+    :param max_bytes: Int. Bytes per session at most.
+    :param idle: Float. Seconds before an unused session is evicted.
+    """
+    def make_source(source_store, prefix=''):
+        if paths:
+            return ShardedSource(
+                source_store, Condition(), index, paths, prefix
             )
-        )
-        c.execute(
-            'INSERT INTO domains (domain) VALUES (?)',
-            (request_data.get('domain'),)
-        )
-        self.conn.commit()
-        c.close()
-
-
-def make_app():
-    """Tornado make app."""
-    return tornado.web.Application([
-        (r'/', MainHandler, {'conn': init_db()})
+        return Source(source_store, Condition())
+
+    sessions = Sessions(
+        make_source(store or init_db()),
+        lambda name: make_source(init_db(), '/sessions/' + name),
+        max_sessions=max_sessions,
+        max_rows=max_rows,
+        max_bytes=max_bytes,
+        idle=idle
+    )
+    handler_args = {'sessions': sessions}
+    app = tornado.web.Application([
+        (SESSION + r'/', MainHandler, handler_args),
+        (SESSION + r'/batch', BatchHandler, handler_args),
+        (SESSION + r'/shard', ShardHandler, handler_args),
+        (SESSION + r'/stream', StreamHandler, handler_args),
+        (r'/sessions', SessionsHandler, handler_args)
     ])
+    app.sessions = sessions
+    return app
+
+
+def shard_path(path, index):
+    """Db file of a worker's shard: monitor.db -> monitor.1.db."""
+    root, ext = os.path.splitext(path)
+    return '{}.{}{}'.format(root, index, ext)
 
 
 def run_server():
     """Run server with command line arguments."""
     parser = argparse.ArgumentParser(description='Set port.')
     parser.add_argument('-p', '--port', help='Port', required=False)
+    parser.add_argument(
+        '--unix-socket', help='Unix domain socket path', required=False
+    )
+    parser.add_argument('--db', help='SQLite file path', required=False)
+    parser.add_argument(
+        '--commit-interval', help='Group commit interval (ms)',
+        type=int, default=200
+    )
+    parser.add_argument(
+        '--vacuum', help='Compact the db at shutdown', action='store_true'
+    )
+    parser.add_argument(
+        '--workers', help='Processes sharing the port', type=int, default=1
+    )
+    parser.add_argument(
+        '--max-sessions', help='Sessions held at most', type=int
+    )
+    parser.add_argument(
+        '--session-rows', help='Rows per session at most', type=int
+    )
+    parser.add_argument(
+        '--session-memory', help='MiB per session at most', type=float
+    )
+    parser.add_argument(
+        '--session-idle', help='Seconds before idle sessions are evicted',
+        type=float, default=3600
+    )
     args = vars(parser.parse_args())
-    app = make_app()
-    port = args.get('port') or 9001
-    app.listen(port)
-    print('Listening on {}'.format(port))
-    tornado.ioloop.IOLoop.current().start()
+    workers = args['workers']
+    unix_socket = args.get('unix_socket')
+    if workers < 1:
+        parser.error('--workers must be at least 1.')
+    if workers > 1 and unix_socket:
+        parser.error('--workers share a port, not a Unix socket.')
+    port = args.get('port') or (None if unix_socket else 9001)
+    db = args.get('db')
+    index = paths = None
+    if workers > 1:
+        # Each worker serves its shard to the others on a private socket.
+        shard_dir = tempfile.mkdtemp(prefix='monitor_requests_')
+        paths = [
+            os.path.join(shard_dir, 'shard-{}.sock'.format(i))
+            for i in range(workers)
+        ]
+        print('Listening on {} ({} workers)'.format(port, workers))
+        index = fork_workers(workers)
+        if index is None:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            return
+        if db:
+            db = shard_path(db, index)
+    store = init_db(db)
+    if db:
+        print('Recovered {} requests from {}'.format(
+            store.total_requests(), db
+        ))
+    memory = args.get('session_memory')
+    app = make_app(
+        store,
+        index,
+        paths,
+        max_sessions=args.get('max_sessions'),
+        max_rows=args.get('session_rows'),
+        max_bytes=int(memory * 1024 * 1024) if memory else None,
+        idle=args['session_idle']
+    )
+    server = HTTPServer(app)
+    if paths:
+        server.add_sockets(bind_sockets(port, reuse_port=True))
+        server.add_socket(bind_unix_socket(paths[index]))
+    else:
+        if unix_socket:
+            server.add_socket(bind_unix_socket(unix_socket))
+            print('Listening on {}'.format(unix_socket))
+        if port:
+            server.listen(port)
+            print('Listening on {}'.format(port))
+    loop = tornado.ioloop.IOLoop.current()
+    if store.group_commit:
+        tornado.ioloop.PeriodicCallback(
+            store.commit, args['commit_interval']
+        ).start()
+    tornado.ioloop.PeriodicCallback(
+        app.sessions.evict, SWEEP_INTERVAL * 1000
+    ).start()
+    signal.signal(
+        signal.SIGTERM,
+        lambda signum, frame: loop.add_callback_from_signal(loop.stop)
+    )
+    try:
+        loop.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        store.close(vacuum=args.get('vacuum'))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+"""Named sessions on a shared server, each with its own store.
+
+Concurrent test runs (CI jobs, say) log into their own session: GET and
+DELETE only see it. Sessions are kept in memory, created on first use and
+evicted once idle. Quotas bound the rows and memory of each.
+"""
+import re
+import time
+
+# Session names, as used in urls: /sessions/NAME/.
+SESSION_NAME = re.compile(r'^[\w.-]+$')
+
+# Seconds between sweeps for idle sessions.
+SWEEP_INTERVAL = 10
+
+
+class SessionLimit(Exception):
+    """No new session: the server holds as many as allowed, none idle."""
+
+
+class QuotaExceeded(Exception):
+    """A session holds as many rows or bytes as allowed."""
+
+
+def check_name(name):
+    """Return a valid session name.
+
+    :raise ValueError: Not a letter, digit, '_', '.' or '-' name.
+    """
+    if not SESSION_NAME.match(name):
+        raise ValueError('Invalid Monitor Requests session: {}.'.format(name))
+    return name
+
+
+class Sessions(object):
+    """Sources of the default data and of every named session."""
+
+    def __init__(
+        self,
+        default,
+        make_source,
+        max_sessions=None,
+        max_rows=None,
+        max_bytes=None,
+        idle=3600
+    ):
+        """Initialize.
+
+        :param default: Source. Data outside sessions, never evicted.
+        :param make_source: Callable. Session name -> new Source.
+        :param max_sessions: Int. Sessions held at most.
+        :param max_rows: Int. Rows per session store at most.
+        :param max_bytes: Int. Bytes per session store at most.
+        :param idle: Float. Seconds unused before a session is evicted.
+        """
+        self.default = default
+        self.make_source = make_source
+        self.max_sessions = max_sessions
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.idle = idle
+        self._sessions = {}
+        self._used = {}
+
+    def __contains__(self, name):
+        return name in self._sessions
+
+    def get(self, name=None):
+        """Return the source of a session, created if needed.
+
+        :param name: String. Session, None for the default data.
+        :raise SessionLimit: No room for a new session.
+        """
+        if name is None:
+            return self.default
+        source = self._sessions.get(name)
+        if source is None:
+            if self.max_sessions and len(self._sessions) >= self.max_sessions:
+                self.evict()
+                if len(self._sessions) >= self.max_sessions:
+                    raise SessionLimit(
+                        'Monitor Requests session limit: {}.'.format(
+                            self.max_sessions
+                        )
+                    )
+            source = self._sessions[name] = self.make_source(name)
+        self._used[name] = time.time()
+        return source
+
+    def drop(self, name):
+        """Close a session's store and forget it."""
+        source = self._sessions.pop(name, None)
+        self._used.pop(name, None)
+        if source is not None:
+            source.close()
+
+    def check(self, name):
+        """Refuse more data for a session over quota.
+
+        :raise QuotaExceeded: Rows or bytes at or over their quota.
+        """
+        if name is None:
+            return
+        rows, size = self._sessions[name].store.usage()
+        if self.max_rows and rows >= self.max_rows:
+            raise QuotaExceeded(
+                'Monitor Requests session {} holds {} rows.'.format(name, rows)
+            )
+        if self.max_bytes and size >= self.max_bytes:
+            raise QuotaExceeded(
+                'Monitor Requests session {} holds {} bytes.'.format(
+                    name, size
+                )
+            )
+
+    def evict(self):
+        """Drop sessions idle for longer than allowed.
+
+        :return: List. Names of the dropped sessions.
+        """
+        now = time.time()
+        idle = [
+            name for name, used in self._used.items()
+            if now - used > self.idle
+        ]
+        for name in idle:
+            self.drop(name)
+        return idle
+
+    def usage(self):
+        """Rows, bytes and idle seconds of every session, by name."""
+        now = time.time()
+        usage = {}
+        for name, source in self._sessions.items():
+            rows, size = source.store.usage()
+            usage[name] = {
+                'rows': rows,
+                'bytes': size,
+                'idle': now - self._used[name]
+            }
+        return usage
@@ -0,0 +1,201 @@
+"""Data sources for the server: one store, or a shard store per worker.
+
+With --workers N, N processes share the port (SO_REUSEPORT) and each adds
+the requests it receives to its own store. Changes are read from every
+shard over the workers' private Unix sockets and merged by a Replica: the
+cursor of a sharded server is the cursors of its shards, joined by '.'.
+"""
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import tornado.ioloop
+from tornado import gen
+from .replica import Replica
+from .transport import connection_pool
+
+
+def parse_cursor(since, count):
+    """Split a sharded cursor.
+
+    :param since: String. Shard cursors joined by '.', or '0'.
+    :param count: Int. Shards.
+    :return: List. One Int cursor per shard, all 0 when the cursor is from
+    a server with another count of shards.
+    :raise ValueError: Not a cursor.
+    """
+    cursors = [int(cursor) for cursor in str(since).split('.')]
+    if len(cursors) != count:
+        return [0] * count
+    return cursors
+
+
+class Source(object):
+    """A single store, read in the IOLoop."""
+
+    def __init__(self, store, changed):
+        """Initialize.
+
+        :param store: Store. Data of this server.
+        :param changed: Condition. Notified when stored data changes.
+        """
+        self.store = store
+        self.changed = changed
+        self.closed = False
+
+    @gen.coroutine
+    def changes(self, since):
+        """Store.changes, since a cursor as sent by clients."""
+        return self.store.changes(int(since))
+
+    @gen.coroutine
+    def retrieve(self):
+        """Store.retrieve."""
+        return self.store.retrieve()
+
+    @gen.coroutine
+    def delete(self):
+        """Delete stored data."""
+        self.store.delete()
+        self.changed.notify_all()
+
+    def close(self):
+        """Close the store, waking streams so they end."""
+        self.closed = True
+        self.store.close()
+        self.changed.notify_all()
+
+    def wait(self, epoch, cursor, timeout):
+        """Wait for changes after a cursor.
+
+        :param timeout: timedelta. Longest wait.
+        """
+        if epoch == self.store.epoch and cursor == self.store.seq:
+            return self.changed.wait(timeout=timeout)
+        return gen.moment
+
+
+class ShardedSource(Source):
+    """The shard stores of every worker, merged.
+
+    Other workers' shards are read with blocking calls, on threads.
+    """
+
+    def __init__(self, store, changed, index, paths, prefix=''):
+        """Initialize.
+
+        :param index: Int. This worker's shard.
+        :param paths: List. Unix socket of every worker, by shard.
+        :param prefix: String. Path of a session: '/sessions/NAME'.
+        """
+        super(ShardedSource, self).__init__(store, changed)
+        self.index = index
+        self.paths = paths
+        self.prefix = prefix
+        self.executor = ThreadPoolExecutor(max(len(paths) - 1, 1))
+
+    def _request(self, index, method, path):
+        resp = connection_pool(server_socket=self.paths[index]).request(
+            method, path
+        )
+        if resp.status != 200:
+            raise Exception('Monitor Requests server error: {}.'.format(
+                resp.status
+            ))
+        return resp
+
+    def _fetch(self, index, since):
+        return json.loads(
+            self._request(index, 'GET', '{}/shard?since={}'.format(
+                self.prefix, since
+            )).data
+        )
+
+    @gen.coroutine
+    def changes(self, since):
+        """Changes of every shard since a sharded cursor.
+
+        :return: Dict. epoch, since and cursor of all shards, and the
+        changes of each in 'shards' (see Replica.apply).
+        """
+        cursors = parse_cursor(since, len(self.paths))
+        loop = tornado.ioloop.IOLoop.current()
+        futures = [
+            loop.run_in_executor(self.executor, self._fetch, index, cursor)
+            if index != self.index else None
+            for index, cursor in enumerate(cursors)
+        ]
+        # SQLite connections stay on the IOLoop thread.
+        local = self.store.changes(cursors[self.index])
+        shards = []
+        for future in futures:
+            shards.append(local if future is None else (yield future))
+        return {
+            'epoch': '-'.join(shard['epoch'] for shard in shards),
+            'since': '.'.join(str(cursor) for cursor in cursors),
+            'cursor': '.'.join(str(shard['cursor']) for shard in shards),
+            'shards': shards
+        }
+
+    @gen.coroutine
+    def retrieve(self):
+        """Merge all shards (see Replica.results)."""
+        replica = Replica()
+        replica.apply((yield self.changes(0)))
+        return replica.results()
+
+    @gen.coroutine
+    def delete(self):
+        """Delete the data of every shard."""
+        futures = [
+            tornado.ioloop.IOLoop.current().run_in_executor(
+                self.executor, self._request, index, 'DELETE',
+                self.prefix + '/shard'
+            )
+            for index in range(len(self.paths)) if index != self.index
+        ]
+        yield super(ShardedSource, self).delete()
+        yield futures
+
+    def close(self):
+        """Close the store and the threads reading other shards."""
+        super(ShardedSource, self).close()
+        self.executor.shutdown(wait=False)
+
+    def wait(self, epoch, cursor, timeout):
+        """Other workers' changes are not notified: poll."""
+        return gen.moment
+
+
+def fork_workers(count):
+    """Fork worker processes.
+
+    :param count: Int. Workers.
+    :return: Int. In each worker, its index. None in the parent, once every
+    worker has exited: SIGTERM and SIGINT are forwarded to them.
+    """
+    children = {}
+    sys.stdout.flush()
+    for index in range(count):
+        pid = os.fork()
+        if pid == 0:
+            return index
+        children[pid] = index
+
+    def forward(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except OSError:
+            break
+        children.pop(pid, None)
+    return None
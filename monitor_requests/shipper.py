@@ -0,0 +1,153 @@
+"""Background shipping of logged requests to the server."""
+import atexit
+import collections
+import os
+import threading
+import time
+import weakref
+
+try:
+    import queue
+except ImportError:  # Python 2.x
+    import Queue as queue
+
+# Queue marker asking the worker to send whatever it has batched so far.
+_FLUSH = object()
+
+# Shippers flushed at exit: processes which never stop their Monitor.
+_shippers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_at_exit():
+    for shipper in list(_shippers):
+        try:
+            shipper.flush()
+        except Exception:
+            pass
+
+
+class Shipper(object):
+    """Batch records on a bounded queue and send them from a worker thread."""
+
+    def __init__(self, send, batch_size=100, flush_interval=0.5,
+                 max_queue=10000):
+        """Initialize.
+
+        :param send: Callable. Receives a list of records to send.
+        :param batch_size: Int. Send once this many records are queued.
+        :param flush_interval: Float. Send at least this often (seconds).
+        :param max_queue: Int. Queue bound, logging blocks when it is full
+        (unless put with block=False).
+        """
+        self.send = send
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._reset()
+        _shippers.add(self)
+
+    def _reset(self):
+        """Start afresh, in a new or forked process.
+
+        A forked child has no worker thread, and its copy of the queue holds
+        the parent's records: the parent sends them.
+        """
+        self._pid = os.getpid()
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        # Records put without blocking while the queue was full.
+        self._overflow = collections.deque()
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='monitor-requests-shipper'
+            )
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _next_batch(self):
+        """Block for a batch, cut short by size, time, or a flush marker."""
+        batch = []
+        item = self.queue.get()
+        deadline = time.time() + self.flush_interval
+        taken = 1
+        while item is not _FLUSH:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                break
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            taken += 1
+        return batch, taken
+
+    def _run(self):
+        while True:
+            batch, taken = self._next_batch()
+            try:
+                if batch:
+                    self.send(batch)
+            except Exception as e:
+                self.error = e
+            finally:
+                for _ in range(taken):
+                    self.queue.task_done()
+            self._drain()
+
+    def _drain(self):
+        """Queue held records while there is room (never blocks)."""
+        overflow = self._overflow
+        while overflow:
+            try:
+                record = overflow.popleft()
+            except IndexError:
+                return
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                overflow.appendleft(record)
+                return
+
+    def put(self, record, block=True):
+        """Queue a record for shipping.
+
+        :param block: Boolean. Wait for room when the queue is full. Else
+        (from an event loop, say) hold the record until the worker makes
+        room, memory growing meanwhile.
+        """
+        if self._thread is None or self._pid != os.getpid():
+            self._start()
+        if block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._overflow.append(record)
+
+    def flush(self):
+        """Block until every queued record has been sent."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        while self._overflow:
+            try:
+                self.queue.put(self._overflow.popleft())
+            except IndexError:
+                break
+        self.queue.put(_FLUSH)
+        self.queue.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
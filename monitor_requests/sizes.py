@@ -0,0 +1,76 @@
+"""Request and response sizes on the wire."""
+from .filters import netloc
+
+# Byte counters kept per request, in order.
+BYTE_COLUMNS = (
+    'request_header_bytes',
+    'request_body_bytes',
+    'response_header_bytes',
+    'response_body_bytes'
+)
+
+# Responses without a body, whatever their headers say.
+NO_BODY_STATUS = (204, 304)
+
+
+def header_size(first_line, headers):
+    """Size of a request or status line and headers, CRLFs included."""
+    size = len(first_line) + 4
+    for name, value in headers.items():
+        size += len(name) + len(value) + 4
+    return size
+
+
+def content_length(headers):
+    """Content-Length header as an int, None if missing or invalid."""
+    try:
+        return int(headers['Content-Length'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def request_sizes(request):
+    """Header and body sizes of a PreparedRequest.
+
+    Streamed bodies without a Content-Length count as 0.
+    :return: Tuple. (header_bytes, body_bytes).
+    """
+    body = request.body
+    if body is None:
+        body_bytes = 0
+    elif isinstance(body, bytes):
+        body_bytes = len(body)
+    elif isinstance(body, str):
+        body_bytes = len(body.encode('utf-8'))
+    else:
+        body_bytes = content_length(request.headers) or 0
+    # http.client adds the Host header.
+    header_bytes = header_size(
+        '{} {} HTTP/1.1'.format(request.method, request.path_url),
+        request.headers
+    ) + len('Host: \r\n') + len(netloc(request.url))
+    return header_bytes, body_bytes
+
+
+def response_sizes(response):
+    """Header and body sizes of a requests Response.
+
+    :return: Tuple. (header_bytes, body_bytes), body_bytes None when it
+    is only known once the body has been read.
+    """
+    header_bytes = header_size(
+        'HTTP/1.1 {} {}'.format(response.status_code, response.reason or ''),
+        response.headers
+    )
+    request = response.request
+    if response.status_code in NO_BODY_STATUS or (
+        request is not None and request.method == 'HEAD'
+    ):
+        return header_bytes, 0
+    return header_bytes, content_length(response.headers)
+
+
+def add_bytes(sums, record):
+    """Add a logged request's byte counters to sums (a dict, in place)."""
+    for column in BYTE_COLUMNS:
+        sums[column] = sums.get(column, 0) + (record.get(column) or 0)
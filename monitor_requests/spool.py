@@ -0,0 +1,194 @@
+"""Append-only spool files: serverless storage for parallel processes.
+
+Each process appends JSON lines to its own file. Tracebacks and responses
+are written once per file, as {"traceback_hash": ..., "traceback_list": [...]}
+and {"response_hash": ..., "response": [status_code, content]} lines, and
+requests refer to them by hash.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+from .store import content_hash
+
+SPOOL_PATTERN = 'monitor_requests-*.jsonl'
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+@atexit.register
+def _flush_at_exit():
+    for writer in list(_writers.values()):
+        try:
+            writer.flush()
+        except Exception:
+            pass
+
+
+def spool_paths(directory):
+    """List the spool files in a directory."""
+    return sorted(glob.glob(os.path.join(directory, SPOOL_PATTERN)))
+
+
+def read_spool(path):
+    """Read a spool file.
+
+    :param path: String. Spool file path.
+    :return: Generator. Logged requests, with traceback_list and response
+    resolved.
+    """
+    tracebacks = {}
+    responses = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                # Partially written line from a process still running.
+                break
+            record = json.loads(line)
+            if 'response' in record:
+                responses[record['response_hash']] = record['response']
+                continue
+            if 'traceback_list' in record:
+                tracebacks[record['traceback_hash']] = (
+                    record['traceback_list']
+                )
+                continue
+            # Unsampled requests have no traceback.
+            record['traceback_list'] = tracebacks.get(
+                record.pop('traceback_hash')
+            )
+            status_code, content = responses[record.pop('response_hash')]
+            record['response_status_code'] = status_code
+            record['response_content'] = content
+            yield record
+
+
+class SpoolWriter(object):
+    """Buffered, append-only writer of one process's spool file.
+
+    Lines are buffered in a list and written with os.write: a forked child
+    drops the lines it inherited, the parent writes them once.
+    """
+
+    def __init__(self, directory, buffer_size=2 ** 20):
+        """Initialize.
+
+        :param directory: String. Spool directory, created if needed.
+        :param buffer_size: Int. Write buffer size in bytes.
+        """
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.path = None
+        self._fd = None
+        self._pid = None
+        self._lines = []
+        self._size = 0
+        self._hashes = {}
+        self._responses = set()
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._fd is not None:
+            # Inherited from the parent: its lines are the parent's to write.
+            os.close(self._fd)
+        try:
+            os.makedirs(self.directory)
+        except OSError:
+            if not os.path.isdir(self.directory):
+                raise
+        self.path = os.path.join(
+            self.directory,
+            SPOOL_PATTERN.replace('*', '{}-{}'.format(
+                os.getpid(), uuid.uuid4().hex
+            ))
+        )
+        self._fd = os.open(
+            self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644
+        )
+        self._pid = os.getpid()
+        self._lines = []
+        self._size = 0
+        self._hashes = {}
+        self._responses = set()
+
+    def _append(self, value):
+        line = (json.dumps(value) + '\n').encode('utf-8')
+        self._lines.append(line)
+        self._size += len(line)
+
+    def _write_lines(self):
+        data = b''.join(self._lines)
+        self._lines = []
+        self._size = 0
+        while data:
+            data = data[os.write(self._fd, data):]
+
+    def write(self, record):
+        """Append a logged request.
+
+        :param record: Dict. Logged request, as posted to the server.
+        """
+        traceback_list = record.pop('traceback_list')
+        if traceback_list is not None:
+            traceback_list = tuple(traceback_list)
+        response = (
+            record.pop('response_status_code'),
+            record.pop('response_content')
+        )
+        response_hash = content_hash(response)
+        with self._lock:
+            # A forked child gets its own file, never the parent's.
+            if self._pid != os.getpid():
+                self._open()
+            traceback_hash = self._hashes.get(traceback_list)
+            if traceback_hash is None and traceback_list is not None:
+                traceback_hash = content_hash(traceback_list)
+                self._hashes[traceback_list] = traceback_hash
+                self._append({
+                    'traceback_hash': traceback_hash,
+                    'traceback_list': traceback_list
+                })
+            if response_hash not in self._responses:
+                self._responses.add(response_hash)
+                self._append({
+                    'response_hash': response_hash,
+                    'response': response
+                })
+            record['traceback_hash'] = traceback_hash
+            record['response_hash'] = response_hash
+            self._append(record)
+            if self._size >= self.buffer_size:
+                self._write_lines()
+
+    def flush(self):
+        """Write buffered lines to disk."""
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                self._write_lines()
+
+    def delete(self):
+        """Delete every spool file in the directory."""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+                self._pid = None
+                self._lines = []
+                self._size = 0
+            for path in spool_paths(self.directory):
+                os.remove(path)
+
+
+def spool_writer(directory):
+    """Return the writer for a spool directory, shared within a process.
+
+    :param directory: String. Spool directory.
+    """
+    directory = os.path.abspath(directory)
+    with _writers_lock:
+        if directory not in _writers:
+            _writers[directory] = SpoolWriter(directory)
+        return _writers[directory]
@@ -0,0 +1,170 @@
+"""Lazy traceback capture."""
+import linecache
+import os
+import sys
+import sysconfig
+import traceback
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+# Installed packages and the standard library: kept in tracebacks, but a
+# call site is the innermost frame outside them when there is one.
+LIBRARY_DIRS = tuple(set(
+    os.path.join(sysconfig.get_paths()[name], '')
+    for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')
+))
+
+# Per code object classification.
+KEEP, SKIP, MOCKED, LIBRARY = range(4)
+
+
+class StackCapture(object):
+    """Capture call stacks as raw frames, render source text on demand.
+
+    A captured stack is keyed by a fingerprint of (code id, line number)
+    pairs, cheap to hash and interned so identical stacks share one object.
+    The frames themselves are kept by the capture for rendering.
+    """
+
+    def __init__(self, mocking_libraries=()):
+        """Initialize.
+
+        :param mocking_libraries: Tuple. Libraries which mock requests,
+        requests made from within them are not captured.
+        """
+        self.mocking_patterns = tuple(
+            '/{}/'.format(library) for library in mocking_libraries
+        )
+        self._codes = {}
+        self._pinned = []
+        self._stacks = {}
+        self._rendered = {}
+        self._sites = {}
+
+    def _classify(self, code):
+        filename = code.co_filename
+        if any(pattern in filename for pattern in self.mocking_patterns):
+            flag = MOCKED
+        elif filename.startswith(PACKAGE_DIR):
+            flag = SKIP
+        elif filename.startswith(LIBRARY_DIRS):
+            flag = LIBRARY
+        else:
+            flag = KEEP
+        # Keep the code object alive so its id is never reused.
+        self._codes[id(code)] = flag
+        self._pinned.append(code)
+        return flag
+
+    def capture(self):
+        """Capture the current stack, minus monitor_requests frames.
+
+        :return: Tuple. Interned stack fingerprint, or None if called from
+        a mocking library.
+        """
+        codes = self._codes
+        frames = []
+        fingerprint = []
+        site = 0
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            flag = codes.get(id(code))
+            if flag is None:
+                flag = self._classify(code)
+            if flag is MOCKED:
+                return None
+            if flag is KEEP or flag is LIBRARY:
+                if flag is LIBRARY and site == len(frames):
+                    site += 1
+                frames.append((code, frame.f_lineno))
+                fingerprint.append((id(code), frame.f_lineno))
+            frame = frame.f_back
+        fingerprint = tuple(fingerprint)
+        interned = self._stacks.get(fingerprint)
+        if interned is None:
+            site = self._site(fingerprint, frames, site)
+            frames.reverse()
+            # setdefault is atomic: racing threads agree on one object.
+            interned = self._stacks.setdefault(
+                fingerprint, (fingerprint, tuple(frames), site)
+            )
+        return interned[0]
+
+    def _site(self, fingerprint, frames, index):
+        """Site key for the innermost non library frame (else innermost)."""
+        if not frames:
+            return ()
+        if index == len(frames):
+            index = 0
+        site = fingerprint[index]
+        if site not in self._sites:
+            self._add_site(site, *frames[index])
+        return site
+
+    def call_site(self):
+        """Call site of the current stack, without capturing the rest.
+
+        The innermost frame outside libraries, else the innermost frame.
+        Cheaper than capture, for requests whose stack is not kept.
+        :return: Tuple. Site key (see site), () if no frame is captured, or
+        None if called from a mocking library.
+        """
+        codes = self._codes
+        site = library = None
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            flag = codes.get(id(code))
+            if flag is None:
+                flag = self._classify(code)
+            if flag is MOCKED:
+                return None
+            if flag is KEEP and site is None:
+                site = (code, frame.f_lineno)
+            elif flag is LIBRARY and library is None:
+                library = (code, frame.f_lineno)
+            frame = frame.f_back
+        site = site or library
+        if site is None:
+            return ()
+        key = (id(site[0]), site[1])
+        if key not in self._sites:
+            self._add_site(key, *site)
+        return key
+
+    def site(self, stack):
+        """Site key of a captured stack, as call_site would return.
+
+        :param stack: Tuple. Fingerprint as returned by capture.
+        """
+        return self._stacks[stack][2]
+
+    def _add_site(self, site, code, lineno):
+        self._sites.setdefault(site, '{}:{} in {}'.format(
+            code.co_filename, lineno, code.co_name
+        ))
+
+    def render_site(self, site):
+        """Render a site key as 'file:line in function'."""
+        return self._sites[site] if site else ''
+
+    def render(self, stack):
+        """Render a captured stack like traceback.format_stack.
+
+        :param stack: Tuple. Fingerprint as returned by capture.
+        :return: Tuple. Formatted frames.
+        """
+        rendered = self._rendered.get(stack)
+        if rendered is None:
+            frames = self._stacks[stack][1]
+            rendered = tuple(traceback.format_list([
+                (
+                    code.co_filename,
+                    lineno,
+                    code.co_name,
+                    linecache.getline(code.co_filename, lineno).strip()
+                )
+                for code, lineno in frames
+            ]))
+            self._rendered[stack] = rendered
+        return rendered
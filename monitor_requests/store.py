@@ -0,0 +1,701 @@
+"""Aggregating SQLite store for the server."""
+import hashlib
+import json
+import re
+import sqlite3
+import uuid
+from .aggregate import MAX_EXAMPLES
+from . import connections, repeats
+from .histogram import bucket_index
+from .sizes import BYTE_COLUMNS
+
+# Bumped on schema changes, files from other versions are refused.
+SCHEMA_VERSION = 10
+
+# Rows carry the seq of the batch which last changed them, for changes().
+SCHEMA = (
+    # One row per (url, method, traceback, response) with rollup counters.
+    # Unsampled requests have empty traceback and response hashes.
+    '''CREATE TABLE IF NOT EXISTS requests (
+        url TEXT NOT NULL,
+        method TEXT NOT NULL,
+        traceback_hash TEXT NOT NULL,
+        response_hash TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        duration REAL NOT NULL,
+        max_ns INTEGER NOT NULL,
+        {},
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (url, method, traceback_hash, response_hash)
+    )'''.format(',\n        '.join(
+        '{} INTEGER NOT NULL'.format(column) for column in BYTE_COLUMNS
+    )),
+    'CREATE INDEX IF NOT EXISTS requests_domain ON requests (domain)',
+    # Latency histogram buckets (see histogram.py) per url and method.
+    '''CREATE TABLE IF NOT EXISTS latency (
+        url TEXT NOT NULL,
+        method TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (url, method, bucket)
+    )''',
+    # A few raw urls per url template.
+    '''CREATE TABLE IF NOT EXISTS examples (
+        url TEXT NOT NULL,
+        raw_url TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (url, raw_url)
+    )''',
+    # Repeated call tallies per call site and test (see repeats.py).
+    '''CREATE TABLE IF NOT EXISTS repeats (
+        url TEXT NOT NULL,
+        method TEXT NOT NULL,
+        call_site TEXT NOT NULL,
+        test TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        duration_ns INTEGER NOT NULL,
+        first REAL NOT NULL,
+        last REAL NOT NULL,
+        repeated INTEGER NOT NULL,
+        repeated_ns INTEGER NOT NULL,
+        repeated_gap REAL NOT NULL,
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (url, method, call_site, test)
+    )''',
+    # Connection reuse counters per call site (see connections.py).
+    '''CREATE TABLE IF NOT EXISTS connections (
+        domain TEXT NOT NULL,
+        call_site TEXT NOT NULL,
+        {},
+        seq INTEGER NOT NULL,
+        PRIMARY KEY (domain, call_site)
+    )'''.format(',\n        '.join(
+        '{} INTEGER NOT NULL'.format(column)
+        for column in connections.COLUMNS
+    )),
+    # Requests and their time per test (see pytest_plugin.py).
+    '''CREATE TABLE IF NOT EXISTS tests (
+        test TEXT PRIMARY KEY,
+        count INTEGER NOT NULL,
+        duration_ns INTEGER NOT NULL,
+        seq INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS tracebacks (
+        hash TEXT PRIMARY KEY,
+        traceback TEXT NOT NULL,
+        seq INTEGER NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS responses (
+        hash TEXT PRIMARY KEY,
+        status_code INTEGER,
+        content TEXT,
+        seq INTEGER NOT NULL
+    )''',
+    # Store wide values: the epoch, replaced when data is deleted.
+    '''CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )''',
+) + tuple(
+    'CREATE INDEX IF NOT EXISTS {0}_seq ON {0} (seq)'.format(table)
+    for table in (
+        'requests', 'latency', 'examples', 'repeats', 'connections',
+        'tests', 'tracebacks', 'responses'
+    )
+)
+
+# Repeat tally columns (see repeats.py).
+REPEAT_COLUMNS = (
+    'url', 'method', 'call_site', 'test', 'count', 'duration_ns', 'first',
+    'last', 'repeated', 'repeated_ns', 'repeated_gap'
+)
+
+# Columns sent by changes(), per table, in the order they are applied.
+CHANGE_COLUMNS = (
+    ('tracebacks', ('hash', 'traceback')),
+    ('responses', ('hash', 'status_code', 'content')),
+    ('requests', (
+        'url', 'method', 'traceback_hash', 'response_hash', 'domain',
+        'count', 'duration', 'max_ns'
+    ) + BYTE_COLUMNS),
+    ('latency', ('url', 'method', 'domain', 'bucket', 'count')),
+    ('examples', ('url', 'raw_url')),
+    ('repeats', REPEAT_COLUMNS),
+    ('connections', ('domain', 'call_site') + connections.COLUMNS),
+    ('tests', ('test', 'count', 'duration_ns'))
+)
+
+# INSERT ... ON CONFLICT DO UPDATE needs SQLite 3.24: older versions update
+# the rows held, then insert the others.
+ON_CONFLICT = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+
+def upsert(table, columns, keys, updates):
+    """Build the statements adding a row to counters, or updating them.
+
+    Rows are bound by position, in the order of columns, whichever form
+    runs. The last column (seq) must be updated.
+    :param table: String. Table name.
+    :param columns: Tuple. Columns inserted.
+    :param keys: Tuple. Columns of the primary key.
+    :param updates: Tuple. (column, SQL expression) pairs updating a row
+    held, excluded.<column> being the value bound.
+    :return: Tuple. (INSERT ... ON CONFLICT, (UPDATE, INSERT OR IGNORE)).
+    """
+    index = dict(
+        (column, '?{}'.format(number))
+        for number, column in enumerate(columns, 1)
+    )
+    values = ', '.join(index[column] for column in columns)
+    insert = 'INSERT {{}}INTO {} ({}) VALUES ({})'.format(
+        table, ', '.join(columns), values
+    )
+    statement = '{} ON CONFLICT ({}) DO UPDATE SET {}'.format(
+        insert.format(''),
+        ', '.join(keys),
+        ', '.join('{} = {}'.format(*update) for update in updates)
+    )
+    update = 'UPDATE {} SET {} WHERE {}'.format(
+        table,
+        ', '.join(
+            '{} = {}'.format(
+                column, re.sub(
+                    r'excluded\.(\w+)',
+                    lambda match: index[match.group(1)],
+                    expression
+                )
+            )
+            for column, expression in updates
+        ),
+        ' AND '.join('{} = {}'.format(key, index[key]) for key in keys)
+    )
+    return statement, (update, insert.format('OR IGNORE '))
+
+
+def added(*columns):
+    """(column, SQL expression) pairs adding the values bound to columns."""
+    return tuple(
+        (column, '{0} + excluded.{0}'.format(column)) for column in columns
+    )
+
+
+UPSERT_REQUEST = upsert(
+    'requests',
+    (
+        'url', 'method', 'traceback_hash', 'response_hash', 'domain',
+        'count', 'duration', 'max_ns'
+    ) + BYTE_COLUMNS + ('seq',),
+    ('url', 'method', 'traceback_hash', 'response_hash'),
+    added('count', 'duration') + (
+        ('max_ns', 'MAX(max_ns, excluded.max_ns)'),
+    ) + added(*BYTE_COLUMNS) + (('seq', 'excluded.seq'),)
+)
+
+INSERT_EXAMPLE = '''
+    INSERT OR IGNORE INTO examples (url, raw_url, seq)
+    SELECT ?, ?, ? WHERE (SELECT COUNT(*) FROM examples WHERE url = ?) < {}
+'''.format(MAX_EXAMPLES)
+
+UPSERT_LATENCY = upsert(
+    'latency',
+    ('url', 'method', 'domain', 'bucket', 'count', 'seq'),
+    ('url', 'method', 'bucket'),
+    added('count') + (('seq', 'excluded.seq'),)
+)
+
+UPSERT_REPEAT = upsert(
+    'repeats',
+    REPEAT_COLUMNS + ('seq',),
+    ('url', 'method', 'call_site', 'test'),
+    added('count', 'duration_ns') + (
+        ('first', 'MIN(first, excluded.first)'),
+        ('last', 'MAX(last, excluded.last)')
+    ) + added('repeated', 'repeated_ns', 'repeated_gap') + (
+        ('seq', 'excluded.seq'),
+    )
+)
+
+UPSERT_CONNECTIONS = upsert(
+    'connections',
+    ('domain', 'call_site') + connections.COLUMNS + ('seq',),
+    ('domain', 'call_site'),
+    added(*connections.COLUMNS) + (('seq', 'excluded.seq'),)
+)
+
+UPSERT_TEST = upsert(
+    'tests',
+    ('test', 'count', 'duration_ns', 'seq'),
+    ('test',),
+    added('count', 'duration_ns') + (('seq', 'excluded.seq'),)
+)
+
+
+class UnknownHashes(Exception):
+    """A batch refers to tracebacks or responses the store does not have."""
+
+    def __init__(self, hashes):
+        """Initialize.
+
+        :param hashes: List. Hashes to send again, with their text.
+        """
+        super(UnknownHashes, self).__init__(
+            'Monitor Requests unknown hashes: {}.'.format(', '.join(hashes))
+        )
+        self.hashes = hashes
+
+
+def content_hash(value):
+    """Hash a JSON serializable value."""
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def connect(path=':memory:', cache_size=20000):
+    """Open a SQLite connection, tuned for ingest when file backed.
+
+    :param path: String. Database file, or ':memory:'.
+    :param cache_size: Int. Page cache size in KiB (file backed only).
+    :return: sqlite3 Connection.
+    """
+    conn = sqlite3.connect(path)
+    if path != ':memory:':
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=-{}'.format(cache_size))
+        conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+class Store(object):
+    """Rollup store: counters per unique key, not rows per request."""
+
+    # Upsert with ON CONFLICT, or its fallback (see upsert).
+    on_conflict = ON_CONFLICT
+
+    def __init__(self, conn, group_commit=False):
+        """Initialize, creating tables if needed (existing data is kept).
+
+        :param conn: sqlite3 Connection.
+        :param group_commit: Boolean. Leave writes uncommitted until
+        commit() is called, so many batches share one commit.
+        """
+        self.conn = conn
+        self.group_commit = group_commit
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        tables = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'"
+        ).fetchone()[0]
+        if tables and version != SCHEMA_VERSION:
+            raise Exception(
+                'Monitor Requests db schema version {} (expected {}), '
+                'remove it to start over.'.format(version, SCHEMA_VERSION)
+            )
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self.conn.execute('PRAGMA user_version={}'.format(SCHEMA_VERSION))
+            epoch = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'epoch'"
+            ).fetchone()
+            if epoch is None:
+                self._new_epoch()
+            else:
+                self.epoch = epoch[0]
+        self.seq = max(
+            self.conn.execute(
+                'SELECT COALESCE(MAX(seq), 0) FROM {}'.format(table)
+            ).fetchone()[0]
+            for table, _ in CHANGE_COLUMNS
+        )
+        # Texts held, batches may refer to them by hash alone.
+        self.known = set(
+            row[0] for row in self.conn.execute(
+                'SELECT hash FROM tracebacks UNION SELECT hash FROM responses'
+            )
+        )
+
+    def _new_epoch(self):
+        """Start a new epoch: cursors from earlier ones are invalid."""
+        self.epoch = uuid.uuid4().hex
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('epoch', ?)", (self.epoch,)
+        )
+
+    def _upsert(self, statements, rows):
+        statement, fallback = statements
+        if self.on_conflict:
+            self.conn.executemany(statement, rows)
+            return
+        for statement in fallback:
+            self.conn.executemany(statement, rows)
+
+    def commit(self):
+        """Commit pending writes (group commit mode)."""
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+    def close(self, vacuum=False):
+        """Commit and close, optionally compacting the database first.
+
+        :param vacuum: Boolean. VACUUM before closing.
+        """
+        self.commit()
+        if vacuum:
+            self.conn.execute('VACUUM')
+        self.conn.close()
+
+    def total_requests(self):
+        """Count stored requests."""
+        return self.conn.execute(
+            'SELECT COALESCE(SUM(count), 0) FROM requests'
+        ).fetchone()[0]
+
+    def usage(self):
+        """Rows and bytes held, cheap enough to check on every batch.
+
+        Rows are only ever deleted all at once, so the highest rowid of a
+        table counts its rows without a scan.
+        :return: Tuple. (rows, bytes).
+        """
+        rows = sum(
+            self.conn.execute(
+                'SELECT COALESCE(MAX(rowid), 0) FROM {}'.format(table)
+            ).fetchone()[0]
+            for table, _ in CHANGE_COLUMNS
+        )
+        pages = self.conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+        return rows, pages * page_size
+
+    def add(self, records, tracebacks=None, responses=None):
+        """Add logged requests in one transaction.
+
+        Records are rolled up in memory first, so a batch of repeated
+        requests costs one upsert per unique key.
+        :param records: List. Logged requests as posted by a Monitor, with
+        a traceback_list and response, or their hashes (see wire.py).
+        :param tracebacks: Dict. Hash -> traceback sent with the records.
+        :param responses: Dict. Hash -> [status_code, content] sent with
+        the records.
+        :raise UnknownHashes: Nothing is added: records refer to texts
+        neither stored nor sent.
+        """
+        rollup = {}
+        latency = {}
+        examples = set()
+        repeat_tallies = {}
+        connection_tallies = {}
+        test_tallies = {}
+        tracebacks = dict(tracebacks or {})
+        responses = dict(responses or {})
+        referenced = set()
+        for record in records:
+            if 'traceback_hash' in record:
+                traceback_hash = record['traceback_hash'] or ''
+                response_hash = record['response_hash'] or ''
+                if traceback_hash:
+                    referenced.update((traceback_hash, response_hash))
+            elif record.get('sampled', True):
+                traceback_list = record.get('traceback_list') or []
+                traceback_hash = content_hash(traceback_list)
+                tracebacks[traceback_hash] = traceback_list
+                response = [
+                    record.get('response_status_code'),
+                    record.get('response_content')
+                ]
+                response_hash = content_hash(response)
+                responses[response_hash] = response
+            else:
+                traceback_hash = response_hash = ''
+            key = (
+                record.get('url'),
+                record.get('method'),
+                traceback_hash,
+                response_hash
+            )
+            duration = record.get('duration') or 0
+            duration_ns = record.get('duration_ns')
+            if duration_ns is None:
+                duration_ns = int(duration * 1e9)
+            if key not in rollup:
+                rollup[key] = [record.get('domain'), 0, 0.0, 0] + [0] * len(
+                    BYTE_COLUMNS
+                )
+            rolled = rollup[key]
+            rolled[1] += 1
+            rolled[2] += duration
+            rolled[3] = max(rolled[3], duration_ns)
+            for index, column in enumerate(BYTE_COLUMNS, 4):
+                rolled[index] += record.get(column) or 0
+            bucket = (
+                record.get('url'),
+                record.get('method'),
+                record.get('domain'),
+                bucket_index(duration_ns)
+            )
+            latency[bucket] = latency.get(bucket, 0) + 1
+            raw_url = record.get('raw_url')
+            if raw_url and raw_url != record.get('url'):
+                examples.add((record.get('url'), raw_url))
+            if record.get('timestamp') is not None:
+                key = repeats.repeat_key(record)
+                if key not in repeat_tallies:
+                    # Follow a burst from the batches before.
+                    row = self.conn.execute(
+                        '''SELECT last FROM repeats WHERE url = ?
+                        AND method = ? AND call_site = ? AND test = ?''',
+                        key
+                    ).fetchone()
+                    if row is not None:
+                        repeat_tallies[key] = repeats.seed(row[0])
+                repeats.tally(repeat_tallies, record, duration_ns)
+            connections.tally(connection_tallies, record)
+            test = record.get('test')
+            if test is not None:
+                tallied = test_tallies.setdefault(test, [0, 0])
+                tallied[0] += 1
+                tallied[1] += duration_ns
+        missing = referenced.difference(self.known, tracebacks, responses)
+        if missing:
+            raise UnknownHashes(sorted(missing))
+        seq = self.seq + 1
+        # A savepoint keeps a failed batch from spoiling a group commit.
+        if not self.conn.in_transaction:
+            self.conn.execute('BEGIN')
+        self.conn.execute('SAVEPOINT batch')
+        try:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO tracebacks VALUES (?, ?, ?)',
+                [
+                    (h, json.dumps(tb), seq) for h, tb in tracebacks.items()
+                    if h not in self.known
+                ]
+            )
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)',
+                [
+                    (h, rs[0], rs[1], seq) for h, rs in responses.items()
+                    if h not in self.known
+                ]
+            )
+            self._upsert(
+                UPSERT_REQUEST,
+                [
+                    key + tuple(values) + (seq,)
+                    for key, values in rollup.items()
+                ]
+            )
+            self._upsert(
+                UPSERT_LATENCY,
+                [key + (count, seq) for key, count in latency.items()]
+            )
+            self.conn.executemany(
+                INSERT_EXAMPLE,
+                [(url, raw_url, seq, url) for url, raw_url in examples]
+            )
+            self._upsert(
+                UPSERT_REPEAT,
+                [
+                    key + tuple(values) + (seq,)
+                    for key, values in repeat_tallies.items()
+                ]
+            )
+            self._upsert(
+                UPSERT_CONNECTIONS,
+                [
+                    key + tuple(values) + (seq,)
+                    for key, values in connection_tallies.items()
+                ]
+            )
+            self._upsert(
+                UPSERT_TEST,
+                [
+                    (test, count, duration_ns, seq)
+                    for test, (count, duration_ns) in test_tallies.items()
+                ]
+            )
+        except Exception:
+            self.conn.execute('ROLLBACK TO batch')
+            self.conn.execute('RELEASE batch')
+            raise
+        self.conn.execute('RELEASE batch')
+        self.seq = seq
+        self.known.update(tracebacks, responses)
+        if not self.group_commit:
+            self.commit()
+
+    def delete(self):
+        """Reset stored data.
+
+        Traceback and response texts are kept: clients send each only once.
+        """
+        with self.conn:
+            self.conn.execute('DELETE FROM requests')
+            self.conn.execute('DELETE FROM latency')
+            self.conn.execute('DELETE FROM examples')
+            self.conn.execute('DELETE FROM repeats')
+            self.conn.execute('DELETE FROM connections')
+            self.conn.execute('DELETE FROM tests')
+            self._new_epoch()
+
+    def changes(self, since=0):
+        """Rows changed after a cursor, for incremental retrieval.
+
+        Rows are sent whole (counters to date), keyed by their primary key
+        (see CHANGE_COLUMNS): a copy replaces the rows it holds.
+        :param since: Int. Cursor from a previous call, 0 for all rows.
+        :return: Dict. epoch, since, cursor (pass as since next time) and
+        lists of rows per table. A copy from another epoch starts over.
+        """
+        c = self.conn.cursor()
+        changes = {'epoch': self.epoch, 'since': since, 'cursor': self.seq}
+        for table, columns in CHANGE_COLUMNS:
+            c.execute('SELECT {} FROM {} WHERE seq > ?'.format(
+                ', '.join(columns), table
+            ), (since,))
+            changes[table] = [list(row) for row in c]
+        for row in changes['tracebacks']:
+            row[1] = json.loads(row[1])
+        c.close()
+        return changes
+
+    def retrieve(self):
+        """Build logged_requests and analysis with SQL rollups.
+
+        :return: Tuple. (logged_requests, analysis), JSON serializable.
+        """
+        c = self.conn.cursor()
+        logged_requests = {}
+        c.execute(
+            """SELECT url, SUM(count),
+            SUM(CASE WHEN traceback_hash != '' THEN count ELSE 0 END)
+            FROM requests GROUP BY url"""
+        )
+        for url, count, sampled in c:
+            logged_requests[url] = {
+                'count': count,
+                'sampled': sampled,
+                'methods': [],
+                'tracebacks': [],
+                'responses': [],
+                'examples': [],
+                'stacks': []
+            }
+        c.execute('SELECT DISTINCT url, method FROM requests')
+        for url, method in c:
+            logged_requests[url]['methods'].append(method)
+        c.execute(
+            '''SELECT DISTINCT r.url, t.traceback
+            FROM requests r JOIN tracebacks t ON t.hash = r.traceback_hash'''
+        )
+        for url, traceback in c:
+            logged_requests[url]['tracebacks'].append(json.loads(traceback))
+        c.execute(
+            '''SELECT DISTINCT r.url, s.status_code, s.content
+            FROM requests r JOIN responses s ON s.hash = r.response_hash'''
+        )
+        for url, status_code, content in c:
+            logged_requests[url]['responses'].append([status_code, content])
+        c.execute(
+            '''SELECT r.url, r.method, t.traceback, SUM(r.count),
+            CAST(SUM(r.duration) * 1e9 AS INTEGER)
+            FROM requests r JOIN tracebacks t ON t.hash = r.traceback_hash
+            GROUP BY r.url, r.method, r.traceback_hash'''
+        )
+        for url, method, traceback, count, duration_ns in c:
+            logged_requests[url]['stacks'].append({
+                'method': method,
+                'traceback': json.loads(traceback),
+                'count': count,
+                'duration_ns': duration_ns
+            })
+        for url, sums in self._bytes(c, 'url').items():
+            logged_requests[url]['bytes'] = sums
+        c.execute('SELECT url, raw_url FROM examples')
+        for url, raw_url in c:
+            if url in logged_requests:
+                logged_requests[url]['examples'].append(raw_url)
+        c.execute(
+            """SELECT SUM(count), SUM(duration),
+            SUM(CASE WHEN traceback_hash != '' THEN count ELSE 0 END)
+            FROM requests"""
+        )
+        total_requests, duration, sampled_requests = c.fetchone()
+        c.execute('SELECT DISTINCT domain FROM requests')
+        analysis = {
+            'total_requests': total_requests or 0,
+            'sampled_requests': sampled_requests or 0,
+            'domains': [row[0] for row in c],
+            'duration': duration or 0,
+            'latency': {
+                'domains': self._histograms(c, 'domain'),
+                'methods': self._histograms(c, 'method')
+            }
+        }
+        analysis['bytes'] = {
+            'total': self._bytes(c)[None],
+            'domains': self._bytes(c, 'domain'),
+            'methods': self._bytes(c, 'method')
+        }
+        c.execute(
+            'SELECT {} FROM repeats WHERE count > 1'.format(
+                ', '.join(REPEAT_COLUMNS)
+            )
+        )
+        analysis['repeats'] = [dict(zip(REPEAT_COLUMNS, row)) for row in c]
+        c.execute('SELECT domain, call_site, {} FROM connections'.format(
+            ', '.join(connections.COLUMNS)
+        ))
+        analysis['connections'] = [
+            dict(zip(('domain', 'call_site') + connections.COLUMNS, row))
+            for row in c
+        ]
+        c.execute('SELECT test, count, duration_ns FROM tests')
+        tests = [
+            dict(zip(('test', 'count', 'duration_ns'), row)) for row in c
+        ]
+        if tests:
+            analysis['tests'] = tests
+        for url, histogram in self._histograms(c, 'url').items():
+            logged_requests[url]['latency'] = histogram
+        c.close()
+        return logged_requests, analysis
+
+    def _bytes(self, c, column=None):
+        """Byte counter sums grouped by a column (keyed None for totals)."""
+        sums = ', '.join(
+            'COALESCE(SUM({}), 0)'.format(name) for name in BYTE_COLUMNS
+        )
+        if column is None:
+            c.execute('SELECT NULL, {} FROM requests'.format(sums))
+        else:
+            c.execute('SELECT {0}, {1} FROM requests GROUP BY {0}'.format(
+                column, sums
+            ))
+        return dict(
+            (row[0], dict(zip(BYTE_COLUMNS, row[1:]))) for row in c
+        )
+
+    def _histograms(self, c, column):
+        """Latency histograms (as dicts) grouped by a column."""
+        histograms = {}
+        c.execute(
+            '''SELECT {0}, SUM(count),
+            CAST(SUM(duration) * 1e9 AS INTEGER), MAX(max_ns)
+            FROM requests GROUP BY {0}'''.format(column)
+        )
+        for key, count, total, max_ns in c:
+            histograms[key] = {
+                'buckets': {}, 'count': count, 'total': total, 'max': max_ns
+            }
+        c.execute(
+            '''SELECT {0}, bucket, SUM(count) FROM latency
+            GROUP BY {0}, bucket'''.format(column)
+        )
+        for key, bucket, count in c:
+            histograms[key]['buckets'][str(bucket)] = count
+        return histograms
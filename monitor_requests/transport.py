@@ -0,0 +1,88 @@
+"""Connections from a Monitor to the server, over TCP or a Unix socket."""
+import json
+import os
+import socket
+import threading
+import urllib3
+from urllib3.connection import HTTPConnection
+from .sessions import check_name
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, *args, **kwargs):
+        """Initialize.
+
+        :param socket_path: String. Path of the server's socket.
+        """
+        self.socket_path = kwargs.pop('socket_path')
+        super(UnixHTTPConnection, self).__init__(*args, **kwargs)
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except (OSError, socket.error):
+            sock.close()
+            raise
+        return sock
+
+
+class UnixHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    """Keep-alive connection pool over a Unix domain socket."""
+
+    ConnectionCls = UnixHTTPConnection
+
+    def __init__(self, socket_path, **kwargs):
+        """Initialize.
+
+        :param socket_path: String. Path of the server's socket.
+        """
+        super(UnixHTTPConnectionPool, self).__init__(
+            'localhost', socket_path=socket_path, **kwargs
+        )
+
+
+def connection_pool(server_port=None, server_socket=None, maxsize=4):
+    """Return this process's keep-alive pool for a server.
+
+    Pools are shared by every Monitor in a process, and rebuilt after a fork
+    so workers never share sockets with their parent.
+    :param server_port: Int. Server on localhost TCP.
+    :param server_socket: String. Server on a Unix domain socket.
+    :param maxsize: Int. Connections kept alive.
+    """
+    key = (os.getpid(), server_port, server_socket)
+    with _pools_lock:
+        if key not in _pools:
+            if server_socket:
+                pool = UnixHTTPConnectionPool(server_socket, maxsize=maxsize)
+            else:
+                pool = urllib3.HTTPConnectionPool(
+                    'localhost', server_port, maxsize=maxsize
+                )
+            _pools[key] = pool
+        return _pools[key]
+
+
+def fetch(server_port=None, server_socket=None, session=None):
+    """Retrieve (logged_requests, analysis) from a running server.
+
+    :param session: String. Named session, default data if not set.
+    """
+    path = '/'
+    if session is not None:
+        path = '/sessions/{}/'.format(check_name(session))
+    resp = connection_pool(server_port, server_socket).request('GET', path)
+    if resp.status != 200:
+        raise Exception('Monitor Requests server error: {}.'.format(
+            resp.status
+        ))
+    data = json.loads(resp.data)
+    return data['logged_requests'], data['analysis']
@@ -0,0 +1,164 @@
+"""Compact batches of logged requests, sent to the server.
+
+A batch holds field names once, then one list of values per request.
+Tracebacks and responses are sent by content hash: their text is only
+included the first time a process sends it, the server keeps a hash -> text
+dictionary. Batches are packed with msgpack when it is installed (JSON
+otherwise), then compressed with zlib.
+"""
+import json
+import zlib
+from .connections import COLUMNS as CONNECTION_COLUMNS
+from .sizes import BYTE_COLUMNS
+from .store import content_hash
+
+try:
+    import msgpack
+except ImportError:  # Optional: JSON is used instead.
+    msgpack = None
+
+MSGPACK = 'application/x-msgpack'
+JSON = 'application/json'
+
+# Values sent per request, in order.
+FIELDS = (
+    'url',
+    'domain',
+    'method',
+    'response_status_code',
+    'duration_ns',
+    'traceback_hash',
+    'response_hash',
+    'call_site',
+    'timestamp'
+) + BYTE_COLUMNS + (
+    'raw_url',
+    'connection',
+    'test'
+)
+
+
+class UnsupportedFormat(ValueError):
+    """A batch encoded with msgpack, which is not installed."""
+
+
+class Encoder(object):
+    """Encode batches for one server, sending each text once."""
+
+    def __init__(self, content_type=None, level=1):
+        """Initialize.
+
+        :param content_type: String. MSGPACK or JSON, MSGPACK if installed.
+        :param level: Int. zlib compression level.
+        """
+        if content_type is None:
+            content_type = MSGPACK if msgpack is not None else JSON
+        self.content_type = content_type
+        self.level = level
+        self._traceback_hashes = {}
+        self._sent = set()
+        self._last = set()
+
+    def refused(self, missing):
+        """The last batch was refused: send its texts again on re-encoding.
+
+        :param missing: List. Hashes the server does not have (it lost them
+        on restart), sent again too.
+        """
+        self._sent.difference_update(self._last, missing)
+
+    def _text(self, texts, value_hash, value):
+        if value_hash not in self._sent:
+            self._sent.add(value_hash)
+            self._last.add(value_hash)
+            texts[value_hash] = value
+
+    def encode(self, records):
+        """Encode serialized records (see DataHandler._serialize).
+
+        :param records: List. Logged requests, not modified.
+        :return: Tuple. (body, headers) to POST to /batch.
+        """
+        tracebacks = {}
+        responses = {}
+        rows = []
+        self._last = set()
+        for record in records:
+            traceback_hash = response_hash = None
+            traceback_list = record.get('traceback_list')
+            if traceback_list is not None:
+                traceback_list = tuple(traceback_list)
+                traceback_hash = self._traceback_hashes.get(traceback_list)
+                if traceback_hash is None:
+                    traceback_hash = content_hash(traceback_list)
+                    self._traceback_hashes[traceback_list] = traceback_hash
+                self._text(tracebacks, traceback_hash, traceback_list)
+                response = (
+                    record.get('response_status_code'),
+                    record.get('response_content')
+                )
+                response_hash = content_hash(response)
+                self._text(responses, response_hash, response)
+            connection = record.get('connection')
+            if connection is not None:
+                connection = [
+                    connection.get(column, 0) for column in CONNECTION_COLUMNS
+                ]
+            values = dict(
+                record,
+                traceback_hash=traceback_hash,
+                response_hash=response_hash,
+                connection=connection
+            )
+            rows.append([values.get(field) for field in FIELDS])
+        batch = {
+            'fields': FIELDS,
+            'records': rows,
+            'tracebacks': tracebacks,
+            'responses': responses
+        }
+        if self.content_type == MSGPACK:
+            body = msgpack.packb(batch, use_bin_type=True)
+        else:
+            body = json.dumps(batch).encode('utf-8')
+        return zlib.compress(body, self.level), {
+            'Content-Type': self.content_type,
+            'Content-Encoding': 'deflate'
+        }
+
+
+def decode(body, content_type=JSON, content_encoding=None):
+    """Decode a batch POSTed to /batch.
+
+    Plain JSON lists of records (the format before batches were encoded)
+    are accepted too.
+    :param body: Bytes. Request body.
+    :param content_type: String. MSGPACK or JSON.
+    :param content_encoding: String. 'deflate' if zlib compressed.
+    :return: Tuple. (records, tracebacks, responses): records as logged,
+    with traceback_hash and response_hash, and the texts sent with them.
+    :raise ValueError: Malformed (UnsupportedFormat: msgpack missing).
+    """
+    if content_encoding == 'deflate':
+        body = zlib.decompress(body)
+    if content_type == MSGPACK:
+        if msgpack is None:
+            raise UnsupportedFormat('msgpack is not installed.')
+        batch = msgpack.unpackb(body, raw=False)
+    else:
+        batch = json.loads(body)
+    if isinstance(batch, list):
+        return batch, {}, {}
+    fields = batch['fields']
+    records = []
+    for row in batch['records']:
+        record = dict(zip(fields, row))
+        record['duration'] = record['duration_ns'] / 1e9
+        if record.get('traceback_hash') is None:
+            record['sampled'] = False
+        if record.get('connection') is not None:
+            record['connection'] = dict(
+                zip(CONNECTION_COLUMNS, record['connection'])
+            )
+        records.append(record)
+    return records, batch['tracebacks'], batch['responses']
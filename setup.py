@@ -19,9 +19,15 @@ setup(
         'Topic :: Software Development :: Testing',
     ],
     description='Check remote calls via request',
+    extras_require={'msgpack': ['msgpack']},
     entry_points="""
 [console_scripts]
 monitor_requests_server = monitor_requests.server:run_server
+monitor_requests_merge = monitor_requests.merge:run_merge
+monitor_requests_flamegraph = monitor_requests.flamegraph:run_flamegraph
+monitor_requests_budget = monitor_requests.budgets:run_budget
+[pytest11]
+monitor_requests = monitor_requests.pytest_plugin
 """,
     keywords='requests testing monitoring',
     license='BSD',
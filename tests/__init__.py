@@ -1 +1,65 @@
+"""Test helpers shared by the test modules."""
 
+
+def make_record(url='http://google.com/', method='GET', **kwargs):
+    """Build a logged request, as posted by a Monitor.
+
+    Keyword arguments override its fields. Given one of duration (seconds)
+    and duration_ns, the other is set to match.
+    """
+    record = {
+        'url': url,
+        'method': method,
+        'domain': 'google.com',
+        'response_content': 'ok',
+        'response_status_code': 200,
+        'duration': 0.5,
+        'duration_ns': 500000000,
+        'traceback_list': ['a'],
+        'call_site': 'a.py:1 in f',
+        'timestamp': 100.0,
+        'request_header_bytes': 100,
+        'request_body_bytes': 0,
+        'response_header_bytes': 200,
+        'response_body_bytes': 1000,
+        'connection': {'requests': 1, 'new_connections': 1}
+    }
+    if 'duration' in kwargs and 'duration_ns' not in kwargs:
+        record['duration_ns'] = int(round(kwargs['duration'] * 1e9))
+    elif 'duration_ns' in kwargs and 'duration' not in kwargs:
+        record['duration'] = kwargs['duration_ns'] / 1e9
+    record.update(kwargs)
+    return record
+
+
+def normalized(results):
+    """Make Store.retrieve and Replica.results comparable."""
+    logged_requests, analysis = results
+    logged_requests = dict(
+        (url, dict(
+            logged,
+            methods=sorted(logged['methods']),
+            tracebacks=sorted(tuple(tb) for tb in logged['tracebacks']),
+            responses=sorted(tuple(rs) for rs in logged['responses']),
+            examples=sorted(logged['examples']),
+            stacks=sorted(
+                (s['method'], tuple(s['traceback']), s['count'],
+                 s['duration_ns'])
+                for s in logged['stacks']
+            )
+        ))
+        for url, logged in logged_requests.items()
+    )
+    analysis = dict(
+        analysis,
+        domains=sorted(analysis['domains']),
+        repeats=sorted(sorted(r.items()) for r in analysis['repeats']),
+        connections=sorted(
+            sorted(c.items()) for c in analysis['connections']
+        )
+    )
+    if 'tests' in analysis:
+        analysis['tests'] = sorted(
+            sorted(t.items()) for t in analysis['tests']
+        )
+    return logged_requests, analysis
@@ -0,0 +1,118 @@
+"""Budget tests."""
+import os
+import tempfile
+import unittest
+from monitor_requests.aggregate import Aggregator
+from monitor_requests.budgets import (
+    baseline, check_budgets, describe, read_baseline, write_baseline
+)
+from tests import make_record
+
+
+def results(*records):
+    """Aggregate records."""
+    aggregator = Aggregator()
+    for record in records:
+        aggregator.add(record)
+    return aggregator.results()
+
+
+class BudgetsTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        """Aggregate a baseline run."""
+        self.records = [
+            make_record(test='a', duration_ns=100000000),
+            make_record(test='a', duration_ns=100000000),
+            make_record('http://facebook.com/', test='b')
+        ]
+        self.base = baseline(*results(*self.records))
+
+    def test_baseline(self):
+        """Test a baseline round trips through its file."""
+        self.assertEqual(self.base['total']['count'], 3)
+        self.assertEqual(self.base['urls']['http://google.com/']['count'], 2)
+        self.assertEqual(
+            self.base['tests']['a'], {'count': 2, 'duration_ms': 200.0}
+        )
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            write_baseline(path, *results(*self.records))
+            self.assertEqual(read_baseline(path), self.base)
+        finally:
+            os.remove(path)
+
+    def test_same_run(self):
+        """Test the baseline run passes, as do fewer and faster calls."""
+        self.assertEqual(check_budgets(self.base, *results(*self.records)), [])
+        self.assertEqual(
+            check_budgets(self.base, *results(
+                make_record(test='a', duration_ns=1000)
+            )),
+            []
+        )
+
+    def test_extra_call(self):
+        """Test an extra call is a regression, unless tolerated."""
+        run = results(*self.records + [make_record(test='a', duration_ns=1)])
+        regressions = check_budgets(self.base, *run)
+        self.assertEqual(
+            [(r['kind'], r['key'], r['metric']) for r in regressions],
+            [
+                ('total', None, 'count'),
+                ('url', 'http://google.com/', 'count'),
+                ('test', 'a', 'count')
+            ]
+        )
+        self.assertEqual(
+            describe(regressions[1]),
+            'Url http://google.com/: count 3 (baseline 2, limit 2.000)'
+        )
+        self.assertEqual(check_budgets(self.base, *run, calls=0.5), [])
+
+    def test_new(self):
+        """Test new urls and tests are regressions."""
+        run = results(*self.records[:2] + [
+            make_record('http://bing.com/', test='c')
+        ])
+        regressions = check_budgets(self.base, *run)
+        self.assertEqual(
+            [(r['kind'], r['key'], r['baseline']) for r in regressions],
+            [('url', 'http://bing.com/', None), ('test', 'c', None)]
+        )
+        self.assertEqual(describe(regressions[1]), 'Test c: new, 1 calls')
+
+    def test_latency(self):
+        """Test slower calls are regressions past the tolerance."""
+        slower = [
+            make_record(
+                record['url'], duration_ns=record['duration_ns'] * 2,
+                test=record['test']
+            )
+            for record in self.records
+        ]
+        regressions = check_budgets(self.base, *results(*slower))
+        self.assertEqual(
+            sorted((r['kind'], r['key'], r['metric']) for r in regressions),
+            [
+                ('test', 'a', 'duration_ms'),
+                ('test', 'b', 'duration_ms'),
+                ('total', None, 'duration_ms'),
+                ('url', 'http://facebook.com/', 'p90'),
+                ('url', 'http://google.com/', 'p90')
+            ]
+        )
+        self.assertEqual(
+            check_budgets(self.base, *results(*slower), latency=1.5), []
+        )
+
+    def test_percentile(self):
+        """Test unknown percentiles are refused."""
+        with self.assertRaises(ValueError):
+            check_budgets(self.base, *results(*self.records), percentile=95)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Response capture tests."""
+import io
+import unittest
+import requests
+from urllib3.response import HTTPResponse
+from monitor_requests.capture import ResponseCapture
+
+
+def make_response(content=b'<html>example</html>'):
+    """Build an unread streamed response."""
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = HTTPResponse(
+        body=io.BytesIO(content), status=200, preload_content=False
+    )
+    return response
+
+
+class ResponseCaptureTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_full(self):
+        """Test bodies are captured as they are consumed."""
+        response = make_response()
+        body = ResponseCapture().attach(response)
+        self.assertFalse(body.complete)
+        self.assertEqual(response.content, b'<html>example</html>')
+        self.assertTrue(body.complete)
+        self.assertEqual(body.summary(), (200, b'<html>example</html>'))
+
+    def test_full_budget(self):
+        """Test full capture is bounded by the budget."""
+        response = make_response()
+        body = ResponseCapture(budget=6).attach(response)
+        list(response.iter_content(4))
+        self.assertEqual(body.summary(), (200, b'<html>'))
+
+    def test_digest(self):
+        """Test digest capture."""
+        response = make_response()
+        body = ResponseCapture('digest', prefix_size=3).attach(response)
+        response.content
+        self.assertEqual(body.size, 20)
+        self.assertIn("prefix=b'<ht'", body.content)
+        self.assertIn('sha1=', body.content)
+
+    def test_status(self):
+        """Test status capture leaves the body alone."""
+        response = make_response()
+        body = ResponseCapture('status').attach(response)
+        self.assertTrue(body.complete)
+        self.assertEqual(body.summary(), (200, None))
+        self.assertIsInstance(response.raw, HTTPResponse)
+
+    def test_status_count(self):
+        """Test status capture can count bytes without keeping them."""
+        response = make_response()
+        body = ResponseCapture('status').attach(response, count=True)
+        self.assertFalse(body.complete)
+        list(response.iter_content(8))
+        self.assertTrue(body.complete)
+        self.assertEqual(body.summary(), (200, None))
+        self.assertEqual((body.size, body.wire_size), (20, 20))
+        self.assertEqual(body.chunks, [])
+
+    def test_close(self):
+        """Test closing an unread response completes the capture."""
+        response = make_response()
+        body = ResponseCapture().attach(response)
+        response.close()
+        self.assertTrue(body.complete)
+        self.assertEqual(body.content, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
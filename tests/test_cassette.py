@@ -0,0 +1,105 @@
+"""Cassette tests."""
+import os
+import shutil
+import tempfile
+import unittest
+import requests
+from requests.adapters import HTTPAdapter
+from monitor_requests import Monitor
+from monitor_requests.cassette import Cassette, canonical_url
+
+
+class CassetteTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cassette.jsonl')
+        self.sent = []
+        self.original = HTTPAdapter.send
+
+        def stub_send(adapter, request, *args, **kwargs):
+            self.sent.append(request.url)
+            response = requests.Response()
+            response.status_code = 201
+            response.reason = 'Created'
+            response.headers['X-Test'] = 'yes'
+            response._content = 'body {}'.format(len(self.sent)).encode()
+            response.url = request.url
+            return response
+        HTTPAdapter.send = stub_send
+
+    def tearDown(self):
+        HTTPAdapter.send = self.original
+        shutil.rmtree(self.directory)
+
+    def session(self, mode):
+        monitor = Monitor(cassette=self.path, cassette_mode=mode)
+        return monitor, requests.Session()
+
+    def test_canonical_url(self):
+        """Test query order and host case do not matter."""
+        self.assertEqual(
+            canonical_url('HTTP://Example.com?b=2&a=1'),
+            canonical_url('http://example.com/?a=1&b=2')
+        )
+
+    def test_record_and_replay(self):
+        """Test recorded responses are replayed without sending."""
+        monitor, session = self.session('once')
+        session.get('http://example.com/a?x=1&y=2')
+        session.post('http://example.com/a', data=b'one')
+        monitor.stop()
+        self.assertEqual(len(self.sent), 2)
+        monitor, session = self.session('replay')
+        response = session.get('http://example.com/a?y=2&x=1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.reason, 'Created')
+        self.assertEqual(response.headers['X-Test'], 'yes')
+        self.assertEqual(response.content, b'body 1')
+        self.assertEqual(
+            session.post('http://example.com/a', data=b'one').content,
+            b'body 2'
+        )
+        with self.assertRaises(requests.ConnectionError):
+            session.post('http://example.com/a', data=b'two')
+        monitor.refresh()
+        monitor.stop()
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(monitor.analysis['cassette']['hits'], 2)
+        self.assertEqual(
+            monitor.analysis['cassette']['misses'],
+            [('POST', 'http://example.com/a')]
+        )
+        self.assertEqual(monitor.analysis['total_requests'], 2)
+
+    def test_once_records_misses(self):
+        """Test once mode appends misses to an existing cassette."""
+        monitor, session = self.session('once')
+        session.get('http://example.com/a')
+        monitor.stop()
+        monitor, session = self.session('once')
+        session.get('http://example.com/a')
+        session.get('http://example.com/b')
+        monitor.stop()
+        self.assertEqual(self.sent, [
+            'http://example.com/a', 'http://example.com/b'
+        ])
+        cassette = Cassette(self.path, 'replay')
+        self.assertEqual(len(cassette._index), 2)
+
+    def test_stale_index(self):
+        """Test a missing index and a partial last line are recovered."""
+        monitor, session = self.session('record')
+        session.get('http://example.com/a')
+        monitor.stop()
+        os.remove(self.path + '.idx')
+        with open(self.path, 'ab') as f:
+            f.write(b'{"key": "partial')
+        monitor, session = self.session('once')
+        self.assertEqual(session.get('http://example.com/a').content,
+                         b'body 1')
+        session.get('http://example.com/b')
+        monitor.stop()
+        cassette = Cassette(self.path, 'replay')
+        self.assertEqual(len(cassette._index), 2)
@@ -0,0 +1,196 @@
+"""httpx and aiohttp hook tests."""
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import monitor_requests
+from monitor_requests.clients import AiohttpHook, HttpxHook, client_hooks
+from monitor_requests.sizes import header_size
+
+try:
+    import httpx
+except ImportError:  # Optional: the httpx tests are skipped.
+    httpx = None
+
+try:
+    import aiohttp
+except ImportError:  # Optional: the aiohttp tests are skipped.
+    aiohttp = None
+
+
+def run(coroutine):
+    """Run a coroutine in a new event loop (asyncio.run is Python 3.7+)."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def handler(request):
+    """httpx MockTransport handler: echo the path."""
+    return httpx.Response(200, content=b'path ' + request.url.path.encode())
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Echo the path, announcing its size or not (/chunked)."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'path ' + self.path.encode()
+        self.send_response(200)
+        if self.path == '/chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b'%x\r\n%s\r\n0\r\n\r\n' % (len(body), body))
+            return
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class HttpxTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        """Monitor httpx only."""
+        self.monitor = monitor_requests.Monitor(clients=['httpx'])
+        self.transport = httpx.MockTransport(handler)
+
+    def tearDown(self):
+        """Unpatch."""
+        self.monitor.stop()
+
+    def test_sync(self):
+        """Test sync requests are logged with their bodies and sizes."""
+        with httpx.Client(transport=self.transport) as client:
+            response = client.get('http://a.com/x')
+            self.assertEqual(response.text, 'path /x')
+            with client.stream('GET', 'http://a.com/y') as streamed:
+                list(streamed.iter_bytes())
+        self.monitor.refresh()
+        logged = self.monitor.logged_requests
+        self.assertEqual(logged['http://a.com/x']['count'], 1)
+        self.assertEqual(
+            logged['http://a.com/y']['responses'], {(200, b'path /y')}
+        )
+        sizes = logged['http://a.com/x']['bytes']
+        self.assertEqual(sizes['response_body_bytes'], 7)
+        self.assertEqual(
+            sizes['request_header_bytes'],
+            header_size('GET /x HTTP/1.1', response.request.headers)
+        )
+
+    def test_async(self):
+        """Test concurrent async requests are logged with their tests."""
+        async def requests():
+            async with httpx.AsyncClient(transport=self.transport) as client:
+                self.monitor.test = 'a'
+                task = asyncio.ensure_future(client.get('http://a.com/a'))
+                self.monitor.test = 'b'
+                await asyncio.gather(
+                    task, *[client.get('http://a.com/b') for _ in range(3)]
+                )
+        run(requests())
+        self.monitor.refresh()
+        self.assertEqual(self.monitor.analysis['total_requests'], 4)
+        self.assertEqual(
+            sorted(
+                (test['test'], test['count'])
+                for test in self.monitor.analysis['tests']
+            ),
+            [('a', 1), ('b', 3)]
+        )
+
+    def test_stop(self):
+        """Test stopping restores httpx."""
+        self.monitor.stop()
+        with httpx.Client(transport=self.transport) as client:
+            client.get('http://a.com/x')
+        self.monitor.refresh()
+        self.assertEqual(self.monitor.analysis['total_requests'], 0)
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AiohttpTestCase(unittest.TestCase):
+    """Test Case."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Serve on a local port."""
+        cls.server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever).start()
+        cls.base = 'http://127.0.0.1:{}'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop serving."""
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Monitor aiohttp only."""
+        self.monitor = monitor_requests.Monitor(clients=['aiohttp'])
+
+    def tearDown(self):
+        """Unpatch."""
+        self.monitor.stop()
+
+    def test_session(self):
+        """Test requests are logged, bodies captured as they are read."""
+        async def requests():
+            async with aiohttp.ClientSession() as session:
+                async with session.get(self.base + '/text') as response:
+                    self.assertEqual(await response.text(), 'path /text')
+                async with session.get(self.base + '/chunked') as response:
+                    chunks = [
+                        chunk async for chunk in
+                        response.content.iter_chunked(2)
+                    ]
+                    self.assertEqual(b''.join(chunks), b'path /chunked')
+        run(requests())
+        self.monitor.refresh()
+        logged = self.monitor.logged_requests
+        self.assertEqual(
+            logged[self.base + '/text']['responses'], {(200, b'path /text')}
+        )
+        chunked = logged[self.base + '/chunked']
+        self.assertEqual(chunked['responses'], {(200, b'path /chunked')})
+        self.assertEqual(chunked['bytes']['response_body_bytes'], 13)
+
+
+class ClientHooksTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_lazy_import(self):
+        """Test client libraries are imported by the hooks installed only."""
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys\n'
+            'import monitor_requests\n'
+            'print(sorted({\'httpx\', \'aiohttp\'} & set(sys.modules)))\n'
+        ], env=dict(os.environ, PYTHONPATH=os.getcwd()))
+        self.assertEqual(output, b'[]\n')
+
+    @unittest.skipIf(
+        httpx is None or aiohttp is None, 'httpx or aiohttp is not installed'
+    )
+    def test_client_hooks(self):
+        """Test hooks are picked by name, or given."""
+        self.assertEqual(
+            client_hooks(['aiohttp', HttpxHook]), [AiohttpHook, HttpxHook]
+        )
+        with self.assertRaises(ValueError):
+            client_hooks(['urllib'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Connection instrumentation tests."""
+import queue
+import unittest
+from monitor_requests.aggregate import Aggregator
+from monitor_requests.connections import ConnectionTracker, hygiene
+
+
+class Raw(object):
+    """Stand-in for a urllib3 response."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+
+class Response(object):
+    """Stand-in for a requests response."""
+
+    def __init__(self, pool, connection):
+        self.raw = Raw(pool, connection)
+
+
+class Pool(object):
+    """Stand-in for a urllib3 pool."""
+
+    def __init__(self, size):
+        self.pool = queue.LifoQueue(size)
+        for _ in range(size):
+            self.pool.put(None)
+
+
+class Item(object):
+    """Weak referenceable stand-in."""
+
+
+class ConnectionTrackerTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_observe(self):
+        """Test new and reused adapters, pools and connections."""
+        tracker = ConnectionTracker()
+        adapter, pool, connection = Item(), Item(), Item()
+        first = tracker.observe(adapter, Response(pool, connection))
+        second = tracker.observe(adapter, Response(pool, connection))
+        other = tracker.observe(Item(), Response(Item(), Item()))
+        self.assertEqual(
+            [first['new_adapters'], first['new_pools'],
+             first['new_connections'], first['reused_connections']],
+            [1, 1, 1, 0]
+        )
+        self.assertEqual(
+            [second['new_adapters'], second['new_pools'],
+             second['new_connections'], second['reused_connections']],
+            [0, 0, 0, 1]
+        )
+        self.assertEqual(other['new_adapters'], 1)
+
+    def test_exhausted(self):
+        """Test waits on an exhausted pool are attributed to the request."""
+        tracker = ConnectionTracker()
+        pool = Pool(1)
+
+        def get_conn(pool):
+            return pool.pool.get(block=False)
+        tracker.get_conn(get_conn, pool)
+        tracker.get_conn(lambda pool: None, pool)
+        counts = tracker.observe(Item(), Response(None, None))
+        self.assertEqual(counts['pool_exhausted'], 1)
+        self.assertGreater(counts['pool_wait_ns'], 0)
+        counts = tracker.observe(Item(), Response(None, None))
+        self.assertEqual(counts['pool_exhausted'], 0)
+
+    def test_hygiene(self):
+        """Test call sites defeating pooling are found."""
+        tracker = ConnectionTracker()
+        aggregator = Aggregator()
+        pool, connection = Item(), Item()
+        for call_site, counts in [
+            ('fresh.py:1', tracker.observe(Item(), Response(Item(), Item())))
+            for _ in range(3)
+        ] + [
+            ('pooled.py:1', tracker.observe(pool, Response(pool, connection)))
+            for _ in range(3)
+        ]:
+            aggregator.add({
+                'url': 'http://example.com/',
+                'domain': 'example.com',
+                'method': 'GET',
+                'response_content': None,
+                'response_status_code': 200,
+                'duration': 0.001,
+                'traceback_list': [],
+                'call_site': call_site,
+                'connection': counts
+            })
+        domains, sites = hygiene(aggregator.results()[1]['connections'])
+        self.assertEqual(domains['example.com']['requests'], 6)
+        self.assertEqual(domains['example.com']['new_connections'], 4)
+        self.assertEqual(domains['example.com']['reused_connections'], 2)
+        self.assertEqual([site['call_site'] for site in sites], ['fresh.py:1'])
+        self.assertEqual(
+            sites[0]['reasons'], ['new adapter (Session) per call']
+        )
@@ -0,0 +1,68 @@
+"""Data handler tests."""
+import threading
+import unittest
+import requests
+from requests.adapters import HTTPAdapter
+from monitor_requests import Monitor
+from monitor_requests import data
+
+
+def stub_send(self, request, *args, **kwargs):
+    """Stand-in for the network."""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'ok'
+    response.url = request.url
+    return response
+
+
+class ThreadedTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        self.original = HTTPAdapter.send
+        HTTPAdapter.send = stub_send
+        self.buffer_size = data.BUFFER_SIZE
+        data.BUFFER_SIZE = 16
+
+    def tearDown(self):
+        HTTPAdapter.send = self.original
+        data.BUFFER_SIZE = self.buffer_size
+
+    def test_counts_under_contention(self):
+        """Test no request is lost with many threads sending at once."""
+        threads, calls = 16, 200
+        monitor = Monitor()
+        barrier = threading.Barrier(threads)
+
+        def hammer(index):
+            session = requests.Session()
+            session.trust_env = False
+            barrier.wait()
+            for call in range(calls):
+                session.get('http://example.com/{}'.format(call % 4))
+            # Leave part of the buffer unmerged until retrieve.
+            session.get('http://example.com/last/{}'.format(index))
+
+        workers = [
+            threading.Thread(target=hammer, args=(index,))
+            for index in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        monitor.stop()
+        logged_requests, analysis = monitor.data.retrieve()
+        self.assertEqual(analysis['total_requests'], threads * (calls + 1))
+        self.assertEqual(
+            logged_requests['http://example.com/0']['count'],
+            threads * calls // 4
+        )
+        self.assertEqual(
+            sum(logged['latency']['count']
+                for logged in logged_requests.values()),
+            threads * (calls + 1)
+        )
+        # Buffers of finished threads are dropped once merged.
+        self.assertEqual(monitor.data._buffers, [])
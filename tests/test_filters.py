@@ -0,0 +1,61 @@
+"""Domain filter tests."""
+import unittest
+from monitor_requests.filters import DomainFilter, netloc
+
+
+class DomainFilterTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_netloc(self):
+        """Test netloc extraction."""
+        self.assertEqual(netloc('http://facebook.com?param=test'),
+                         'facebook.com')
+        self.assertEqual(netloc('https://u:p@www.x.com:8080/a?b#c'),
+                         'u:p@www.x.com:8080')
+
+    def test_domains(self):
+        """Test include and exclude patterns."""
+        domain_filter = DomainFilter(
+            domains=[r'google\.com', r'facebook\.com'],
+            exclude_domains=[r'^graph\.']
+        )
+        self.assertTrue(domain_filter.allowed('www.google.com'))
+        self.assertTrue(domain_filter.allowed('facebook.com'))
+        self.assertFalse(domain_filter.allowed('graph.facebook.com'))
+        self.assertFalse(domain_filter.allowed('youtube.com'))
+
+    def test_unjoinable_patterns(self):
+        """Test global flags and backreferences are searched on their own."""
+        domain_filter = DomainFilter(domains=[r'(?i)GOOGLE\.com'])
+        self.assertTrue(domain_filter.allowed('www.google.com'))
+        domain_filter = DomainFilter(
+            domains=[r'(a)\1\.com', r'(?i)GOOGLE\.com', r'(b)\1\.com']
+        )
+        self.assertTrue(domain_filter.allowed('aa.com'))
+        self.assertTrue(domain_filter.allowed('bb.com'))
+        self.assertTrue(domain_filter.allowed('Google.com'))
+        self.assertFalse(domain_filter.allowed('ab.com'))
+
+    def test_hosts(self):
+        """Test exact and suffix host matching."""
+        domain_filter = DomainFilter(
+            hosts=['.example.com', 'api.other.com'],
+            exclude_hosts=['internal.example.com']
+        )
+        self.assertTrue(domain_filter.allowed('example.com'))
+        self.assertTrue(domain_filter.allowed('a.b.example.com:8080'))
+        self.assertTrue(domain_filter.allowed('API.other.com'))
+        self.assertFalse(domain_filter.allowed('internal.example.com'))
+        self.assertFalse(domain_filter.allowed('www.other.com'))
+        self.assertFalse(domain_filter.allowed('notexample.com'))
+
+    def test_memoized(self):
+        """Test decisions are memoized per netloc."""
+        domain_filter = DomainFilter()
+        domain_filter.allowed('google.com')
+        domain_filter.allowed('google.com')
+        self.assertEqual(domain_filter.allowed.cache_info().hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
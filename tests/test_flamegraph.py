@@ -0,0 +1,61 @@
+"""Flamegraph export tests."""
+import io
+import traceback
+import unittest
+from monitor_requests.aggregate import Aggregator
+from monitor_requests.flamegraph import (
+    LATENCY, collapse, frame_name, write_collapsed
+)
+from tests import make_record
+
+
+class FlamegraphTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        """Render two stacks sharing an outer frame."""
+        self.outer, self.inner = traceback.format_list([
+            ('app/views.py', 10, 'index', 'load()'),
+            ('app/models.py', 20, 'load', 'requests.get(url)')
+        ])
+
+    def test_frame_name(self):
+        """Test frames are named function (file:line)."""
+        self.assertEqual(frame_name(self.outer), 'index (app/views.py:10)')
+        self.assertEqual(frame_name('odd;frame\n'), 'odd,frame')
+
+    def test_collapse(self):
+        """Test stacks are weighted by count or latency, scaled if sampled."""
+        aggregator = Aggregator()
+        for record in (
+            make_record(
+                traceback_list=[self.outer, self.inner], duration=0.002
+            ),
+            make_record(traceback_list=[self.outer], duration=0.001),
+            make_record(traceback_list=None, duration=0.001, sampled=False),
+            make_record(traceback_list=None, duration=0.001, sampled=False)
+        ):
+            aggregator.add(record)
+        logged_requests = aggregator.results()[0]
+        deep = (
+            'index (app/views.py:10);load (app/models.py:20);'
+            'GET http://google.com/'
+        )
+        shallow = 'index (app/views.py:10);GET http://google.com/'
+        self.assertEqual(
+            collapse(logged_requests), {deep: 2, shallow: 2}
+        )
+        self.assertEqual(
+            collapse(logged_requests, LATENCY), {deep: 4000, shallow: 2000}
+        )
+        output = io.StringIO()
+        write_collapsed(output, collapse(logged_requests, LATENCY))
+        self.assertEqual(
+            output.getvalue(), '{} 4000\n{} 2000\n'.format(deep, shallow)
+        )
+        with self.assertRaises(ValueError):
+            collapse(logged_requests, 'bytes')
+
+
+if __name__ == '__main__':
+    unittest.main()
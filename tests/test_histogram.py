@@ -0,0 +1,46 @@
+"""Latency histogram tests."""
+import unittest
+from monitor_requests.histogram import Histogram, bucket_index, bucket_value
+
+
+class HistogramTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_buckets(self):
+        """Test bucket values stay within a few percent."""
+        for value in (0, 7, 16, 33, 1000, 123456789, 2 ** 40 + 12345):
+            index = bucket_index(value)
+            self.assertEqual(bucket_index(bucket_value(index)), index)
+            self.assertLessEqual(abs(bucket_value(index) - value), value * .04)
+
+    def test_percentiles(self):
+        """Test percentiles of a uniform distribution."""
+        histogram = Histogram()
+        for value in range(1, 10001):
+            histogram.record(value * 1000)
+        self.assertEqual(histogram.count, 10000)
+        self.assertEqual(histogram.max, 10000000)
+        for percent in (50, 90, 99):
+            self.assertAlmostEqual(
+                histogram.percentile(percent) / (percent * 100000.0),
+                1, delta=.04
+            )
+
+    def test_merge(self):
+        """Test merging and serializing."""
+        first, second = Histogram(), Histogram()
+        first.record(1000)
+        second.record(3000, count=3)
+        merged = Histogram.from_dict(first.to_dict()).merge(
+            Histogram.from_dict(second.to_dict())
+        )
+        self.assertEqual(merged.count, 4)
+        self.assertEqual(merged.total, 10000)
+        self.assertEqual(merged.max, 3000)
+        self.assertEqual(
+            merged.percentile(25), bucket_value(bucket_index(1000))
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
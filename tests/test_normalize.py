@@ -0,0 +1,50 @@
+"""URL templating tests."""
+import unittest
+from monitor_requests.normalize import URLNormalizer
+
+
+class URLNormalizerTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_builtin(self):
+        """Test ids, uuids, hashes and volatile params are templated."""
+        normalize = URLNormalizer()
+        self.assertEqual(
+            normalize('http://a.com/users/123/posts?ts=1700000000&q=x'),
+            'http://a.com/users/{id}/posts?ts={ts}&q=x'
+        )
+        self.assertEqual(
+            normalize('http://a.com/x/550e8400-e29b-41d4-a716-446655440000'),
+            'http://a.com/x/{uuid}'
+        )
+        self.assertEqual(
+            normalize('http://a.com/f/d41d8cd98f00b204e9800998ecf8427e'),
+            'http://a.com/f/{hash}'
+        )
+        self.assertEqual(
+            normalize('http://facebook.com?param=test'),
+            'http://facebook.com?param=test'
+        )
+
+    def test_rules(self):
+        """Test user rules, without the built in ones."""
+        normalize = URLNormalizer(
+            rules=[(r'/orders/[A-Z]+\d+', '/orders/{order}')],
+            builtin=False,
+            volatile_params=()
+        )
+        self.assertEqual(
+            normalize('http://a.com/orders/AB12/items/3'),
+            'http://a.com/orders/{order}/items/3'
+        )
+
+    def test_cached(self):
+        """Test templates are cached per raw url."""
+        normalize = URLNormalizer()
+        normalize('http://a.com/users/1')
+        normalize('http://a.com/users/1')
+        self.assertEqual(normalize._cached.cache_info().hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Patching tests."""
+import unittest
+from monitor_requests.patching import Patch, patch
+
+
+class Target(object):
+    """Class to patch."""
+
+    def send(self, value):
+        """Method to patch."""
+        return [value]
+
+
+def tag(name):
+    """Hook appending a name to the result."""
+    def hook(send, *args, **kwargs):
+        return send(*args, **kwargs) + [name]
+    return hook
+
+
+class PatchTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        self.original = Target.send
+        self.patch = Patch(Target, 'send')
+
+    def tearDown(self):
+        Target.send = self.original
+
+    def test_chain(self):
+        """Test later hooks wrap earlier ones, and removal restores."""
+        first, second = tag('first'), tag('second')
+        self.patch.install(first)
+        self.patch.install(second)
+        self.assertEqual(Target().send('x'), ['x', 'first', 'second'])
+        self.assertEqual(Target.send.__name__, 'send')
+        self.patch.uninstall(first)
+        self.assertEqual(Target().send('x'), ['x', 'second'])
+        self.patch.uninstall(second)
+        self.assertIs(Target.send, self.original)
+        self.assertFalse(self.patch.installed)
+
+    def test_idempotent(self):
+        """Test installing or uninstalling twice."""
+        hook = tag('hook')
+        self.patch.install(hook)
+        self.patch.install(hook)
+        self.assertEqual(Target().send('x'), ['x', 'hook'])
+        self.patch.uninstall(hook)
+        self.patch.uninstall(hook)
+        self.assertIs(Target.send, self.original)
+
+    def test_patched_over(self):
+        """Test someone else patching over the wrapper is left in place."""
+        hook = tag('hook')
+        self.patch.install(hook)
+        wrapper = Target.send
+
+        def other(instance, value):
+            return wrapper(instance, value) + ['other']
+        Target.send = other
+        self.patch.uninstall(hook)
+        self.assertIs(Target.send, other)
+        self.assertEqual(Target().send('x'), ['x', 'other'])
+        # A new chain wraps whatever is in place now.
+        self.patch.install(hook)
+        self.assertEqual(Target().send('x'), ['x', 'other', 'hook'])
+
+    def test_patched_over_installed(self):
+        """Test new hooks run when the wrapper, hooks left, is patched over."""
+        leaked, hook = tag('leaked'), tag('hook')
+        self.patch.install(leaked)
+
+        def stub(instance, value):
+            return ['stub']
+        Target.send = stub
+        self.patch.install(hook)
+        self.assertEqual(Target().send('x'), ['stub', 'hook'])
+        self.patch.uninstall(hook)
+        self.assertIs(Target.send, stub)
+        self.patch.uninstall(leaked)
+        self.assertIs(Target.send, stub)
+        self.assertFalse(self.patch.installed)
+
+    def test_shared(self):
+        """Test one Patch per method."""
+        self.assertIs(patch(Target, 'send'), patch(Target, 'send'))
@@ -0,0 +1,196 @@
+"""pytest plugin tests."""
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+from monitor_requests.aggregate import Aggregator
+from tests import make_record, normalized
+
+try:
+    import xdist
+except ImportError:  # Optional: the xdist test is skipped.
+    xdist = None
+
+CONFTEST = '''
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='session')
+def base():
+    # Fixed across runs when set, for the url to match a baseline.
+    port = int(os.environ.get('TEST_PORT', 0))
+    server = HTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+'''
+
+TESTS = '''
+import pytest
+import requests
+
+
+@pytest.mark.parametrize('n', [1, 3, 2])
+def test_calls(base, n):
+    for _ in range(n):
+        requests.get(base + '/items')
+
+
+def test_none():
+    pass
+'''
+
+
+class PluginTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        """Write a test suite in a temp dir."""
+        self.directory = tempfile.mkdtemp()
+        for name, source in (
+            ('conftest.py', CONFTEST), ('test_suite.py', TESTS)
+        ):
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(source)
+
+    def tearDown(self):
+        """Remove the temp dir."""
+        shutil.rmtree(self.directory)
+
+    def run_suite(self, *args, **env):
+        """Run the suite with the plugin, return the report file.
+
+        :param env: Extra environment variables.
+        """
+        path = os.path.join(self.directory, 'report.txt')
+        env = dict(os.environ, PYTHONPATH=os.getcwd(), **env)
+        subprocess.check_output(
+            [
+                sys.executable, '-m', 'pytest', '-p', 'no:cacheprovider',
+                '-p', 'monitor_requests.pytest_plugin', '--monitor-requests',
+                '--monitor-requests-output', path
+            ] + list(args),
+            cwd=self.directory,
+            env=env
+        )
+        with open(path) as f:
+            return f.read()
+
+    def assert_ranked(self, report):
+        """The tests are ranked by requests made."""
+        self.assertIn('Total Requests:    6\n', report)
+        ranked = report.split('Tests: Most Requests')[1].split('\n')[3:6]
+        self.assertEqual(
+            [line.split()[0] for line in ranked], ['3', '2', '1']
+        )
+        self.assertTrue(ranked[0].endswith('test_suite.py::test_calls[3]'))
+        self.assertNotIn('test_none', report)
+
+    def test_report(self):
+        """Test requests are attributed to tests."""
+        self.assert_ranked(self.run_suite())
+
+    @unittest.skipIf(xdist is None, 'pytest-xdist is not installed')
+    def test_xdist(self):
+        """Test workers' results are merged by the controller."""
+        self.assert_ranked(self.run_suite('-n', '2'))
+
+    def test_budget(self):
+        """Test a run with more calls than its baseline fails."""
+        path = os.path.join(self.directory, 'budget.json')
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = str(sock.getsockname()[1])
+        sock.close()
+        self.run_suite(
+            '--monitor-requests-baseline', path,
+            '--monitor-requests-write-baseline', TEST_PORT=port
+        )
+        with open(path) as f:
+            base = json.load(f)
+        # Calls are compared: keep local latency noise from failing a run.
+        for budgets in [base['total']] + [
+            budgets for kind in ('urls', 'tests')
+            for budgets in base[kind].values()
+        ]:
+            for metric in budgets:
+                if metric != 'count':
+                    budgets[metric] += 1000
+        with open(path, 'w') as f:
+            json.dump(base, f)
+        self.run_suite('--monitor-requests-baseline', path, TEST_PORT=port)
+        base['tests']['test_suite.py::test_calls[3]']['count'] = 2
+        with open(path, 'w') as f:
+            json.dump(base, f)
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            self.run_suite(
+                '--monitor-requests-baseline', path, TEST_PORT=port
+            )
+        self.assertEqual(context.exception.returncode, 1)
+        self.assertIn(
+            b'Test test_suite.py::test_calls[3]: count 3 (baseline 2',
+            context.exception.output
+        )
+
+    def test_write_baseline_usage(self):
+        """Test writing a baseline without its path is a usage error."""
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            self.run_suite('--monitor-requests-write-baseline')
+        self.assertEqual(context.exception.returncode, 4)
+
+
+class MergeTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_merge(self):
+        """Test merged results match aggregating every record."""
+        # Bursts are not followed across processes: one per part.
+        records = [
+            make_record(test='a', timestamp=10.0),
+            make_record(test='a', traceback_list=['b'], timestamp=10.0),
+            make_record('http://facebook.com/', test='b', timestamp=100.1),
+            make_record(test='b', timestamp=100.2, duration_ns=250000000),
+            make_record(test='b', timestamp=100.3)
+        ]
+        whole = Aggregator()
+        merged = Aggregator()
+        for part in (records[:2], records[2:]):
+            aggregator = Aggregator()
+            for record in part:
+                whole.add(record)
+                aggregator.add(record)
+            merged.merge(*json.loads(json.dumps(
+                aggregator.results(), default=list
+            )))
+        self.assertEqual(
+            normalized(merged.results()), normalized(whole.results())
+        )
+        self.assertEqual(
+            sorted(merged.results()[1]['tests'], key=lambda t: t['test']),
+            [
+                {'test': 'a', 'count': 2, 'duration_ns': 1000000000},
+                {'test': 'b', 'count': 3, 'duration_ns': 1250000000}
+            ]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Repeated call detection tests."""
+import unittest
+from monitor_requests.aggregate import Aggregator
+from monitor_requests.repeats import find_repeats
+
+
+def record(url, call_site, timestamp, duration_ns=10 ** 6):
+    """A logged request."""
+    return {
+        'url': url,
+        'domain': 'example.com',
+        'method': 'GET',
+        'response_content': None,
+        'response_status_code': 200,
+        'duration': duration_ns / 1e9,
+        'duration_ns': duration_ns,
+        'traceback_list': [call_site],
+        'call_site': call_site,
+        'timestamp': timestamp
+    }
+
+
+class RepeatsTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_find_repeats(self):
+        """Test repeats are found per call site and ranked by waste."""
+        aggregator = Aggregator()
+        for i in range(10):
+            aggregator.add(record('http://example.com/a', 'a.py:1', i * 0.01))
+            aggregator.add(record(
+                'http://example.com/b', 'b.py:1', i * 0.01, 5 * 10 ** 6
+            ))
+        # Same url from two sites, 2 calls each: not repeats.
+        for call_site in ('c.py:1', 'c.py:2'):
+            for i in range(2):
+                aggregator.add(record('http://example.com/c', call_site, i))
+        # Called often, but spread out.
+        for i in range(10):
+            aggregator.add(record('http://example.com/d', 'd.py:1', i * 60))
+        repeats = find_repeats(aggregator.results()[1]['repeats'])
+        self.assertEqual(
+            [repeat['url'] for repeat in repeats],
+            ['http://example.com/b', 'http://example.com/a']
+        )
+        self.assertEqual(repeats[0]['count'], 10)
+        self.assertEqual(repeats[0]['wasted_ns'], 45 * 10 ** 6)
+        # Idle time between calls: 10ms apart, 5ms each.
+        self.assertAlmostEqual(repeats[0]['mean_gap'], 0.005)
+        self.assertEqual(repeats[1]['call_site'], 'a.py:1')
+
+    def test_bursts(self):
+        """Test quick bursts far apart are found over a long run."""
+        aggregator = Aggregator()
+        # Ten tests a minute apart, each calling 5 times within 40ms.
+        for test in range(10):
+            for i in range(5):
+                aggregator.add(record(
+                    'http://example.com/a', 'a.py:1', test * 60 + i * 0.01
+                ))
+        repeats = find_repeats(aggregator.results()[1]['repeats'])
+        self.assertEqual(len(repeats), 1)
+        self.assertEqual(repeats[0]['count'], 50)
+        self.assertEqual(repeats[0]['repeated'], 40)
+        self.assertEqual(repeats[0]['wasted_ns'], 40 * 10 ** 6)
+        self.assertAlmostEqual(repeats[0]['mean_gap'], 0.009)
+
+    def test_per_test(self):
+        """Test repeats are tallied within each test."""
+        aggregator = Aggregator()
+        timestamp = 0
+        # Two calls per test, back to back: not repeats within one test.
+        for test in ('a', 'a', 'b', 'b', 'c', 'c', 'c'):
+            timestamp += 0.01
+            aggregator.add(dict(
+                record('http://example.com/a', 'a.py:1', timestamp),
+                test=test
+            ))
+        repeats = find_repeats(aggregator.results()[1]['repeats'])
+        self.assertEqual(
+            [(repeat['test'], repeat['count']) for repeat in repeats],
+            [('c', 3)]
+        )
+
+    def test_slow_calls(self):
+        """Test back to back calls slower than the window are repeats."""
+        aggregator = Aggregator()
+        for i in range(10):
+            aggregator.add(record(
+                'http://example.com/a', 'a.py:1', (i + 1) * 1.5, 15 * 10 ** 8
+            ))
+        repeats = find_repeats(aggregator.results()[1]['repeats'])
+        self.assertEqual(len(repeats), 1)
+        self.assertEqual(repeats[0]['repeated'], 9)
+        self.assertEqual(repeats[0]['wasted_ns'], 9 * 15 * 10 ** 8)
+        self.assertAlmostEqual(repeats[0]['mean_gap'], 0)
@@ -0,0 +1,90 @@
+"""Replica tests."""
+import unittest
+from monitor_requests.replica import Replica
+from monitor_requests.store import Store, connect
+from tests import make_record, normalized
+
+
+class ReplicaTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        """Create a store."""
+        self.store = Store(connect())
+        self.replica = Replica()
+
+    def sync(self):
+        """Apply the store's changes since the replica's cursor."""
+        if not self.replica.apply(self.store.changes(self.replica.cursor)):
+            self.assertTrue(self.replica.apply(self.store.changes(0)))
+
+    def test_incremental(self):
+        """Test applied changes match a full retrieve after each batch."""
+        batches = [
+            [make_record(), make_record(method='POST', traceback_list=['b'])],
+            [
+                make_record(duration=2.0, duration_ns=2000000000, test='a'),
+                make_record(test='b')
+            ],
+            [make_record(test='a')],
+            [make_record(sampled=False, traceback_list=None)],
+            [
+                make_record(
+                    'http://google.com/{id}',
+                    raw_url='http://google.com/1',
+                    timestamp=101.0
+                )
+            ]
+        ]
+        for batch in batches:
+            self.store.add(batch)
+            self.sync()
+            self.assertEqual(
+                normalized(self.replica.results()),
+                normalized(self.store.retrieve())
+            )
+        changes = self.store.changes(self.replica.cursor)
+        self.assertEqual(changes['requests'], [])
+
+    def test_delete(self):
+        """Test changes from another epoch start the replica over."""
+        self.store.add([make_record()])
+        self.sync()
+        self.store.delete()
+        self.store.add([make_record('http://facebook.com/')])
+        self.assertFalse(
+            self.replica.apply(self.store.changes(self.replica.cursor))
+        )
+        self.sync()
+        self.assertEqual(
+            list(self.replica.results()[0]), ['http://facebook.com/']
+        )
+
+    def test_shards(self):
+        """Test shards' changes merge into one replica."""
+        shard = Store(connect())
+        self.store.add([make_record()])
+        shard.add([make_record(), make_record('http://facebook.com/')])
+        for _ in range(2):
+            self.assertTrue(self.replica.apply({
+                'cursor': '{}.{}'.format(self.store.seq, shard.seq),
+                'shards': [
+                    self.store.changes(0),
+                    shard.changes(0)
+                ]
+            }))
+        logged_requests, analysis = self.replica.results()
+        self.assertEqual(logged_requests['http://google.com/']['count'], 2)
+        self.assertEqual(analysis['total_requests'], 3)
+        self.assertEqual(
+            analysis['connections'][0]['new_connections'], 3
+        )
+        shard.delete()
+        self.assertFalse(self.replica.apply({
+            'cursor': '1.0',
+            'shards': [self.store.changes(1), shard.changes(1)]
+        }))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Sampling tests."""
+import unittest
+import requests
+from requests.adapters import HTTPAdapter
+from monitor_requests import Monitor
+from monitor_requests.sampling import Sampler
+
+
+def stub_send(self, request, *args, **kwargs):
+    """Stand-in for the network."""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'ok'
+    response.url = request.url
+    return response
+
+
+class SamplingTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_adaptive(self):
+        """Test powers of two are captured per key."""
+        sampler = Sampler(sample_rate=0, adaptive=True)
+        captured = [n for n in range(1, 65) if sampler('a')]
+        self.assertEqual(captured, [1, 2, 4, 8, 16, 32, 64])
+        self.assertTrue(sampler('b'))
+
+    def test_rate(self):
+        """Test the sample rate bounds."""
+        self.assertFalse(any(Sampler(0)('a') for _ in range(100)))
+        self.assertTrue(all(Sampler(1)('a') for _ in range(100)))
+
+    def test_monitor(self):
+        """Test counts stay exact while captures are sampled."""
+        original = HTTPAdapter.send
+        HTTPAdapter.send = stub_send
+        try:
+            monitor = Monitor(sample_rate=0, adaptive=True)
+            session = requests.Session()
+            for _ in range(10):
+                session.get('http://example.com/a')
+            monitor.stop()
+        finally:
+            HTTPAdapter.send = original
+        logged_requests, analysis = monitor.data.retrieve()
+        logged = logged_requests['http://example.com/a']
+        self.assertEqual(logged['count'], 10)
+        self.assertEqual(logged['sampled'], 4)
+        self.assertEqual(logged['latency']['count'], 10)
+        self.assertEqual(len(logged['tracebacks']), 1)
+        self.assertEqual(logged['responses'], set([(200, b'ok')]))
+        self.assertEqual(analysis['total_requests'], 10)
+        self.assertEqual(analysis['sampled_requests'], 4)
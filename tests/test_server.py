@@ -1,8 +1,17 @@
 """Simple server tests."""
 # coding=utf-8
 import json
-from tornado.testing import AsyncHTTPTestCase
-from monitor_requests.server import make_app
+import os
+import shutil
+import tempfile
+import unittest
+from tornado.httpserver import HTTPServer
+from tornado.locks import Event
+from tornado.netutil import bind_unix_socket
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from monitor_requests.server import init_db, make_app
+from monitor_requests.wire import Encoder
+from tests import make_record
 
 
 class ApiTestCase(AsyncHTTPTestCase):
@@ -53,3 +62,386 @@ class ApiTestCase(AsyncHTTPTestCase):
         self.assertEqual(response.code, 200)
         response = self.fetch('/', method='GET')
         self.assertEqual(response.code, 200)
+
+    def test_post_batch(self):
+        """Test batch post."""
+        record = make_record()
+        response = self.fetch(
+            '/batch', body=json.dumps([record, record]), method='POST'
+        )
+        self.assertEqual(response.code, 200)
+        response = self.fetch('/', method='GET')
+        self.assertEqual(response.code, 200)
+
+    def test_templated_urls(self):
+        """Test raw url examples are kept per template."""
+        records = [
+            make_record(
+                'http://google.com/users/{id}',
+                raw_url='http://google.com/users/{}'.format(i)
+            )
+            for i in range(10)
+        ]
+        self.fetch('/batch', body=json.dumps(records), method='POST')
+        data = json.loads(self.fetch('/', method='GET').body)
+        logged = data['logged_requests']['http://google.com/users/{id}']
+        self.assertEqual(logged['count'], 10)
+        self.assertEqual(len(logged['examples']), 5)
+
+    def test_rollup(self):
+        """Test repeated requests are rolled up per unique key."""
+        record = make_record(
+            'http://google.com/?whatever', duration=1.5,
+            traceback_list=['a', 'b']
+        )
+        other = dict(record, method='POST', traceback_list=['c'])
+        self.fetch(
+            '/batch', body=json.dumps([record, record, other]), method='POST'
+        )
+        self.fetch('/', body=json.dumps(record), method='POST')
+        data = json.loads(self.fetch('/', method='GET').body)
+        logged = data['logged_requests']['http://google.com/?whatever']
+        self.assertEqual(logged['count'], 4)
+        self.assertEqual(sorted(logged['methods']), ['GET', 'POST'])
+        self.assertEqual(
+            sorted(logged['tracebacks']), [['a', 'b'], ['c']]
+        )
+        self.assertEqual(logged['responses'], [[200, 'ok']])
+        self.assertEqual(data['analysis']['total_requests'], 4)
+        self.assertEqual(data['analysis']['duration'], 6.0)
+        self.assertEqual(data['analysis']['domains'], ['google.com'])
+        self.assertEqual(logged['latency']['count'], 4)
+        self.assertEqual(logged['latency']['max'], 1500000000)
+        self.assertEqual(
+            data['analysis']['latency']['methods']['POST']['count'], 1
+        )
+        self.assertEqual(
+            sum(data['analysis']['latency']['domains']['google.com'][
+                'buckets'
+            ].values()),
+            4
+        )
+        self.fetch('/', method='DELETE')
+        data = json.loads(self.fetch('/', method='GET').body)
+        self.assertEqual(data['logged_requests'], {})
+        self.assertEqual(data['analysis']['total_requests'], 0)
+
+    def test_repeats(self):
+        """Test repeat tallies are merged across batches."""
+        record = make_record()
+        later = dict(record, timestamp=101.0)
+        for batch in ([record, record], [later], [dict(later, url='x')]):
+            self.fetch('/batch', body=json.dumps(batch), method='POST')
+        data = json.loads(self.fetch('/', method='GET').body)
+        self.assertEqual(data['analysis']['repeats'], [{
+            'url': 'http://google.com/',
+            'method': 'GET',
+            'call_site': 'a.py:1 in f',
+            'test': '',
+            'count': 3,
+            'duration_ns': 1500000000,
+            'first': 100.0,
+            'last': 101.0,
+            'repeated': 2,
+            'repeated_ns': 1000000000,
+            'repeated_gap': 0.5
+        }])
+
+    def test_bytes(self):
+        """Test byte counters are summed per url, domain and method."""
+        record = make_record()
+        other = dict(record, method='POST', request_body_bytes=50)
+        self.fetch(
+            '/batch', body=json.dumps([record, record, other]), method='POST'
+        )
+        data = json.loads(self.fetch('/', method='GET').body)
+        logged = data['logged_requests']['http://google.com/']
+        self.assertEqual(logged['bytes']['response_body_bytes'], 3000)
+        self.assertEqual(logged['bytes']['request_body_bytes'], 50)
+        bandwidth = data['analysis']['bytes']
+        self.assertEqual(bandwidth['total']['request_header_bytes'], 300)
+        self.assertEqual(
+            bandwidth['domains']['google.com']['response_header_bytes'], 600
+        )
+        self.assertEqual(
+            bandwidth['methods']['POST']['request_body_bytes'], 50
+        )
+
+    def test_unsampled(self):
+        """Test unsampled requests are counted, without traceback/response."""
+        record = make_record()
+        unsampled = dict(
+            record,
+            response_content=None,
+            traceback_list=None,
+            sampled=False
+        )
+        self.fetch(
+            '/batch',
+            body=json.dumps([record, unsampled, unsampled]),
+            method='POST'
+        )
+        data = json.loads(self.fetch('/', method='GET').body)
+        logged = data['logged_requests']['http://google.com/']
+        self.assertEqual(logged['count'], 3)
+        self.assertEqual(logged['sampled'], 1)
+        self.assertEqual(logged['tracebacks'], [['a']])
+        self.assertEqual(logged['responses'], [[200, 'ok']])
+        self.assertEqual(logged['stacks'], [{
+            'method': 'GET',
+            'traceback': ['a'],
+            'count': 1,
+            'duration_ns': 500000000
+        }])
+        self.assertEqual(logged['latency']['count'], 3)
+        self.assertEqual(data['analysis']['sampled_requests'], 1)
+
+    def test_changes(self):
+        """Test ?since returns only the rows changed after a cursor."""
+        record = make_record()
+        self.fetch('/batch', body=json.dumps([record]), method='POST')
+        first = json.loads(self.fetch('/?since=0', method='GET').body)
+        self.assertEqual(first['cursor'], 1)
+        self.assertEqual(len(first['requests']), 1)
+        self.assertEqual(first['tracebacks'], [[
+            first['requests'][0][2], ['a']
+        ]])
+        other = dict(record, url='http://google.com/other')
+        self.fetch('/batch', body=json.dumps([other]), method='POST')
+        changes = json.loads(self.fetch('/?since=1', method='GET').body)
+        self.assertEqual(changes['epoch'], first['epoch'])
+        self.assertEqual(changes['cursor'], 2)
+        self.assertEqual(
+            [row[0] for row in changes['requests']],
+            ['http://google.com/other']
+        )
+        self.assertEqual(changes['tracebacks'], [])
+        self.fetch('/', method='DELETE')
+        changes = json.loads(self.fetch('/?since=2', method='GET').body)
+        self.assertNotEqual(changes['epoch'], first['epoch'])
+        response = self.fetch('/?since=x', method='GET')
+        self.assertEqual(response.code, 400)
+
+    def test_wire_batch(self):
+        """Test encoded batches, texts sent once and kept across deletes."""
+        record = make_record(test='test_a.py::test_a')
+        encoder = Encoder()
+        for _ in range(2):
+            body, headers = encoder.encode([record, record])
+            response = self.fetch(
+                '/batch', body=body, headers=headers, method='POST'
+            )
+            self.assertEqual(response.code, 200)
+        data = json.loads(self.fetch('/', method='GET').body)
+        logged = data['logged_requests']['http://google.com/']
+        self.assertEqual(logged['count'], 4)
+        self.assertEqual(logged['tracebacks'], [['a']])
+        self.assertEqual(logged['responses'], [[200, 'ok']])
+        self.assertEqual(data['analysis']['duration'], 2.0)
+        self.assertEqual(data['analysis']['tests'], [{
+            'test': 'test_a.py::test_a', 'count': 4, 'duration_ns': 2000000000
+        }])
+        self.fetch('/', method='DELETE')
+        body, headers = encoder.encode([record])
+        self.fetch('/batch', body=body, headers=headers, method='POST')
+        data = json.loads(self.fetch('/', method='GET').body)
+        logged = data['logged_requests']['http://google.com/']
+        self.assertEqual(logged['tracebacks'], [['a']])
+        body, headers = encoder.encode([dict(record, traceback_list=['b'])])
+        self.assertEqual(self.fetch(
+            '/batch', body=body, headers=headers, method='POST'
+        ).code, 200)
+
+    def test_unknown_hashes(self):
+        """Test batches referring to unknown texts are refused whole."""
+        record = make_record(test='test_a.py::test_a')
+        encoder = Encoder()
+        encoder.encode([record])
+        body, headers = encoder.encode([record])
+        response = self.fetch(
+            '/batch', body=body, headers=headers, method='POST'
+        )
+        self.assertEqual(response.code, 409)
+        self.assertEqual(len(json.loads(response.body)['missing']), 2)
+        data = json.loads(self.fetch('/', method='GET').body)
+        self.assertEqual(data['analysis']['total_requests'], 0)
+        response = self.fetch('/batch', body=b'x', method='POST')
+        self.assertEqual(response.code, 400)
+
+    @gen_test
+    def test_stream(self):
+        """Test changes are pushed as server-sent events."""
+        events = []
+        received = Event()
+
+        def on_chunk(chunk):
+            events.extend(
+                event for event in chunk.decode('utf-8').split('\n\n')
+                if event.startswith('id: ')
+            )
+            received.set()
+
+        self.http_client.fetch(
+            self.get_url('/stream?interval=0'),
+            streaming_callback=on_chunk,
+            raise_error=False
+        )
+        yield received.wait()
+        received.clear()
+        record = make_record()
+        yield self.http_client.fetch(
+            self.get_url('/batch'), method='POST', body=json.dumps([record])
+        )
+        yield received.wait()
+        self.assertEqual(len(events), 2)
+        event_id, name, data = events[1].split('\n')
+        changes = json.loads(data[len('data: '):])
+        self.assertEqual(event_id, 'id: {}:1'.format(changes['epoch']))
+        self.assertEqual(name, 'event: changes')
+        self.assertEqual(changes['since'], 0)
+        self.assertEqual(changes['requests'][0][0], 'http://google.com/')
+
+
+class SessionsTestCase(AsyncHTTPTestCase):
+    """Test case."""
+
+    record = make_record()
+
+    def get_app(self):
+        """Override get_app."""
+        self.app = make_app(max_sessions=2, max_rows=10)
+        return self.app
+
+    def post(self, path, records):
+        """POST a batch."""
+        return self.fetch(path, body=json.dumps(records), method='POST')
+
+    def total(self, path):
+        """Total requests at a path."""
+        data = json.loads(self.fetch(path, method='GET').body)
+        return data['analysis']['total_requests']
+
+    def test_isolation(self):
+        """Test sessions have their own data, deleted alone."""
+        self.post('/sessions/a/batch', [self.record, self.record])
+        self.post('/sessions/b/batch', [self.record])
+        self.post('/batch', [self.record])
+        self.assertEqual(self.total('/sessions/a/'), 2)
+        self.assertEqual(self.total('/sessions/b/'), 1)
+        self.assertEqual(self.total('/'), 1)
+        usage = json.loads(self.fetch('/sessions', method='GET').body)
+        self.assertEqual(sorted(usage), ['a', 'b'])
+        self.assertGreater(usage['a']['rows'], 0)
+        self.fetch('/sessions/a/', method='DELETE')
+        self.assertNotIn('a', self.app.sessions)
+        self.assertEqual(self.total('/sessions/b/'), 1)
+        self.assertEqual(self.total('/'), 1)
+        response = self.fetch('/sessions/a%20b/', method='GET')
+        self.assertEqual(response.code, 404)
+
+    def test_limits(self):
+        """Test quotas refuse batches, idle sessions make room."""
+        records = [
+            dict(self.record, url='http://google.com/{}'.format(i))
+            for i in range(10)
+        ]
+        self.assertEqual(self.post('/sessions/a/batch', records).code, 200)
+        self.assertEqual(self.post('/sessions/a/batch', records).code, 507)
+        self.assertEqual(self.post('/batch', records * 2).code, 200)
+        self.post('/sessions/b/batch', [self.record])
+        response = self.fetch('/sessions/c/', method='GET')
+        self.assertEqual(response.code, 503)
+        self.app.sessions.idle = 0
+        self.assertEqual(self.fetch('/sessions/c/', method='GET').code, 200)
+        self.assertEqual(sorted(self.app.sessions.usage()), ['c'])
+
+
+class ShardedTestCase(AsyncHTTPTestCase):
+    """Test case: two workers' shards, served in one process."""
+
+    def get_app(self):
+        """Serve shard 0, and shard 1 on its socket."""
+        self.directory = tempfile.mkdtemp()
+        paths = [
+            os.path.join(self.directory, 'shard-{}.sock'.format(i))
+            for i in range(2)
+        ]
+        self.shard = init_db()
+        self.peer = HTTPServer(make_app(self.shard, 1, paths))
+        self.peer.add_socket(bind_unix_socket(paths[1]))
+        return make_app(init_db(), 0, paths)
+
+    def tearDown(self):
+        """Stop shard 1, remove the temp dir."""
+        self.peer.stop()
+        super(ShardedTestCase, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def test_merge(self):
+        """Test GET merges the shards, DELETE resets them all."""
+        record = make_record()
+        self.fetch('/batch', body=json.dumps([record]), method='POST')
+        self.shard.add([record, dict(record, url='http://google.com/b')])
+        data = json.loads(self.fetch('/', method='GET').body)
+        self.assertEqual(data['analysis']['total_requests'], 3)
+        logged = data['logged_requests']['http://google.com/']
+        self.assertEqual(logged['count'], 2)
+        self.assertEqual(logged['tracebacks'], [['a']])
+        changes = json.loads(self.fetch('/?since=0', method='GET').body)
+        self.assertEqual(changes['cursor'], '1.1')
+        self.assertEqual(len(changes['shards']), 2)
+        changes = json.loads(self.fetch('/?since=1.1', method='GET').body)
+        self.assertEqual(
+            [shard['requests'] for shard in changes['shards']], [[], []]
+        )
+        self.fetch('/', method='DELETE')
+        self.assertEqual(self.shard.total_requests(), 0)
+        data = json.loads(self.fetch('/', method='GET').body)
+        self.assertEqual(data['analysis']['total_requests'], 0)
+
+
+class DurableStoreTestCase(unittest.TestCase):
+    """Test case."""
+
+    def setUp(self):
+        """Create a temp dir for the db."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'monitor.db')
+
+    def tearDown(self):
+        """Remove the temp dir."""
+        shutil.rmtree(self.directory)
+
+    def test_recovery(self):
+        """Test group committed data survives a restart."""
+        record = make_record()
+        store = init_db(self.path)
+        store.add([record, record])
+        store.add([record])
+        self.assertTrue(store.conn.in_transaction)
+        store.close(vacuum=True)
+        store = init_db(self.path)
+        self.assertEqual(store.total_requests(), 3)
+        logged_requests, analysis = store.retrieve()
+        self.assertEqual(logged_requests['http://google.com/']['count'], 3)
+        store.close()
+
+
+class UpsertTestCase(unittest.TestCase):
+    """Test case."""
+
+    def test_fallback(self):
+        """Test SQLite before 3.24 (no ON CONFLICT) stores the same rows."""
+        batches = [
+            [make_record(), make_record(method='POST', test='a')],
+            [make_record(test='a'), make_record(timestamp=100.5)],
+            [make_record(sampled=False, traceback_list=None)]
+        ]
+        stores = [init_db(), init_db()]
+        stores[1].on_conflict = False
+        for store in stores:
+            for batch in batches:
+                store.add([dict(record) for record in batch])
+        self.assertEqual(stores[0].changes(0), dict(
+            stores[1].changes(0), epoch=stores[0].epoch
+        ))
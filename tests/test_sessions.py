@@ -0,0 +1,51 @@
+"""Sessions tests."""
+import time
+import unittest
+from tornado.locks import Condition
+from monitor_requests.server import init_db
+from monitor_requests.sessions import (
+    QuotaExceeded, SessionLimit, Sessions, check_name
+)
+from monitor_requests.shards import Source
+
+
+def make_source(name=None):
+    """Source on an in memory store."""
+    return Source(init_db(), Condition())
+
+
+class SessionsTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_check_name(self):
+        """Test names are safe in urls."""
+        self.assertEqual(check_name('build-123.a_b'), 'build-123.a_b')
+        self.assertRaises(ValueError, check_name, 'a/b')
+        self.assertRaises(ValueError, check_name, '')
+
+    def test_evict(self):
+        """Test idle sessions are dropped, the default data is kept."""
+        sessions = Sessions(make_source(), make_source, idle=60)
+        old = sessions.get('old')
+        sessions.get('new')
+        sessions._used['old'] = time.time() - 120
+        self.assertEqual(sessions.evict(), ['old'])
+        self.assertTrue(old.closed)
+        self.assertEqual(list(sessions.usage()), ['new'])
+        self.assertIs(sessions.get(), sessions.default)
+
+    def test_quotas(self):
+        """Test sessions over quota, or too many sessions."""
+        sessions = Sessions(
+            make_source(), make_source, max_sessions=1, max_bytes=1
+        )
+        sessions.get('a')
+        self.assertRaises(QuotaExceeded, sessions.check, 'a')
+        sessions.check(None)
+        self.assertRaises(SessionLimit, sessions.get, 'b')
+        sessions.drop('a')
+        sessions.get('b')
+
+
+if __name__ == '__main__':
+    unittest.main()
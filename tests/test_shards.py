@@ -0,0 +1,19 @@
+"""Shards tests."""
+import unittest
+from monitor_requests.shards import parse_cursor
+
+
+class ShardsTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_parse_cursor(self):
+        """Test sharded cursors, and cursors from another server."""
+        self.assertEqual(parse_cursor('3.0.12', 3), [3, 0, 12])
+        self.assertEqual(parse_cursor('0', 3), [0, 0, 0])
+        self.assertEqual(parse_cursor('5.2', 3), [0, 0, 0])
+        self.assertEqual(parse_cursor(7, 1), [7])
+        self.assertRaises(ValueError, parse_cursor, '1.x', 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
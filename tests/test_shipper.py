@@ -0,0 +1,68 @@
+"""Shipper tests."""
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from monitor_requests.shipper import Shipper
+
+
+class ShipperTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_put_without_blocking(self):
+        """Test records put on a full queue are held, then all sent."""
+        sent = []
+        release = threading.Event()
+
+        def send(batch):
+            release.wait()
+            sent.extend(batch)
+
+        shipper = Shipper(send, batch_size=2, max_queue=2)
+        for record in range(10):
+            # Would block on the full queue while send waits.
+            shipper.put(record, block=False)
+        self.assertTrue(shipper._overflow)
+        release.set()
+        shipper.flush()
+        self.assertEqual(sorted(sent), list(range(10)))
+        self.assertFalse(shipper._overflow)
+
+    @unittest.skipIf(not hasattr(os, 'fork'), 'fork is not available')
+    def test_fork(self):
+        """Test a forked child ships its own records from its own worker."""
+        sent = []
+        shipper = Shipper(sent.extend)
+        shipper.put('parent')
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # The parent's worker may have sent its record already.
+                del sent[:]
+                shipper.put('child')
+                shipper.flush()
+                os.write(write, repr(sent).encode())
+            finally:
+                os._exit(0)
+        os.close(write)
+        with os.fdopen(read) as f:
+            self.assertEqual(f.read(), "['child']")
+        os.waitpid(pid, 0)
+        shipper.flush()
+        self.assertEqual(sent, ['parent'])
+
+    def test_exit(self):
+        """Test queued records are sent at exit, without a flush."""
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'from monitor_requests.shipper import Shipper\n'
+            'shipper = Shipper(print, flush_interval=60)\n'
+            'shipper.put(1)\n'
+        ], env=dict(os.environ, PYTHONPATH=os.getcwd()))
+        self.assertEqual(output, b'[1]\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Request and response size tests."""
+import unittest
+import requests
+from monitor_requests.sizes import request_sizes, response_sizes
+
+
+class SizesTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_request_sizes(self):
+        """Test request line, headers and body are counted."""
+        request = requests.Request(
+            'POST', 'http://example.com/a?b=1', data=b'12345',
+            headers={'X-A': 'b'}
+        ).prepare()
+        header_bytes, body_bytes = request_sizes(request)
+        self.assertEqual(body_bytes, 5)
+        self.assertEqual(header_bytes, sum([
+            len('POST /a?b=1 HTTP/1.1\r\n'),
+            len('Host: example.com\r\n'),
+            len('X-A: b\r\n'),
+            len('Content-Length: 5\r\n'),
+            len('\r\n')
+        ]))
+        request = requests.Request(
+            'POST', 'http://example.com/', data={'a': 'é'}
+        ).prepare()
+        self.assertEqual(request_sizes(request)[1], len('a=%C3%A9'))
+        request = requests.Request(
+            'POST', 'http://example.com/', data=iter([b'a', b'b'])
+        ).prepare()
+        self.assertEqual(request_sizes(request)[1], 0)
+
+    def test_response_sizes(self):
+        """Test response body sizes from Content-Length, or unknown."""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.request = requests.Request(
+            'GET', 'http://example.com/'
+        ).prepare()
+        self.assertEqual(
+            response_sizes(response),
+            (len('HTTP/1.1 200 OK\r\n\r\n'), None)
+        )
+        response.headers['Content-Length'] = '42'
+        self.assertEqual(response_sizes(response)[1], 42)
+        response.request.method = 'HEAD'
+        self.assertEqual(response_sizes(response)[1], 0)
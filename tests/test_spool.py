@@ -0,0 +1,92 @@
+"""Spool file tests."""
+import os
+import shutil
+import tempfile
+import unittest
+from monitor_requests.merge import merge_spools
+from monitor_requests.spool import SpoolWriter, read_spool, spool_paths
+from tests import make_record
+
+
+class SpoolTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        """Create a spool dir."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the spool dir."""
+        shutil.rmtree(self.directory)
+
+    def test_texts_written_once(self):
+        """Test repeated tracebacks and responses are referenced by hash."""
+        writer = SpoolWriter(self.directory)
+        for _ in range(3):
+            writer.write(make_record())
+        writer.write(make_record(response_content='other'))
+        writer.flush()
+        with open(writer.path) as f:
+            self.assertEqual(len(f.readlines()), 7)
+        records = list(read_spool(writer.path))
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[0]['traceback_list'], ['a'])
+        self.assertEqual(
+            [record['response_content'] for record in records],
+            ['ok'] * 3 + ['other']
+        )
+        self.assertEqual(records[3]['response_status_code'], 200)
+
+    def test_merge(self):
+        """Test merging spools from several processes."""
+        for url in ('http://google.com/', 'http://facebook.com/'):
+            writer = SpoolWriter(self.directory)
+            writer.write(make_record(url))
+            writer.write(make_record(url, traceback_list=['c']))
+            writer.flush()
+        with open(writer.path, 'a') as f:
+            f.write('{"url": "http://partial')
+        logged_requests, analysis = merge_spools([self.directory])
+        self.assertEqual(analysis['total_requests'], 4)
+        self.assertEqual(analysis['duration'], 2.0)
+        self.assertEqual(analysis['domains'], set(['google.com']))
+        self.assertEqual(logged_requests['http://google.com/']['count'], 2)
+        self.assertEqual(
+            logged_requests['http://google.com/']['tracebacks'],
+            set([('a',), ('c',)])
+        )
+
+    @unittest.skipIf(not hasattr(os, 'fork'), 'fork is not available')
+    def test_fork(self):
+        """Test a forked child spools its own records, once."""
+        writer = SpoolWriter(self.directory)
+        for _ in range(3):
+            writer.write(make_record())
+        pid = os.fork()
+        if pid == 0:
+            try:
+                writer.write(make_record('http://facebook.com/'))
+                writer.flush()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        writer.flush()
+        records = [
+            record['url'] for path in spool_paths(self.directory)
+            for record in read_spool(path)
+        ]
+        self.assertEqual(
+            sorted(records),
+            ['http://facebook.com/'] + ['http://google.com/'] * 3
+        )
+
+    def test_delete(self):
+        """Test deleting spools."""
+        writer = SpoolWriter(self.directory)
+        writer.write(make_record())
+        writer.delete()
+        self.assertEqual(spool_paths(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
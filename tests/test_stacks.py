@@ -0,0 +1,63 @@
+"""Stack capture tests."""
+import functools
+import traceback
+import unittest
+from monitor_requests.stacks import StackCapture
+
+
+def capture_from_here(stacks):
+    """Capture a stack."""
+    return stacks.capture()
+
+
+class LibraryStackCapture(StackCapture):
+    """Captures called from a standard library (functools) frame."""
+
+    # singledispatch calls the method from a pure Python functools frame.
+    captured = functools.singledispatch(StackCapture.capture)
+    called_from = functools.singledispatch(StackCapture.call_site)
+
+
+class StackCaptureTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def test_render(self):
+        """Test rendering matches format_stack."""
+        stacks = StackCapture()
+        stack = capture_from_here(stacks)
+        rendered = stacks.render(stack)
+        expected = traceback.format_stack()[-1]
+        self.assertIn('return stacks.capture()', rendered[-1])
+        self.assertIn('stack = capture_from_here(stacks)', rendered[-2])
+        self.assertEqual(
+            rendered[-2].split(', line')[0], expected.split(', line')[0]
+        )
+
+    def test_interned(self):
+        """Test identical stacks share one fingerprint."""
+        stacks = StackCapture()
+        captured = [capture_from_here(stacks) for _ in range(2)]
+        self.assertIs(captured[0], captured[1])
+        self.assertIs(stacks.render(captured[0]), stacks.render(captured[1]))
+
+    def test_call_site(self):
+        """Test call sites skip library frames, captured or not."""
+        stacks = LibraryStackCapture()
+        stack = stacks.captured()
+        self.assertIn('functools', stacks.render(stack)[-1])
+        site = stacks.render_site(stacks.site(stack))
+        self.assertIn('test_stacks.py', site)
+        self.assertTrue(site.endswith(' in test_call_site'))
+        self.assertEqual(
+            stacks.render_site(stacks.called_from()).split(':')[0],
+            site.split(':')[0]
+        )
+
+    def test_mocked(self):
+        """Test calls from mocking libraries are not captured."""
+        stacks = StackCapture(mocking_libraries=('tests',))
+        self.assertIsNone(capture_from_here(stacks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Unix domain socket transport tests."""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_unix_socket
+from monitor_requests.server import make_app
+from monitor_requests.transport import connection_pool
+
+
+class UnixSocketTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def setUp(self):
+        """Run the server on a Unix socket in a thread."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'monitor.sock')
+        started = threading.Event()
+        self.loop = asyncio.new_event_loop()
+
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            self.server = HTTPServer(make_app())
+            self.server.add_socket(bind_unix_socket(self.path))
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=serve)
+        self.thread.start()
+        started.wait()
+
+    def tearDown(self):
+        """Stop the server."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        shutil.rmtree(self.directory)
+
+    def test_post_and_retrieve(self):
+        """Test requests share one kept-alive connection."""
+        pool = connection_pool(server_socket=self.path)
+        self.assertIs(pool, connection_pool(server_socket=self.path))
+        record = {
+            'url': 'http://google.com/',
+            'method': 'GET',
+            'domain': 'google.com',
+            'response_content': '<html>example</html>',
+            'response_status_code': 200,
+            'duration': 2.1,
+            'traceback_list': ['a', 'b']
+        }
+        response = pool.request('POST', '/batch', body=json.dumps([record]))
+        self.assertEqual(response.status, 200)
+        data = json.loads(pool.request('GET', '/').data)
+        self.assertEqual(data['analysis']['total_requests'], 1)
+        self.assertEqual(pool.num_connections, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Wire format tests."""
+import unittest
+from monitor_requests.wire import JSON, MSGPACK, Encoder, decode
+from tests import make_record
+
+
+class WireTestCase(unittest.TestCase):
+    """Test Case."""
+
+    def roundtrip(self, encoder, records):
+        """Encode and decode records."""
+        body, headers = encoder.encode(records)
+        return decode(
+            body, headers['Content-Type'], headers['Content-Encoding']
+        )
+
+    def test_texts_sent_once(self):
+        """Test tracebacks and responses are sent once, then by hash."""
+        for content_type in (MSGPACK, JSON):
+            encoder = Encoder(content_type)
+            records, tracebacks, responses = self.roundtrip(
+                encoder, [make_record(), make_record()]
+            )
+            self.assertEqual(list(tracebacks.values()), [['a']])
+            self.assertEqual(list(responses.values()), [[200, 'ok']])
+            self.assertEqual(records[0], records[1])
+            self.assertEqual(
+                records[0]['traceback_hash'], list(tracebacks)[0]
+            )
+            self.assertEqual(records[0]['duration'], 0.5)
+            self.assertEqual(records[0]['connection']['new_connections'], 1)
+            self.assertEqual(records[0]['connection']['pool_exhausted'], 0)
+            records, tracebacks, responses = self.roundtrip(
+                encoder, [make_record(), make_record(response_content='other')]
+            )
+            self.assertEqual(tracebacks, {})
+            self.assertEqual(list(responses.values()), [[200, 'other']])
+            encoder.refused([records[0]['traceback_hash']])
+            records, tracebacks, responses = self.roundtrip(
+                encoder, [make_record(), make_record(response_content='other')]
+            )
+            self.assertEqual(list(tracebacks.values()), [['a']])
+            self.assertEqual(list(responses.values()), [[200, 'other']])
+
+    def test_unsampled(self):
+        """Test unsampled records have no hashes."""
+        record = self.roundtrip(Encoder(), [make_record(
+            response_content=None, traceback_list=None, sampled=False,
+            connection=None
+        )])[0][0]
+        self.assertIsNone(record['traceback_hash'])
+        self.assertIsNone(record['connection'])
+        self.assertFalse(record['sampled'])
+
+    def test_json_list(self):
+        """Test plain JSON lists of records are still accepted."""
+        self.assertEqual(
+            decode(b'[{"url": "x"}]'), ([{'url': 'x'}], {}, {})
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()